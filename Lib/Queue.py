@@ -8,7 +8,8 @@ except ImportError:
 from collections import deque
 import heapq
 
-__all__ = ['Empty', 'Full', 'Queue', 'PriorityQueue', 'LifoQueue']
+__all__ = ['Empty', 'Full', 'Queue', 'PriorityQueue', 'LifoQueue',
+           'SimpleQueue']
 
 class Empty(Exception):
     "Exception raised by Queue.get(block=0)/get_nowait()."
@@ -41,6 +42,9 @@ class Queue:
         # drops to zero; thread waiting to join() is notified to resume
         self.all_tasks_done = _threading.Condition(self.mutex)
         self.unfinished_tasks = 0
+        # Number of threads blocked in put_many().  They wait for more
+        # than one free slot, so removing items must wake all of them.
+        self._bulk_putters = 0
 
     def task_done(self):
         """Indicate that a formerly enqueued task is complete.
@@ -176,7 +180,7 @@ class Queue:
                         raise Empty
                     self.not_empty.wait(remaining)
             item = self._get()
-            self.not_full.notify()
+            self._notify_not_full(1)
             return item
         finally:
             self.not_empty.release()
@@ -189,6 +193,93 @@ class Queue:
         """
         return self.get(False)
 
+    def put_many(self, items, block=True, timeout=None):
+        """Put all the items of an iterable into the queue.
+
+        The items are added together, taking the mutex and notifying
+        waiting consumers once rather than once per item.  For a bounded
+        queue either all items are put or none: 'block' and 'timeout' are
+        as for put(), waiting until there is room for all of them.
+        ValueError is raised if there are more items than 'maxsize'.
+        """
+        items = list(items)
+        n = len(items)
+        if not n:
+            return
+        self.not_full.acquire()
+        try:
+            if self.maxsize > 0:
+                if n > self.maxsize:
+                    raise ValueError("more than maxsize items")
+                if not block:
+                    if self.maxsize - self._qsize() < n:
+                        raise Full
+                elif timeout is not None and timeout < 0:
+                    raise ValueError("'timeout' must be a positive number")
+                elif self.maxsize - self._qsize() < n:
+                    if timeout is not None:
+                        endtime = _time() + timeout
+                    self._bulk_putters += 1
+                    try:
+                        while self.maxsize - self._qsize() < n:
+                            if timeout is None:
+                                self.not_full.wait()
+                            else:
+                                remaining = endtime - _time()
+                                if remaining <= 0.0:
+                                    raise Full
+                                self.not_full.wait(remaining)
+                    finally:
+                        self._bulk_putters -= 1
+            for item in items:
+                self._put(item)
+            self.unfinished_tasks += n
+            self.not_empty.notify(n)
+        finally:
+            self.not_full.release()
+
+    def get_many(self, max_items=None, block=True, timeout=None):
+        """Remove and return a list of up to 'max_items' items.
+
+        Blocks as get() does until at least one item is available, then
+        returns all available items (at most 'max_items' if it is not
+        None) in the order in which get() would return them.
+        """
+        if max_items is not None and max_items < 1:
+            raise ValueError("'max_items' must be a positive number")
+        self.not_empty.acquire()
+        try:
+            if not block:
+                if not self._qsize():
+                    raise Empty
+            elif timeout is None:
+                while not self._qsize():
+                    self.not_empty.wait()
+            elif timeout < 0:
+                raise ValueError("'timeout' must be a positive number")
+            else:
+                endtime = _time() + timeout
+                while not self._qsize():
+                    remaining = endtime - _time()
+                    if remaining <= 0.0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+            n = self._qsize()
+            if max_items is not None:
+                n = min(n, max_items)
+            items = [self._get() for i in xrange(n)]
+            self._notify_not_full(n)
+            return items
+        finally:
+            self.not_empty.release()
+
+    def _notify_not_full(self, n):
+        # called with mutex held after n items were removed
+        if self._bulk_putters:
+            self.not_full.notify_all()
+        else:
+            self.not_full.notify(n)
+
     # Override these methods to implement other queue organizations
     # (e.g. stack or priority queue).
     # These will only be called with appropriate locks held
@@ -242,3 +333,117 @@ class LifoQueue(Queue):
 
     def _get(self):
         return self.queue.pop()
+
+
+class SimpleQueue:
+    """Create an unbounded queue with low overhead.
+
+    Items are appended to and popped from a collections.deque without
+    taking a lock; a condition is only used to wake up consumers which
+    are blocked in get().  There is no maxsize and no task_done()/join().
+    """
+    def __init__(self):
+        self.queue = deque()
+        # Consumers blocked in get() register in waiters with the mutex
+        # of not_empty held, then check the queue again before waiting, so
+        # that producers only need to notify when waiters is non-zero.
+        self.not_empty = _threading.Condition(_threading.Lock())
+        self.waiters = 0
+
+    def qsize(self):
+        """Return the approximate size of the queue (not reliable!)."""
+        return len(self.queue)
+
+    def empty(self):
+        """Return True if the queue is empty, False otherwise (not reliable!)."""
+        return not self.queue
+
+    def put(self, item, block=True, timeout=None):
+        """Put an item into the queue.
+
+        This never blocks; 'block' and 'timeout' are only accepted for
+        compatibility with Queue.put().
+        """
+        self.queue.append(item)
+        if self.waiters:
+            self._notify(1)
+
+    def put_nowait(self, item):
+        """Put an item into the queue without blocking."""
+        self.put(item)
+
+    def put_many(self, items, block=True, timeout=None):
+        """Put all the items of an iterable into the queue.
+
+        This never blocks; 'block' and 'timeout' are only accepted for
+        compatibility with Queue.put_many().
+        """
+        items = list(items)
+        self.queue.extend(items)
+        if self.waiters and items:
+            self._notify(len(items))
+
+    def get(self, block=True, timeout=None):
+        """Remove and return an item from the queue.
+
+        'block' and 'timeout' have the same meaning as for Queue.get().
+        """
+        try:
+            return self.queue.popleft()
+        except IndexError:
+            if not block:
+                raise Empty
+        if timeout is not None:
+            if timeout < 0:
+                raise ValueError("'timeout' must be a positive number")
+            endtime = _time() + timeout
+        self.not_empty.acquire()
+        self.waiters += 1
+        try:
+            while True:
+                try:
+                    return self.queue.popleft()
+                except IndexError:
+                    pass
+                if timeout is None:
+                    self.not_empty.wait()
+                else:
+                    remaining = endtime - _time()
+                    if remaining <= 0.0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+        finally:
+            self.waiters -= 1
+            self.not_empty.release()
+
+    def get_nowait(self):
+        """Remove and return an item from the queue without blocking.
+
+        Only get an item if one is immediately available. Otherwise
+        raise the Empty exception.
+        """
+        return self.get(False)
+
+    def get_many(self, max_items=None, block=True, timeout=None):
+        """Remove and return a list of up to 'max_items' items.
+
+        Blocks as get() does until at least one item is available, then
+        returns the items available (at most 'max_items' if it is not None).
+        """
+        if max_items is not None and max_items < 1:
+            raise ValueError("'max_items' must be a positive number")
+        items = [self.get(block, timeout)]
+        popleft = self.queue.popleft
+        try:
+            while max_items is None or len(items) < max_items:
+                items.append(popleft())
+        except IndexError:
+            pass
+        return items
+
+    def _notify(self, n):
+        self.not_empty.acquire()
+        try:
+            self.not_empty.notify(n)
+        finally:
+            self.not_empty.release()
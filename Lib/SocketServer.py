@@ -21,6 +21,10 @@ For request-based servers (including socket-based):
         - synchronous (one request is handled at a time)
         - forking (each request is handled by a new process)
         - threading (each request is handled by a new thread)
+        - thread pool (each request is handled by one of a fixed number
+          of threads)
+        - pre-forking (each request is handled by one of a fixed number
+          of long-lived processes)
 
 The classes in this module favor the server type that is simplest to
 write: a synchronous TCP/IP server.  This is bad class design, but
@@ -50,7 +54,8 @@ stream server is the address family, which is simply repeated in both
 unix server classes.
 
 Forking and threading versions of each type of server can be created
-using the ForkingMixIn and ThreadingMixIn mix-in classes.  For
+using the ForkingMixIn and ThreadingMixIn mix-in classes (and thread
+pool and pre-forking versions using ThreadPoolMixIn and PreforkMixIn).  For
 instance, a threading UDP server class is created as follows:
 
         class ThreadingUDPServer(ThreadingMixIn, UDPServer): pass
@@ -134,6 +139,9 @@ import select
 import sys
 import os
 import errno
+import signal
+import time
+import Queue
 try:
     import threading
 except ImportError:
@@ -142,7 +150,9 @@ except ImportError:
 __all__ = ["TCPServer","UDPServer","ForkingUDPServer","ForkingTCPServer",
            "ThreadingUDPServer","ThreadingTCPServer","BaseRequestHandler",
            "StreamRequestHandler","DatagramRequestHandler",
-           "ThreadingMixIn", "ForkingMixIn"]
+           "ThreadingMixIn", "ForkingMixIn", "ThreadPoolMixIn",
+           "ThreadPoolTCPServer", "ThreadPoolUDPServer", "PreforkMixIn",
+           "PreforkTCPServer", "PreforkUDPServer"]
 if hasattr(socket, "AF_UNIX"):
     __all__.extend(["UnixStreamServer","UnixDatagramServer",
                     "ThreadingUnixStreamServer",
@@ -576,6 +586,161 @@ class ForkingMixIn:
                     os._exit(1)
 
 
+class PreforkMixIn:
+
+    """Mix-in class to handle requests in a fixed set of processes.
+
+    serve_forever() forks num_workers worker processes which all accept
+    requests on the listening socket and handle them one at a time.  A
+    worker exits after max_requests_per_worker requests (if not 0) and is
+    then replaced, as is a worker which dies.  shutdown() stops the
+    workers once their current request is handled.
+    """
+
+    num_workers = 4
+    max_requests_per_worker = 0
+    active_workers = None
+
+    # Counters of workers replaced because they exited or crashed
+    worker_restarts = 0
+    worker_crashes = 0
+
+    _prefork_stop = False
+    _prefork_wakeup = None
+    _prefork_is_shut_down = None
+    _worker_stop = False
+    _worker_requests = 0
+
+    def serve_forever(self, poll_interval=0.5):
+        """Start the workers and keep their number up until shutdown.
+
+        Dead workers are detected and replaced every poll_interval
+        seconds; the workers poll for shutdown at the same interval.
+        """
+        self._prefork_poll_interval = poll_interval
+        self._prefork_wakeup = threading.Event()
+        self._prefork_is_shut_down = threading.Event()
+        # A worker which loses the race for a connection must not block
+        # in accept(); the flag is shared by all the processes.
+        self.socket.setblocking(0)
+        self.active_workers = []
+        try:
+            while not self._prefork_stop:
+                while len(self.active_workers) < self.num_workers:
+                    self.spawn_worker()
+                self._prefork_wakeup.wait(poll_interval)
+                self.collect_workers()
+        finally:
+            self.stop_workers()
+            self._prefork_stop = False
+            self._prefork_is_shut_down.set()
+
+    def shutdown(self):
+        """Stops the serve_forever loop and the workers.
+
+        Blocks until the workers have exited.  This must be called while
+        serve_forever() is running in another thread, or it will
+        deadlock.  If serve_forever() is not running it returns at once,
+        and the next call of serve_forever() returns without serving.
+        """
+        self._prefork_stop = True
+        if self._prefork_is_shut_down is None:
+            return
+        self._prefork_wakeup.set()
+        self._prefork_is_shut_down.wait()
+
+    def spawn_worker(self):
+        """Fork a new worker process."""
+        ppid = os.getpid()
+        pid = os.fork()
+        if pid:
+            # Parent process
+            self.active_workers.append(pid)
+            return
+        # Child process.
+        # This must never return, hence os._exit()!
+        try:
+            self.active_workers = None
+            self.serve_worker(ppid)
+            os._exit(0)
+        except:
+            try:
+                # the error is not tied to any request
+                self.handle_error(None, None)
+                sys.stdout.flush()
+            finally:
+                os._exit(1)
+
+    def collect_workers(self):
+        """Forget the workers which have exited."""
+        for pid in self.active_workers[:]:
+            try:
+                pid, status = os.waitpid(pid, os.WNOHANG)
+            except os.error:
+                status = None
+            if not pid:
+                continue
+            self.active_workers.remove(pid)
+            if not self._prefork_stop:
+                self.worker_restarts += 1
+                if status is None or status != 0:
+                    self.worker_crashes += 1
+
+    def stop_workers(self):
+        """Ask the workers to exit and wait for them."""
+        for pid in self.active_workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except os.error:
+                pass
+        while self.active_workers:
+            pid = self.active_workers.pop()
+            try:
+                _eintr_retry(os.waitpid, pid, 0)
+            except os.error:
+                pass
+
+    def serve_worker(self, ppid):
+        """Handle requests in a worker process until asked to stop."""
+        def stop(signum, frame):
+            self._worker_stop = True
+        signal.signal(signal.SIGTERM, stop)
+        # let the request being handled finish; select() below still
+        # returns early
+        signal.siginterrupt(signal.SIGTERM, False)
+        # a ^C in the terminal is handled by the parent
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self._worker_stop = False
+        self._worker_requests = 0
+        limit = self.max_requests_per_worker
+        while not self._worker_stop:
+            if limit and self._worker_requests >= limit:
+                break
+            if os.getppid() != ppid:
+                # orphaned
+                break
+            try:
+                r, w, e = select.select([self], [], [],
+                                        self._prefork_poll_interval)
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+                continue
+            if self in r:
+                self._handle_request_noblock()
+
+    def process_request(self, request, client_address):
+        """Handle the request in this worker."""
+        self._worker_requests += 1
+        # Accepted sockets may inherit the non-blocking mode of the
+        # listening socket on some platforms.
+        settimeout = getattr(request, 'settimeout', None)
+        if settimeout is not None:
+            settimeout(None)
+        self.finish_request(request, client_address)
+        self.shutdown_request(request)
+
+
 class ThreadingMixIn:
     """Mix-in class to handle each request in a new thread."""
 
@@ -604,12 +769,184 @@ class ThreadingMixIn:
         t.start()
 
 
+def _getmro(cls):
+    """Return the method resolution order of a class, classic or not."""
+    mro = getattr(cls, '__mro__', None)
+    if mro is not None:
+        return mro
+    mro = (cls,)
+    for base in cls.__bases__:
+        mro += _getmro(base)
+    return mro
+
+
+class _RequestQueue(Queue.Queue):
+    """Queue of the requests waiting for a ThreadPoolMixIn worker."""
+
+    def put_stop(self, n):
+        """Queue n stop markers after the waiting requests.
+
+        The markers do not count against maxsize, so that this never
+        blocks, even in a worker thread while the queue is full.
+        """
+        with self.not_empty:
+            for i in range(n):
+                self._put(None)
+                self.unfinished_tasks += 1
+            self.not_empty.notify_all()
+
+
+class ThreadPoolMixIn:
+    """Mix-in class to handle requests in a fixed pool of threads.
+
+    Accepted requests wait in a queue of at most queue_size requests until
+    one of pool_size worker threads is free.  When the queue is full,
+    overload decides what happens to a new request: 'block' stops
+    accepting requests until there is room (connections then wait in the
+    listen queue of the socket), 'reject' passes it to handle_overload().
+
+    The workers are started by the first request and stopped by
+    stop_workers(), which server_close() calls.
+    """
+
+    pool_size = 10
+    queue_size = 50
+    overload = 'block'
+
+    # Decides how threads will act upon termination of the
+    # main process
+    daemon_threads = False
+
+    _workers = None
+    _request_queue = None
+
+    # Counters reported by pool_stats()
+    max_queued = 0
+    active = 0
+    handled = 0
+    rejected = 0
+    service_time = 0.0
+    queue_wait = 0.0
+
+    def process_request(self, request, client_address):
+        """Queue the request for a worker thread."""
+        if self._workers is None:
+            self.start_workers()
+        item = (request, client_address, time.time())
+        try:
+            self._request_queue.put(item, self.overload != 'reject')
+        except Queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            self.handle_overload(request, client_address)
+            return
+        queued = self._request_queue.qsize()
+        if queued > self.max_queued:
+            self.max_queued = queued
+
+    def handle_overload(self, request, client_address):
+        """Called for a request which is rejected because the queue is
+        full.  May be overridden.
+
+        The default closes the request.
+        """
+        self.shutdown_request(request)
+
+    def start_workers(self):
+        """Start the worker threads."""
+        if self.overload not in ('block', 'reject'):
+            raise ValueError("overload must be 'block' or 'reject'")
+        self._stats_lock = threading.Lock()
+        self._request_queue = _RequestQueue(self.queue_size)
+        self._workers = []
+        for i in range(self.pool_size):
+            t = threading.Thread(target = self.process_request_worker,
+                                 args = (self._request_queue,))
+            t.daemon = self.daemon_threads
+            t.start()
+            self._workers.append(t)
+
+    def stop_workers(self):
+        """Stop the worker threads once the queued requests are handled.
+
+        Waits for the workers to exit.
+        """
+        workers = self._workers
+        if workers is None:
+            return
+        self._workers = None
+        self._request_queue.put_stop(len(workers))
+        for t in workers:
+            # handle_error() may close the server from a worker
+            if t is not threading.current_thread():
+                t.join()
+
+    def server_close(self):
+        """Stop the workers, then close the server."""
+        self.stop_workers()
+        # There is no super() for classic classes: call the server_close()
+        # which this one overrides.
+        mro = _getmro(self.__class__)
+        for cls in mro[mro.index(ThreadPoolMixIn) + 1:]:
+            if 'server_close' in cls.__dict__:
+                cls.__dict__['server_close'](self)
+                return
+
+    def process_request_worker(self, request_queue):
+        """Handle queued requests until stop_workers() is called."""
+        while True:
+            item = request_queue.get()
+            if item is None:
+                return
+            request, client_address, queued = item
+            start = time.time()
+            with self._stats_lock:
+                self.active += 1
+                self.queue_wait += start - queued
+            try:
+                self.finish_request(request, client_address)
+                self.shutdown_request(request)
+            except:
+                self.handle_error(request, client_address)
+                self.shutdown_request(request)
+            with self._stats_lock:
+                self.active -= 1
+                self.handled += 1
+                self.service_time += time.time() - start
+
+    def pool_stats(self):
+        """Return a dictionary of statistics about the thread pool.
+
+        'queued' is the number of requests waiting for a worker,
+        'max_queued' the largest number seen, 'active' the number of
+        requests being handled, 'handled' and 'rejected' the number of
+        requests handled and rejected so far, 'service_time' the total
+        time spent handling them and 'queue_wait' the total time they
+        waited in the queue.
+        """
+        if self._request_queue is None:
+            queued = 0
+        else:
+            queued = self._request_queue.qsize()
+        return dict(workers=self.pool_size, queued=queued,
+                    max_queued=self.max_queued, active=self.active,
+                    handled=self.handled, rejected=self.rejected,
+                    service_time=self.service_time,
+                    queue_wait=self.queue_wait)
+
+
 class ForkingUDPServer(ForkingMixIn, UDPServer): pass
 class ForkingTCPServer(ForkingMixIn, TCPServer): pass
 
+class PreforkUDPServer(PreforkMixIn, UDPServer): pass
+class PreforkTCPServer(PreforkMixIn, TCPServer): pass
+
 class ThreadingUDPServer(ThreadingMixIn, UDPServer): pass
 class ThreadingTCPServer(ThreadingMixIn, TCPServer): pass
 
+class ThreadPoolUDPServer(ThreadPoolMixIn, UDPServer): pass
+class ThreadPoolTCPServer(ThreadPoolMixIn, TCPServer): pass
+
 if hasattr(socket, 'AF_UNIX'):
 
     class UnixStreamServer(TCPServer):
@@ -52,6 +52,14 @@ from collections import deque
 from sys import py3kwarning
 from warnings import filterwarnings, catch_warnings
 
+if py3kwarning:
+    def _buffer(obj, offset=0, size=-1):
+        with catch_warnings():
+            filterwarnings("ignore", ".*buffer", DeprecationWarning)
+            return buffer(obj, offset, size)
+else:
+    _buffer = buffer
+
 class async_chat (asyncore.dispatcher):
     """This is an abstract class.  You must derive from this class, and add
     the two methods collect_incoming_data() and found_terminator()"""
@@ -112,63 +120,116 @@ class async_chat (asyncore.dispatcher):
             self.handle_error()
             return
 
-        self.ac_in_buffer = self.ac_in_buffer + data
-
-        # Continue to search for self.terminator in self.ac_in_buffer,
-        # while calling self.collect_incoming_data.  The while loop
-        # is necessary because we might read several data+terminator
-        # combos with a single recv(4096).
-
-        while self.ac_in_buffer:
-            lb = len(self.ac_in_buffer)
-            terminator = self.get_terminator()
-            if not terminator:
-                # no terminator, collect it all
-                self.collect_incoming_data (self.ac_in_buffer)
-                self.ac_in_buffer = ''
-            elif isinstance(terminator, int) or isinstance(terminator, long):
-                # numeric terminator
-                n = terminator
-                if lb < n:
-                    self.collect_incoming_data (self.ac_in_buffer)
-                    self.ac_in_buffer = ''
-                    self.terminator = self.terminator - lb
-                else:
-                    self.collect_incoming_data (self.ac_in_buffer[:n])
-                    self.ac_in_buffer = self.ac_in_buffer[n:]
-                    self.terminator = 0
-                    self.found_terminator()
-            else:
-                # 3 cases:
-                # 1) end of buffer matches terminator exactly:
-                #    collect data, transition
-                # 2) end of buffer matches some prefix:
-                #    collect data to the prefix
-                # 3) end of buffer does not match any prefix:
-                #    collect data
-                terminator_len = len(terminator)
-                index = self.ac_in_buffer.find(terminator)
-                if index != -1:
-                    # we found the terminator
-                    if index > 0:
-                        # don't bother reporting the empty string (source of subtle bugs)
-                        self.collect_incoming_data (self.ac_in_buffer[:index])
-                    self.ac_in_buffer = self.ac_in_buffer[index+terminator_len:]
-                    # This does the Right Thing if the terminator is changed here.
-                    self.found_terminator()
+        if self.ac_in_buffer:
+            data = self.ac_in_buffer + data
+
+        # Continue to search for self.terminator in the buffer, while
+        # calling self.collect_incoming_data.  The while loop is necessary
+        # because we might read several data+terminator combos with a
+        # single recv(4096).  'start' is the offset of the unprocessed
+        # data: slicing off the processed part after every terminator
+        # would make the loop quadratic in the number of combos.  Handlers
+        # still see the unprocessed part as ac_in_buffer, which is only
+        # sliced if they look at it (see the ac_in_buffer property).
+
+        self.__dict__.pop('ac_in_buffer', None)
+        self._ac_in_data = data
+        self._ac_in_start = 0
+        start = 0
+        try:
+            lb = len(data)
+            while start < lb:
+                terminator = self.get_terminator()
+                self._ac_in_start = start
+                if not terminator:
+                    # no terminator, collect it all
+                    self.collect_incoming_data (data[start:])
+                    start = lb
+                elif isinstance(terminator, int) or isinstance(terminator, long):
+                    # numeric terminator
+                    n = terminator
+                    if lb - start < n:
+                        self.collect_incoming_data (data[start:])
+                        self.terminator = self.terminator - (lb - start)
+                        start = lb
+                    else:
+                        self.collect_incoming_data (data[start:start+n])
+                        start = start + n
+                        self.terminator = 0
+                        self._sync_ac_in_buffer()
+                        if self._ac_in_data is data:
+                            self._ac_in_start = start
+                        self.found_terminator()
                 else:
-                    # check for a prefix of the terminator
-                    index = find_prefix_at_end (self.ac_in_buffer, terminator)
-                    if index:
-                        if index != lb:
-                            # we found a prefix, collect up to the prefix
-                            self.collect_incoming_data (self.ac_in_buffer[:-index])
-                            self.ac_in_buffer = self.ac_in_buffer[-index:]
-                        break
+                    # 3 cases:
+                    # 1) end of buffer matches terminator exactly:
+                    #    collect data, transition
+                    # 2) end of buffer matches some prefix:
+                    #    collect data to the prefix
+                    # 3) end of buffer does not match any prefix:
+                    #    collect data
+                    terminator_len = len(terminator)
+                    index = data.find(terminator, start)
+                    if index != -1:
+                        # we found the terminator
+                        if index > start:
+                            # don't bother reporting the empty string (source of subtle bugs)
+                            self.collect_incoming_data (data[start:index])
+                        start = index + terminator_len
+                        self._sync_ac_in_buffer()
+                        if self._ac_in_data is data:
+                            self._ac_in_start = start
+                        # This does the Right Thing if the terminator is changed here.
+                        self.found_terminator()
                     else:
-                        # no prefix, collect it all
-                        self.collect_incoming_data (self.ac_in_buffer)
-                        self.ac_in_buffer = ''
+                        # check for a prefix of the terminator
+                        tail = max(start, lb - terminator_len + 1)
+                        index = find_prefix_at_end (data[tail:], terminator)
+                        if index:
+                            if index != lb - start:
+                                # we found a prefix, collect up to the prefix
+                                self.collect_incoming_data (data[start:-index])
+                            start = lb - index
+                            break
+                        else:
+                            # no prefix, collect it all
+                            self.collect_incoming_data (data[start:])
+                            start = lb
+                self._sync_ac_in_buffer()
+                if self._ac_in_data is not data:
+                    # a handler set the buffer, e.g. with discard_buffers():
+                    # go on with the new one
+                    data = self._ac_in_data
+                    start = 0
+                    lb = len(data)
+        finally:
+            # keep the unprocessed data, even if a handler raised
+            self._sync_ac_in_buffer()
+            if self._ac_in_data is data:
+                self._ac_in_data = data[start:]
+                self._ac_in_start = 0
+
+    # The input buffer is _ac_in_data from offset _ac_in_start, which lets
+    # handle_read() move past the processed data without copying the rest.
+    # ac_in_buffer gives and sets it.  Assigning ac_in_buffer on an instance
+    # of a classic class skips the setter and makes an instance attribute,
+    # which handle_read() takes over with _sync_ac_in_buffer().
+
+    _ac_in_data = ''
+    _ac_in_start = 0
+
+    def _get_ac_in_buffer(self):
+        return self._ac_in_data[self._ac_in_start:]
+
+    def _set_ac_in_buffer(self, data):
+        self._ac_in_data = data
+        self._ac_in_start = 0
+
+    ac_in_buffer = property(_get_ac_in_buffer, _set_ac_in_buffer)
+
+    def _sync_ac_in_buffer(self):
+        if 'ac_in_buffer' in self.__dict__:
+            self._set_ac_in_buffer(self.__dict__.pop('ac_in_buffer'))
 
     def handle_write (self):
         self.initiate_send()
@@ -177,17 +238,16 @@ class async_chat (asyncore.dispatcher):
         self.close()
 
     def push (self, data):
-        sabs = self.ac_out_buffer_size
-        if len(data) > sabs:
-            for i in xrange(0, len(data), sabs):
-                self.producer_fifo.append(data[i:i+sabs])
-        else:
-            self.producer_fifo.append(data)
+        # initiate_send() sends at most ac_out_buffer_size bytes at a
+        # time through buffer() views, so the data is not copied here
+        self.producer_fifo.append(data)
         self.initiate_send()
+        self.events_changed()
 
     def push_with_producer (self, producer):
         self.producer_fifo.append(producer)
         self.initiate_send()
+        self.events_changed()
 
     def readable (self):
         "predicate for inclusion in the readable for select()"
@@ -204,6 +264,7 @@ class async_chat (asyncore.dispatcher):
     def close_when_done (self):
         "automatically close this channel once the outgoing queue is empty"
         self.producer_fifo.append(None)
+        self.events_changed()
 
     def initiate_send(self):
         while self.producer_fifo and self.connected:
@@ -218,10 +279,7 @@ class async_chat (asyncore.dispatcher):
             # handle classic producer behavior
             obs = self.ac_out_buffer_size
             try:
-                with catch_warnings():
-                    if py3kwarning:
-                        filterwarnings("ignore", ".*buffer", DeprecationWarning)
-                    data = buffer(first, 0, obs)
+                data = _buffer(first, 0, obs)
             except TypeError:
                 data = first.more()
                 if data:
@@ -239,7 +297,8 @@ class async_chat (asyncore.dispatcher):
 
             if num_sent:
                 if num_sent < len(data) or obs < len(first):
-                    self.producer_fifo[0] = first[num_sent:]
+                    # a view of the rest rather than a copy of it
+                    self.producer_fifo[0] = _buffer(first, num_sent)
                 else:
                     del self.producer_fifo[0]
             # we tried to send some actual data
@@ -250,6 +309,7 @@ class async_chat (asyncore.dispatcher):
         self.ac_in_buffer = ''
         del self.incoming[:]
         self.producer_fifo.clear()
+        self.events_changed()
 
 class simple_producer:
 
@@ -0,0 +1,511 @@
+r"""An asynchronous HTTP/1.1 client built on asyncore and asynchat.
+
+An HTTPClient runs any number of requests from the thread driving the
+asyncore loop: each request is given to a connection to its host as soon
+as one is free, connections are kept open and reused for later requests
+to the same host, and every request can have its own timeout.  The
+response headers are parsed by httplib, with the same rules as
+httplib.HTTPResponse; chunked bodies are decoded.
+
+for example:
+
+    def done(response):
+        if response.error:
+            print response.url, 'failed:', response.error
+        else:
+            print response.url, response.status, len(response.body)
+
+    client = HTTPClient()
+    for url in urls:
+        client.fetch(url, done, timeout=10)
+    client.run()
+
+The callbacks are called by the loop once the connection is ready for
+another request, and an exception they raise propagates from run() (or
+asyncore.loop()).
+"""
+
+import asynchat
+import asyncore
+import select
+import socket
+import sys
+from collections import deque
+from urlparse import urlsplit
+import httplib
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+__all__ = ["HTTPClient", "Response"]
+
+# methods which may be sent again when a reused connection turns out to
+# have been closed by the server before it answered
+_IDEMPOTENT = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'])
+
+
+class Response:
+    """The outcome of a request made by an HTTPClient.
+
+    If the request failed, error is the exception and the other response
+    attributes are None.
+    """
+
+    def __init__(self, method, url, host, port, request, callback):
+        self.method = method
+        self.url = url
+        self.host = host
+        self.port = port
+        self.callback = callback
+        self.error = None
+
+        # from the response, as in httplib.HTTPResponse
+        self.version = None
+        self.status = None
+        self.reason = None
+        self.msg = None
+        self.body = None
+
+        # the bytes to send, and the connection handling the request
+        self._request = request
+        self._channel = None
+        self._timer = None
+        self._retried = False
+
+    def __repr__(self):
+        if self.error is not None:
+            state = 'error %r' % (self.error,)
+        elif self.status is None:
+            state = 'pending'
+        else:
+            state = '%s %s' % (self.status, self.reason)
+        return '<%s %s %s %s>' % (self.__class__.__name__, self.method,
+                                  self.url, state)
+
+    def read(self):
+        return self.body
+
+    def getheader(self, name, default=None):
+        if self.msg is None:
+            raise httplib.ResponseNotReady()
+        return self.msg.getheader(name, default)
+
+    def getheaders(self):
+        """Return list of (header, value) tuples."""
+        if self.msg is None:
+            raise httplib.ResponseNotReady()
+        return self.msg.items()
+
+
+class _HeaderSocket:
+    # lets httplib.HTTPResponse parse a header block we have received
+
+    def __init__(self, data):
+        self.data = data
+
+    def makefile(self, mode, bufsize=-1):
+        return StringIO(self.data)
+
+
+# States of a connection
+_IDLE = 'idle'                          # waiting for a request
+_HEADERS = 'headers'                    # reading the status and headers
+_BODY = 'body'                          # reading a body of known length
+_BODY_EOF = 'body until close'          # reading a body ended by close
+_CHUNK_SIZE = 'chunk size'              # reading a chunk-size line
+_CHUNK = 'chunk'                        # reading chunk-data
+_CHUNK_END = 'chunk end'                # reading the CRLF after chunk-data
+_TRAILER = 'trailer'                    # reading the trailer
+
+class _HTTPChannel(asynchat.async_chat):
+
+    def __init__(self, client, key):
+        asynchat.async_chat.__init__(self, map=client.map)
+        self.client = client
+        self.key = key
+        self.state = _IDLE
+        self.response = None
+        self.reused = False
+        self.expiry = None
+        self.will_close = False
+        self.set_terminator('\n')
+
+    def open(self):
+        # the name lookup blocks
+        host, port = self.key
+        af, socktype, proto, canonname, sa = socket.getaddrinfo(
+            host, port, 0, socket.SOCK_STREAM)[0]
+        self.create_socket(af, socktype)
+        self.connect(sa)
+
+    def start(self, response):
+        self.response = response
+        response._channel = self
+        self.state = _HEADERS
+        self.lines = []
+        self.body = []
+        self.received = False
+        self.set_terminator('\n')
+        self.push(response._request)
+
+    # reading the response
+
+    def collect_incoming_data(self, data):
+        self.received = True
+        if self.state in (_BODY, _BODY_EOF, _CHUNK):
+            self.body.append(data)
+        elif self.state == _IDLE:
+            # the server has nothing to say on an idle connection
+            self.close()
+            self.client._lost(self)
+        else:
+            self.incoming.append(data)
+            if sum(map(len, self.incoming)) > httplib._MAXLINE:
+                raise httplib.LineTooLong(self.state + " line")
+
+    def found_terminator(self):
+        state = self.state
+        if state in (_HEADERS, _CHUNK_SIZE, _CHUNK_END, _TRAILER):
+            line = self._get_data()
+        if state == _HEADERS:
+            self.lines.append(line + '\n')
+            if line.strip():
+                return
+            if self.lines[0].split(None, 2)[1:2] == [str(httplib.CONTINUE)]:
+                # skip the interim 100 response
+                self.lines = []
+                return
+            self.begin(''.join(self.lines))
+        elif state == _BODY:
+            self.done()
+        elif state == _CHUNK_SIZE:
+            i = line.find(';')
+            if i >= 0:
+                line = line[:i] # strip chunk-extensions
+            try:
+                size = int(line, 16)
+            except ValueError:
+                raise httplib.IncompleteRead(''.join(self.body))
+            if size:
+                self.state = _CHUNK
+                self.set_terminator(size)
+            else:
+                self.state = _TRAILER
+        elif state == _CHUNK:
+            self.state = _CHUNK_END
+            self.set_terminator('\n')
+        elif state == _CHUNK_END:
+            self.state = _CHUNK_SIZE
+        elif state == _TRAILER:
+            # read and discard trailer up to the CRLF terminator
+            if not line.strip():
+                self.done()
+
+    def begin(self, head):
+        # parse the status line and headers as httplib does
+        r = httplib.HTTPResponse(_HeaderSocket(head), strict=True,
+                                 method=self.response.method)
+        r.begin()
+        response = self.response
+        response.version = r.version
+        response.status = r.status
+        response.reason = r.reason
+        response.msg = r.msg
+        self.will_close = r.will_close
+        if r.chunked:
+            self.state = _CHUNK_SIZE
+            self.set_terminator('\n')
+        elif r.length == 0:
+            self.done()
+        elif r.length is not None:
+            self.state = _BODY
+            self.set_terminator(r.length)
+        else:
+            self.state = _BODY_EOF
+            self.set_terminator(None)
+
+    def done(self):
+        response = self.response
+        response.body = ''.join(self.body)
+        self.response = None
+        self.body = []
+        self.state = _IDLE
+        self.set_terminator('\n')
+        if self.will_close:
+            self.close()
+            self.client._lost(self)
+        else:
+            self.reused = True
+            self.client._release(self)
+        self.client._finish(response)
+
+    # connection events
+
+    def handle_connect(self):
+        pass
+
+    def handle_close(self):
+        state = self.state
+        response = self.response
+        if state == _BODY_EOF:
+            self.will_close = True
+            self.done()
+            return
+        self.close()
+        self.client._lost(self)
+        if response is None:
+            return
+        self.response = None
+        if state == _HEADERS and not self.received:
+            if (self.reused and not response._retried and
+                response.method in _IDEMPOTENT):
+                # the server closed the connection we kept open before it
+                # got the request: send it again on a new connection
+                response._retried = True
+                self.client._retry(response)
+            else:
+                self.client._fail(response, httplib.BadStatusLine(''))
+        else:
+            self.client._fail(response,
+                              httplib.IncompleteRead(''.join(self.body)))
+
+    def handle_error(self):
+        error = sys.exc_info()[1]
+        if error is not None and error is self.client._callback_error:
+            # raised by a callback: let it propagate from the loop
+            self.client._callback_error = None
+            raise
+        response = self.response
+        if response is None:
+            asynchat.async_chat.handle_error(self)
+            self.client._lost(self)
+            return
+        self.response = None
+        self.close()
+        self.client._lost(self)
+        self.client._fail(response, error)
+
+    def abort(self):
+        # called when the request times out
+        self.response = None
+        self.close()
+        self.client._lost(self)
+
+
+class HTTPClient:
+    """Make HTTP requests from an asyncore loop.
+
+    At most max_per_host connections are opened to a host; the requests
+    to a host for which they are all busy wait for one of them.  A
+    connection is closed after keep_alive seconds without requests.
+    """
+
+    def __init__(self, max_per_host=6, keep_alive=60.0, map=None):
+        if map is None:
+            map = asyncore.socket_map
+        self.map = map
+        self.max_per_host = max_per_host
+        self.keep_alive = keep_alive
+        self.pending = 0
+        self._callback_error = None
+        self._queues = {}               # (host, port) -> deque of responses
+        self._idle = {}                 # (host, port) -> list of channels
+        self._connections = {}          # (host, port) -> number of channels
+
+    def fetch(self, url, callback=None, method='GET', body=None,
+              headers={}, timeout=None):
+        """Request url and call callback with the Response when done.
+
+        Returns the Response, which is filled in when the request is
+        complete.  If timeout is given, the request fails with
+        socket.timeout unless it is complete after timeout seconds.
+        """
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        if scheme != 'http':
+            raise ValueError("unsupported URL scheme %r" % scheme)
+        host, port = self._get_hostport(netloc)
+        if not path:
+            path = '/'
+        if query:
+            path = path + '?' + query
+        request = self._build_request(method, host, port, path, body,
+                                      headers)
+        response = Response(method, url, host, port, request, callback)
+        self.pending += 1
+        if timeout is not None:
+            response._timer = asyncore.call_later(timeout, self._timeout,
+                                                  (response,), map=self.map)
+        self._queue(response)
+        return response
+
+    def run(self, use_poll=False, use_epoll=False):
+        """Run the asyncore loop until all requests are complete."""
+        if not (use_epoll and hasattr(select, 'epoll')):
+            while self.pending:
+                asyncore.loop(30.0, use_poll, self.map, 1)
+            return
+        # loop() closes its epoll object on return; keep one for all passes
+        try:
+            while self.pending:
+                asyncore.epoll_poll(asyncore._poll_timeout(30.0, self.map),
+                                    self.map, 30.0)
+                asyncore.run_timers(self.map)
+        finally:
+            asyncore._epoll_close(self.map)
+
+    def close(self):
+        """Close the idle connections."""
+        for channels in self._idle.values():
+            for channel in channels[:]:
+                channel.close()
+                self._lost(channel)
+
+    def _get_hostport(self, netloc):
+        i = netloc.rfind(':')
+        j = netloc.rfind(']')           # ipv6 addresses have [...]
+        if i > j:
+            try:
+                port = int(netloc[i+1:])
+            except ValueError:
+                if netloc[i+1:] == "": # http://foo.com:/ == http://foo.com/
+                    port = httplib.HTTP_PORT
+                else:
+                    raise httplib.InvalidURL("nonnumeric port: '%s'" %
+                                             netloc[i+1:])
+            netloc = netloc[:i]
+        else:
+            port = httplib.HTTP_PORT
+        if netloc and netloc[0] == '[' and netloc[-1] == ']':
+            netloc = netloc[1:-1]
+        return netloc, port
+
+    def _build_request(self, method, host, port, path, body, headers):
+        names = dict.fromkeys([k.lower() for k in headers])
+        lines = ['%s %s HTTP/1.1' % (method, path)]
+        if 'host' not in names:
+            if ':' in host:
+                host = '[' + host + ']'
+            if port == httplib.HTTP_PORT:
+                lines.append('Host: %s' % host)
+            else:
+                lines.append('Host: %s:%s' % (host, port))
+        if 'accept-encoding' not in names:
+            lines.append('Accept-Encoding: identity')
+        if body is not None and 'content-length' not in names:
+            lines.append('Content-Length: %d' % len(body))
+        for name, value in headers.iteritems():
+            lines.append('%s: %s' % (name, value))
+        lines.extend(['', ''])
+        request = '\r\n'.join(lines)
+        if body:
+            request = request + body
+        return request
+
+    def _queue(self, response, first=False):
+        key = (response.host, response.port)
+        queue = self._queues.setdefault(key, deque())
+        if first:
+            queue.appendleft(response)
+        else:
+            queue.append(response)
+        self._dispatch(key)
+
+    def _dispatch(self, key):
+        # give the waiting requests to the connections which are free
+        queue = self._queues.get(key)
+        while queue:
+            idle = self._idle.get(key)
+            if idle:
+                channel = idle.pop()
+                channel.expiry.cancel()
+                channel.expiry = None
+            elif self._connections.get(key, 0) < self.max_per_host:
+                channel = _HTTPChannel(self, key)
+                self._connections[key] = self._connections.get(key, 0) + 1
+                try:
+                    channel.open()
+                except socket.error, error:
+                    channel.close()
+                    self._lost(channel)
+                    self._fail(queue.popleft(), error)
+                    continue
+            else:
+                break
+            channel.start(queue.popleft())
+        if not queue:
+            self._queues.pop(key, None)
+
+    def _release(self, channel):
+        # a connection has completed a request and may be reused
+        key = channel.key
+        self._idle.setdefault(key, []).append(channel)
+        channel.expiry = asyncore.call_later(self.keep_alive, self._expire,
+                                             (channel,), map=self.map)
+        self._dispatch(key)
+
+    def _expire(self, channel):
+        channel.expiry = None
+        channel.close()
+        self._lost(channel)
+
+    def _lost(self, channel):
+        # a connection has been closed
+        key = channel.key
+        idle = self._idle.get(key)
+        if idle and channel in idle:
+            idle.remove(channel)
+            if not idle:
+                del self._idle[key]
+        if channel.expiry is not None:
+            channel.expiry.cancel()
+            channel.expiry = None
+        if channel.key is not None:
+            channel.key = None
+            self._connections[key] -= 1
+            if not self._connections[key]:
+                del self._connections[key]
+            self._dispatch(key)
+
+    def _retry(self, response):
+        response._channel = None
+        self._queue(response, first=True)
+
+    def _timeout(self, response):
+        response._timer = None
+        channel = response._channel
+        if channel is not None:
+            channel.abort()
+        else:
+            key = (response.host, response.port)
+            self._queues[key].remove(response)
+            if not self._queues[key]:
+                del self._queues[key]
+        self._fail(response, socket.timeout('timed out'))
+
+    def _fail(self, response, error):
+        response.error = error
+        response.version = response.status = response.reason = None
+        response.msg = response.body = None
+        self._finish(response)
+
+    def _finish(self, response):
+        response._channel = None
+        response._request = None
+        if response._timer is not None:
+            response._timer.cancel()
+            response._timer = None
+        self.pending -= 1
+        callback = response.callback
+        response.callback = None
+        if callback is not None:
+            try:
+                callback(response)
+            except:
+                # remember the error itself, not just that there was one:
+                # a callback run from a timer or from _fail() raises it
+                # outside of handle_error(), which must not take a later
+                # error of a channel for it
+                self._callback_error = sys.exc_info()[1]
+                raise
@@ -46,6 +46,7 @@ many of the difficult problems for you, making the task of building
 sophisticated high-performance network servers and clients a snap.
 """
 
+import heapq
 import select
 import socket
 import sys
@@ -55,7 +56,7 @@ import warnings
 import os
 from errno import EALREADY, EINPROGRESS, EWOULDBLOCK, ECONNRESET, EINVAL, \
      ENOTCONN, ESHUTDOWN, EINTR, EISCONN, EBADF, ECONNABORTED, EPIPE, EAGAIN, \
-     errorcode
+     ENOENT, EEXIST, errorcode
 
 _DISCONNECTED = frozenset((ECONNRESET, ENOTCONN, ESHUTDOWN, ECONNABORTED, EPIPE,
                            EBADF))
@@ -202,23 +203,293 @@ def poll2(timeout=0.0, map=None):
 
 poll3 = poll2                           # Alias for backward compatibility
 
-def loop(timeout=30.0, use_poll=False, map=None, count=None):
+# The epoll() loop keeps one epoll object per map, in which each fd stays
+# registered, and only tells it about changes of interest.  By default
+# readable() and writable() are called for every dispatcher on each pass,
+# as with select() and poll(), since a dispatcher's interest may be changed
+# by another one's handler or by a timer.  With a 'sweep' interval they are
+# only called again for the dispatchers which had events, which were added
+# to or removed from the map or which called events_changed(), and for all
+# of them once per interval.
+
+_epoll_states = {}                      # id(map) -> _epoll_state
+
+class _epoll_state:
+
+    def __init__(self, map):
+        self.map = map
+        self.epoll = select.epoll()
+        self.flags = {}                 # fd -> registered event mask
+        self.objs = {}                  # fd -> registered dispatcher
+        self.changed = set()            # fds to check again
+        self.last_sweep = 0.0
+
+    def close(self):
+        if _epoll_states.get(id(self.map)) is self:
+            del _epoll_states[id(self.map)]
+        self.epoll.close()
+
+    def update(self, fd):
+        obj = self.map.get(fd)
+        if obj is None:
+            flags = 0
+        else:
+            flags = 0
+            if obj.readable():
+                flags |= select.EPOLLIN | select.EPOLLPRI
+            # accepting sockets should not be writable
+            if obj.writable() and not obj.accepting:
+                flags |= select.EPOLLOUT
+            if flags:
+                # Only check for exceptions if object was either readable
+                # or writable.
+                flags |= select.EPOLLERR | select.EPOLLHUP
+        old = self.flags.get(fd, 0)
+        if self.objs.get(fd) is not obj:
+            # the fd now belongs to another socket: the old one was closed
+            # and has been dropped from the epoll set by the kernel
+            old = -1
+        if obj is None:
+            self.flags.pop(fd, None)
+            self.objs.pop(fd, None)
+        else:
+            self.flags[fd] = flags
+            self.objs[fd] = obj
+        if flags == old:
+            return
+        try:
+            if not flags:
+                self.epoll.unregister(fd)
+            elif old <= 0:
+                self.epoll.register(fd, flags)
+            else:
+                self.epoll.modify(fd, flags)
+        except (IOError, OSError), err:
+            # a closed fd is removed from the epoll set by the kernel, and
+            # its number may have been reused since
+            if err.args[0] == ENOENT and flags:
+                self.epoll.register(fd, flags)
+            elif err.args[0] == EEXIST:
+                self.epoll.modify(fd, flags)
+            elif err.args[0] not in (ENOENT, EBADF):
+                raise
+
+def _epoll_changed(map, fd):
+    state = _epoll_states.get(id(map))
+    if state is not None and state.map is map:
+        state.changed.add(fd)
+
+def _epoll_close(map):
+    state = _epoll_states.get(id(map))
+    if state is not None and state.map is map:
+        state.close()
+
+def epoll_poll(timeout=0.0, map=None, sweep=0.0):
+    # Use the Linux epoll() support of the select module.  'sweep' is the
+    # interval between full checks of the map, None for never.
+    if map is None:
+        map = socket_map
+    state = _epoll_states.get(id(map))
+    if not map:
+        if state is not None:
+            state.close()
+        return
+    if state is None or state.map is not map:
+        if state is not None:
+            # left behind by a map which has gone away, whose id() is
+            # now used by this one
+            state.close()
+        state = _epoll_states[id(map)] = _epoll_state(map)
+
+    now = time.time()
+    if (len(state.flags) != len(map) or
+        sweep is not None and now - state.last_sweep >= sweep):
+        state.last_sweep = now
+        for fd in state.flags.keys():
+            if fd not in map:
+                state.update(fd)
+        fds = map.keys()
+        state.changed.clear()
+    else:
+        fds = state.changed
+        state.changed = set()
+    for fd in fds:
+        state.update(fd)
+
+    if timeout is None:
+        timeout = -1
+    try:
+        r = state.epoll.poll(timeout)
+    except (IOError, select.error), err:
+        if err.args[0] != EINTR:
+            raise
+        r = []
+    for fd, flags in r:
+        obj = map.get(fd)
+        if obj is None:
+            continue
+        state.changed.add(fd)
+        readwrite(obj, flags)
+
+# Timers are kept per map in a heap of [deadline, sequence, call] entries;
+# the sequence number keeps calls with the same deadline in FIFO order.
+# Cancelled calls are left in the heap and skipped, unless they make up
+# more than half of it.
+
+_timer_queues = {}                      # id(map) -> _timer_queue
+
+class _timer_queue:
+
+    def __init__(self, map):
+        self.map = map
+        self.heap = []
+        self.sequence = 0
+        self.cancelled = 0
+
+    def push(self, call):
+        self.sequence += 1
+        call._entry = [call.deadline, self.sequence, call]
+        heapq.heappush(self.heap, call._entry)
+
+    def cancel(self, call):
+        call._entry[2] = None
+        self.cancelled += 1
+        if self.cancelled > 64 and self.cancelled > len(self.heap) // 2:
+            self.heap = [entry for entry in self.heap if entry[2] is not None]
+            heapq.heapify(self.heap)
+            self.cancelled = 0
+        elif len(self.heap) == self.cancelled:
+            self.close()
+
+    def close(self):
+        if _timer_queues.get(id(self.map)) is self:
+            del _timer_queues[id(self.map)]
+        for entry in self.heap:
+            entry[2] = None
+        self.heap = []
+        self.cancelled = 0
+
+    def next_deadline(self):
+        heap = self.heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+            self.cancelled -= 1
+        if heap:
+            return heap[0][0]
+        return None
+
+class _scheduled_call:
+
+    _entry = None
+
+    def __init__(self, deadline, callback, args, kwargs, map):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.map = map
+
+    def __repr__(self):
+        status = ''
+        if self._entry is None or self._entry[2] is None:
+            status = ' (done)'
+        return '<%s.%s %r at %.3f%s>' % (self.__class__.__module__,
+                                         self.__class__.__name__,
+                                         self.callback, self.deadline, status)
+
+    def cancel(self):
+        "Cancel the call if it has not been made yet."
+        entry = self._entry
+        if entry is None or entry[2] is None:
+            return
+        queue = _timer_queues.get(id(self.map))
+        if queue is not None and queue.map is self.map:
+            queue.cancel(self)
+        entry[2] = None
+
+def call_at(deadline, callback, args=(), kwargs=None, map=None):
+    """Arrange for callback(*args, **kwargs) to be called by loop() when
+    time.time() reaches deadline.  Returns an object whose cancel() method
+    withdraws the call."""
+    if map is None:
+        map = socket_map
+    queue = _timer_queues.get(id(map))
+    if queue is None or queue.map is not map:
+        queue = _timer_queues[id(map)] = _timer_queue(map)
+    call = _scheduled_call(deadline, callback, args, kwargs or {}, map)
+    queue.push(call)
+    return call
+
+def call_later(delay, callback, args=(), kwargs=None, map=None):
+    """Arrange for callback(*args, **kwargs) to be called by loop() after
+    delay seconds.  Returns an object whose cancel() method withdraws the
+    call."""
+    return call_at(time.time() + delay, callback, args, kwargs, map)
+
+def run_timers(map=None):
+    """Make the calls scheduled for map whose deadline has passed."""
+    if map is None:
+        map = socket_map
+    queue = _timer_queues.get(id(map))
+    if queue is None or queue.map is not map:
+        return
+    now = time.time()
+    last = queue.sequence
+    # calls scheduled by the callbacks wait for the next pass, so that a
+    # callback rescheduling itself with no delay cannot starve the loop
+    while True:
+        deadline = queue.next_deadline()
+        if deadline is None:
+            queue.close()
+            return
+        if deadline > now or queue.heap[0][1] > last:
+            return
+        call = heapq.heappop(queue.heap)[2]
+        call._entry[2] = None
+        call.callback(*call.args, **call.kwargs)
+
+def _poll_timeout(timeout, map):
+    queue = _timer_queues.get(id(map))
+    if queue is None or queue.map is not map:
+        return timeout
+    deadline = queue.next_deadline()
+    if deadline is None:
+        return timeout
+    delay = max(deadline - time.time(), 0.0)
+    if timeout is None or delay < timeout:
+        return delay
+    return timeout
+
+def loop(timeout=30.0, use_poll=False, map=None, count=None,
+         use_epoll=False, sweep=0.0):
     if map is None:
         map = socket_map
 
-    if use_poll and hasattr(select, 'poll'):
+    use_epoll = use_epoll and hasattr(select, 'epoll')
+    if use_epoll:
+        def poll_fun(timeout, map):
+            epoll_poll(timeout, map, sweep)
+    elif use_poll and hasattr(select, 'poll'):
         poll_fun = poll2
     else:
         poll_fun = poll
 
-    if count is None:
-        while map:
-            poll_fun(timeout, map)
+    try:
+        if count is None:
+            while map:
+                poll_fun(_poll_timeout(timeout, map), map)
+                run_timers(map)
 
-    else:
-        while map and count > 0:
-            poll_fun(timeout, map)
-            count = count - 1
+        else:
+            while map and count > 0:
+                poll_fun(_poll_timeout(timeout, map), map)
+                run_timers(map)
+                count = count - 1
+    finally:
+        if use_epoll:
+            # don't keep the epoll object and the map alive once the loop
+            # is left; the next loop() registers the channels again
+            _epoll_close(map)
 
 class dispatcher:
 
@@ -282,6 +553,7 @@ class dispatcher:
         if map is None:
             map = self._map
         map[self._fileno] = self
+        _epoll_changed(map, self._fileno)
 
     def del_channel(self, map=None):
         fd = self._fileno
@@ -290,6 +562,7 @@ class dispatcher:
         if fd in map:
             #self.log_info('closing channel %d:%s' % (fd, self))
             del map[fd]
+            _epoll_changed(map, fd)
         self._fileno = None
 
     def create_socket(self, family, type):
@@ -327,12 +600,20 @@ class dispatcher:
     def writable(self):
         return True
 
+    def events_changed(self):
+        # Tell the epoll() loop that readable() or writable() may return
+        # a different value, when this is caused by something else than
+        # an event of this dispatcher.
+        if self._fileno is not None:
+            _epoll_changed(self._map, self._fileno)
+
     # ==================================================
     # socket object methods.
     # ==================================================
 
     def listen(self, num):
         self.accepting = True
+        self.events_changed()
         if os.name == 'nt' and num > 5:
             num = 5
         return self.socket.listen(num)
@@ -548,6 +829,7 @@ class dispatcher_with_send(dispatcher):
             self.log_info('sending %s' % repr(data))
         self.out_buffer = self.out_buffer + data
         self.initiate_send()
+        self.events_changed()
 
 # ---------------------------------------------------------------------------
 # used for debugging.
@@ -590,6 +872,10 @@ def close_all(map=None, ignore_all=False):
             if not ignore_all:
                 raise
     map.clear()
+    _epoll_close(map)
+    queue = _timer_queues.get(id(map))
+    if queue is not None and queue.map is map:
+        queue.close()
 
 # Asynchronous File I/O:
 #
@@ -17,6 +17,10 @@ __all__ = ['error', 'start_new_thread', 'exit', 'get_ident', 'allocate_lock',
            'interrupt_main', 'LockType']
 
 import traceback as _traceback
+import time as _time
+
+# A dummy value
+TIMEOUT_MAX = 2**31
 
 class error(Exception):
     """Dummy implementation of thread.error."""
@@ -92,7 +96,7 @@ class LockType(object):
     def __init__(self):
         self.locked_status = False
 
-    def acquire(self, waitflag=None):
+    def acquire(self, waitflag=None, timeout=-1):
         """Dummy implementation of acquire().
 
         For blocking calls, self.locked_status is automatically set to
@@ -102,8 +106,15 @@ class LockType(object):
         is all done so that threading.Condition's assert statements
         aren't triggered and throw a little fit.
 
+        A blocking call with a timeout on a locked lock sleeps for the
+        timeout, since nothing can release the lock meanwhile, and then
+        returns False.
+
         """
         if waitflag is None or waitflag:
+            if timeout != -1 and self.locked_status:
+                _time.sleep(timeout)
+                return False
             self.locked_status = True
             return True
         else:
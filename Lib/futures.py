@@ -0,0 +1,432 @@
+"""Execute calls asynchronously using pools of threads or processes.
+
+An executor schedules calls and returns Future objects which represent
+their results.  Futures can be waited for individually, together with
+wait(), or in the order in which they finish with as_completed().
+
+The executors are built on the pools of the multiprocessing package:
+ThreadPoolExecutor uses a multiprocessing.pool.ThreadPool and
+ProcessPoolExecutor a multiprocessing.pool.Pool.
+"""
+
+import collections
+import itertools
+import threading
+import time
+import traceback
+import Queue
+
+from multiprocessing import cpu_count, TimeoutError
+from multiprocessing.pool import Pool, ThreadPool, ApplyResult, job_counter
+
+__all__ = ['FIRST_COMPLETED', 'FIRST_EXCEPTION', 'ALL_COMPLETED',
+           'CancelledError', 'TimeoutError', 'Future', 'Executor',
+           'ThreadPoolExecutor', 'ProcessPoolExecutor', 'as_completed',
+           'wait']
+
+FIRST_COMPLETED = 'FIRST_COMPLETED'
+FIRST_EXCEPTION = 'FIRST_EXCEPTION'
+ALL_COMPLETED = 'ALL_COMPLETED'
+
+# States of a future
+PENDING = 'PENDING'
+RUNNING = 'RUNNING'
+CANCELLED = 'CANCELLED'
+FINISHED = 'FINISHED'
+
+
+class Error(Exception):
+    """Base class for the exceptions of this module."""
+
+class CancelledError(Error):
+    """The future was cancelled."""
+
+
+class Future(ApplyResult):
+    """The result of a call submitted to an executor.
+
+    Futures are created by Executor.submit().  Besides the methods below
+    they support those of multiprocessing.pool.AsyncResult.
+    """
+
+    def __init__(self):
+        # registered in the pool's cache only once the call is dispatched
+        self._cond = threading.Condition(threading.Lock())
+        self._job = job_counter.next()
+        self._cache = None
+        self._executor = None
+        self._ready = False
+        self._callback = None
+        self._state = PENDING
+        self._done_callbacks = []
+        self._waiters = []
+
+    def __repr__(self):
+        return '<Future at 0x%x state=%s>' % (id(self), self._state.lower())
+
+    def cancel(self):
+        """Cancel the call if it has not been handed to a worker yet.
+
+        Returns True if the future is cancelled, False otherwise.
+        """
+        self._cond.acquire()
+        try:
+            if self._state != PENDING:
+                return self._state == CANCELLED
+            self._state = CANCELLED
+            self._success, self._value = False, CancelledError()
+            self._ready = True
+            self._cond.notify_all()
+        finally:
+            self._cond.release()
+        self._invoke_callbacks()
+        return True
+
+    def cancelled(self):
+        """Return True if the future was cancelled."""
+        return self._state == CANCELLED
+
+    def running(self):
+        """Return True if the call has been handed to a worker and has
+        not finished yet."""
+        return self._state == RUNNING
+
+    def done(self):
+        """Return True if the future was cancelled or has finished."""
+        return self._state in (CANCELLED, FINISHED)
+
+    def result(self, timeout=None):
+        """Return the value returned by the call.
+
+        Raises TimeoutError if the call has not finished after timeout
+        seconds, CancelledError if the future was cancelled, or the
+        exception raised by the call.
+        """
+        return self.get(timeout)
+
+    def exception(self, timeout=None):
+        """Return the exception raised by the call, or None if it succeeded.
+
+        Raises TimeoutError and CancelledError like result().
+        """
+        self.wait(timeout)
+        if not self._ready:
+            raise TimeoutError
+        if self._state == CANCELLED:
+            raise self._value
+        if self._success:
+            return None
+        return self._value
+
+    def add_done_callback(self, fn):
+        """Arrange for fn(future) to be called when the future is done.
+
+        If the future is already done fn is called immediately.
+        """
+        self._cond.acquire()
+        try:
+            if not self._ready:
+                self._done_callbacks.append(fn)
+                return
+        finally:
+            self._cond.release()
+        fn(self)
+
+    def _set_running(self):
+        # returns False if the future was cancelled while pending
+        self._cond.acquire()
+        try:
+            if self._state != PENDING:
+                return False
+            self._state = RUNNING
+            return True
+        finally:
+            self._cond.release()
+
+    def _set(self, i, obj, timing=None):
+        # called by the result handler thread of the pool
+        self._cond.acquire()
+        try:
+            self._success, self._value = obj
+            self._state = FINISHED
+            self._ready = True
+            self._cond.notify_all()
+        finally:
+            self._cond.release()
+        self._invoke_callbacks()
+        # dispatch the next call before leaving the cache, so that the
+        # cache of a closed pool does not empty while calls are pending
+        self._executor._call_done()
+        del self._cache[self._job]
+
+    def _add_waiter(self, queue):
+        self._cond.acquire()
+        try:
+            if not self._ready:
+                self._waiters.append(queue)
+                return
+        finally:
+            self._cond.release()
+        queue.put(self)
+
+    def _remove_waiter(self, queue):
+        self._cond.acquire()
+        try:
+            if queue in self._waiters:
+                self._waiters.remove(queue)
+        finally:
+            self._cond.release()
+
+    def _invoke_callbacks(self):
+        self._cond.acquire()
+        try:
+            callbacks, self._done_callbacks = self._done_callbacks, []
+            waiters, self._waiters = self._waiters, []
+        finally:
+            self._cond.release()
+        for queue in waiters:
+            queue.put(self)
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                traceback.print_exc()
+
+#
+# Executors
+#
+
+def _call_chunk(fn, chunk):
+    return [fn(*args) for args in chunk]
+
+def _get_chunks(argtuples, chunksize):
+    while 1:
+        chunk = tuple(itertools.islice(argtuples, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+def _iter_results(fs, chunked, end_time):
+    # cancel the remaining calls if the consumer stops early
+    try:
+        fs.reverse()
+        while fs:
+            if end_time is None:
+                result = fs[-1].result()
+            else:
+                result = fs[-1].result(end_time - time.time())
+            fs.pop()
+            if chunked:
+                for x in result:
+                    yield x
+            else:
+                yield result
+    finally:
+        for f in fs:
+            f.cancel()
+
+
+class Executor(object):
+    """Base class for executors, which run calls using a pool.
+
+    At most one call more than there are workers is handed to the pool at
+    any time; the remaining calls wait in the executor, where they can
+    still be cancelled.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._max_dispatched = pool._processes + 1
+        self._dispatched = 0
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs) and return a Future for its result."""
+        self._lock.acquire()
+        try:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new calls after shutdown')
+            future = Future()
+            self._pending.append((future, fn, args, kwargs))
+            self._dispatch()
+        finally:
+            self._lock.release()
+        return future
+
+    def map(self, fn, *iterables, **kwds):
+        """Return an iterator equivalent to itertools.imap(fn, *iterables).
+
+        All calls are submitted immediately.  Keyword arguments: timeout is
+        the maximum number of seconds to wait for the whole result, after
+        which TimeoutError is raised; chunksize is the number of calls sent
+        to a worker as one task, which reduces the overhead of submitting
+        many small calls to a ProcessPoolExecutor.
+        """
+        timeout = kwds.pop('timeout', None)
+        chunksize = kwds.pop('chunksize', 1)
+        if kwds:
+            raise TypeError('map() got an unexpected keyword argument %r' %
+                            kwds.keys()[0])
+        if chunksize < 1:
+            raise ValueError('chunksize must be >= 1')
+        end_time = None
+        if timeout is not None:
+            end_time = time.time() + timeout
+
+        argtuples = itertools.izip(*iterables)
+        if chunksize == 1:
+            fs = [self.submit(fn, *args) for args in argtuples]
+        else:
+            fs = [self.submit(_call_chunk, fn, chunk)
+                  for chunk in _get_chunks(argtuples, chunksize)]
+        return _iter_results(fs, chunksize > 1, end_time)
+
+    def shutdown(self, wait=True):
+        """Stop accepting calls and free the workers once all submitted
+        calls are done.
+
+        If wait is true, wait until that has happened.
+        """
+        self._lock.acquire()
+        try:
+            self._shutdown = True
+        finally:
+            self._lock.release()
+        self._pool.close()
+        if wait:
+            self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown(wait=True)
+
+    def _dispatch(self):
+        # called with self._lock held
+        while self._pending and self._dispatched < self._max_dispatched:
+            future, fn, args, kwargs = self._pending.popleft()
+            if not future._set_running():
+                continue                # cancelled
+            future._executor = self
+            future._cache = self._pool._cache
+            future._cache[future._job] = future
+            self._dispatched += 1
+            self._pool._taskqueue.put(
+                ([(future._job, None, fn, args, kwargs)], None)
+                )
+
+    def _call_done(self):
+        self._lock.acquire()
+        try:
+            self._dispatched -= 1
+            self._dispatch()
+        finally:
+            self._lock.release()
+
+
+class ThreadPoolExecutor(Executor):
+    """Executor which runs calls in a pool of threads."""
+
+    def __init__(self, max_workers=None):
+        """Start max_workers threads, by default five per processor."""
+        if max_workers is None:
+            try:
+                max_workers = cpu_count() * 5
+            except NotImplementedError:
+                max_workers = 5
+        Executor.__init__(self, ThreadPool(max_workers))
+
+
+class ProcessPoolExecutor(Executor):
+    """Executor which runs calls in a pool of processes.
+
+    The callables, their arguments and their results must be picklable.
+    """
+
+    def __init__(self, max_workers=None, initializer=None, initargs=()):
+        """Start max_workers processes, by default one per processor."""
+        Executor.__init__(self, Pool(max_workers, initializer, initargs))
+
+#
+# Waiting for several futures
+#
+
+DoneAndNotDoneFutures = collections.namedtuple(
+    'DoneAndNotDoneFutures', 'done not_done')
+
+def as_completed(fs, timeout=None):
+    """Return an iterator over the futures in fs which yields each as it
+    finishes or is cancelled.
+
+    Raises TimeoutError if some have not finished timeout seconds after
+    the call to as_completed().
+    """
+    if timeout is not None:
+        end_time = time.time() + timeout
+    fs = set(fs)
+    queue = Queue.Queue()
+    for f in fs:
+        f._add_waiter(queue)
+    try:
+        for i in xrange(len(fs)):
+            if timeout is None:
+                f = queue.get()
+            else:
+                try:
+                    f = queue.get(True, max(end_time - time.time(), 0))
+                except Queue.Empty:
+                    raise TimeoutError('%d (of %d) futures unfinished' %
+                                       (len(fs) - i, len(fs)))
+            yield f
+    finally:
+        for f in fs:
+            f._remove_waiter(queue)
+
+def wait(fs, timeout=None, return_when=ALL_COMPLETED):
+    """Wait for the futures in fs to finish.
+
+    return_when is FIRST_COMPLETED, FIRST_EXCEPTION (return when a call
+    raises an exception, or when all are done) or ALL_COMPLETED.  Returns a
+    named tuple (done, not_done) of sets of futures.
+    """
+    if return_when not in (FIRST_COMPLETED, FIRST_EXCEPTION, ALL_COMPLETED):
+        raise ValueError('invalid return_when: %r' % return_when)
+
+    def failed(f):
+        return f._state == FINISHED and not f._success
+
+    fs = set(fs)
+    done = set(f for f in fs if f.done())
+    not_done = fs - done
+    if (not not_done or
+        (return_when == FIRST_COMPLETED and done) or
+        (return_when == FIRST_EXCEPTION and any(failed(f) for f in done))):
+        return DoneAndNotDoneFutures(done, not_done)
+
+    if timeout is not None:
+        end_time = time.time() + timeout
+    queue = Queue.Queue()
+    for f in not_done:
+        f._add_waiter(queue)
+    try:
+        while not_done:
+            if timeout is None:
+                f = queue.get()
+            else:
+                try:
+                    f = queue.get(True, max(end_time - time.time(), 0))
+                except Queue.Empty:
+                    break
+            done.add(f)
+            not_done.discard(f)
+            if return_when == FIRST_COMPLETED:
+                break
+            if return_when == FIRST_EXCEPTION and failed(f):
+                break
+    finally:
+        for f in not_done:
+            f._remove_waiter(queue)
+    return DoneAndNotDoneFutures(done, not_done)
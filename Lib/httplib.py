@@ -68,7 +68,9 @@ Req-sent-unread-response       _CS_REQ_SENT       <response_class>
 
 from array import array
 import os
+import select
 import socket
+import stat
 from sys import py3kwarning
 from urlparse import urlsplit
 import warnings
@@ -83,7 +85,22 @@ try:
 except ImportError:
     from StringIO import StringIO
 
-__all__ = ["HTTP", "HTTPResponse", "HTTPConnection",
+try:
+    import threading as _threading
+except ImportError:
+    import dummy_threading as _threading
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+__all__ = ["HTTP", "HTTPResponse", "HTTPConnection", "HTTPConnectionPool",
            "HTTPException", "NotConnected", "UnknownProtocol",
            "UnknownTransferEncoding", "UnimplementedFileMode",
            "IncompleteRead", "InvalidURL", "ImproperConnectionState",
@@ -332,7 +349,8 @@ class HTTPResponse:
 
     # See RFC 2616 sec 19.6 and RFC 1945 sec 6 for details.
 
-    def __init__(self, sock, debuglevel=0, strict=0, method=None, buffering=False):
+    def __init__(self, sock, debuglevel=0, strict=0, method=None, buffering=False,
+                 decode_content=False):
         if buffering:
             # The caller won't be using any sock.recv() calls, so buffering
             # is fine and recommended for performance.
@@ -347,6 +365,9 @@ class HTTPResponse:
         self.debuglevel = debuglevel
         self.strict = strict
         self._method = method
+        self._decode_content = decode_content
+        self._decoder = None            # decompresses the body if not None
+        self._raw_deflate = False       # deflate data may lack its header
 
         self.msg = None
 
@@ -483,6 +504,21 @@ class HTTPResponse:
            self.length is None:
             self.will_close = 1
 
+        if self._decode_content and self.length != 0:
+            self._set_decoder(self.msg.getheader('content-encoding'))
+
+    def _set_decoder(self, encoding):
+        # without zlib the body is left encoded, as the header says
+        encoding = (encoding or '').strip().lower()
+        if zlib is None or encoding not in ('gzip', 'x-gzip', 'deflate'):
+            return
+        if encoding == 'deflate':
+            self._decoder = zlib.decompressobj()
+            self._raw_deflate = True
+        else:
+            # 16 + MAX_WBITS expects a gzip header and trailer
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
     def _check_close(self):
         conn = self.msg.getheader('connection')
         if self.version == 11:
@@ -530,6 +566,10 @@ class HTTPResponse:
     # XXX It would be nice to have readline and __iter__ for this, too.
 
     def read(self, amt=None):
+        if self._decoder is not None:
+            # may still hold data after the end of the raw body
+            return self._read_decoded(amt)
+
         if self.fp is None:
             return ''
 
@@ -537,6 +577,41 @@ class HTTPResponse:
             self.close()
             return ''
 
+        return self._read_raw(amt)
+
+    def readinto(self, b):
+        """Read up to len(b) bytes of the body into b and return their number.
+
+        b must be a bytearray or a writable memoryview.
+        """
+        if self._decoder is not None:
+            s = self._read_decoded(len(b))
+            b[:len(s)] = s
+            return len(s)
+
+        if self.fp is None:
+            return 0
+
+        if self._method == 'HEAD':
+            self.close()
+            return 0
+
+        if self.chunked:
+            return self._readinto_chunked(b)
+
+        if self.length is not None and len(b) > self.length:
+            # clip the read to the "end of response"
+            b = memoryview(b)[:self.length]
+
+        # as in read(), the connection may be .will_close
+        n = self._fp_readinto(b)
+        if self.length is not None:
+            self.length -= n
+            if not self.length:
+                self.close()
+        return n
+
+    def _read_raw(self, amt):
         if self.chunked:
             return self._read_chunked(amt)
 
@@ -565,46 +640,47 @@ class HTTPResponse:
                 self.close()
         return s
 
-    def _read_chunked(self, amt):
-        assert self.chunked != _UNKNOWN
-        chunk_left = self.chunk_left
+    def _read_decoded(self, amt):
+        # Decompress the body as it is read.  max_length keeps the output
+        # of each step to what was asked for; the rest of the input waits in
+        # unconsumed_tail.
+        decoder = self._decoder
         value = []
-        while True:
-            if chunk_left is None:
-                line = self.fp.readline(_MAXLINE + 1)
-                if len(line) > _MAXLINE:
-                    raise LineTooLong("chunk size")
-                i = line.find(';')
-                if i >= 0:
-                    line = line[:i] # strip chunk-extensions
-                try:
-                    chunk_left = int(line, 16)
-                except ValueError:
-                    # close the connection as protocol synchronisation is
-                    # probably lost
+        while amt is None or amt > 0:
+            data = decoder.unconsumed_tail
+            if not data:
+                if self.fp is not None:
+                    data = self._read_raw(amt and max(amt, 8192))
+                if not data:
+                    value.append(decoder.flush())
+                    self._decoder = None
                     self.close()
-                    raise IncompleteRead(''.join(value))
-                if chunk_left == 0:
                     break
-            if amt is None:
-                value.append(self._safe_read(chunk_left))
-            elif amt < chunk_left:
-                value.append(self._safe_read(amt))
-                self.chunk_left = chunk_left - amt
-                return ''.join(value)
-            elif amt == chunk_left:
-                value.append(self._safe_read(amt))
-                self._safe_read(2)  # toss the CRLF at the end of the chunk
-                self.chunk_left = None
-                return ''.join(value)
-            else:
-                value.append(self._safe_read(chunk_left))
-                amt -= chunk_left
+            try:
+                s = decoder.decompress(data, amt or 0)
+            except zlib.error:
+                if not self._raw_deflate:
+                    raise
+                # some servers send deflate data without the zlib header
+                self._raw_deflate = False
+                decoder = self._decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+                s = decoder.decompress(data, amt or 0)
+            self._raw_deflate = False
+            value.append(s)
+            if amt is not None:
+                amt -= len(s)
+        return ''.join(value)
 
-            # we read the whole chunk, get another
-            self._safe_read(2)      # toss the CRLF at the end of the chunk
-            chunk_left = None
+    def _read_next_chunk_size(self):
+        line = self.fp.readline(_MAXLINE + 1)
+        if len(line) > _MAXLINE:
+            raise LineTooLong("chunk size")
+        i = line.find(';')
+        if i >= 0:
+            line = line[:i] # strip chunk-extensions
+        return int(line, 16)
 
+    def _read_and_discard_trailer(self):
         # read and discard trailer up to the CRLF terminator
         ### note: we shouldn't have any trailers!
         while True:
@@ -618,11 +694,65 @@ class HTTPResponse:
             if line == '\r\n':
                 break
 
-        # we read everything; close the "file"
-        self.close()
+    def _get_chunk_left(self, partial):
+        # Return the number of bytes left in the current chunk, reading the
+        # size of the next one if needed, or 0 at the end of the body.
+        chunk_left = self.chunk_left
+        if chunk_left is None:
+            try:
+                chunk_left = self._read_next_chunk_size()
+            except ValueError:
+                # close the connection as protocol synchronisation is
+                # probably lost
+                self.close()
+                raise IncompleteRead(partial())
+            if chunk_left == 0:
+                self._read_and_discard_trailer()
+                # we read everything; close the "file"
+                self.chunk_left = 0
+                self.close()
+                return 0
+            self.chunk_left = chunk_left
+        return chunk_left
+
+    def _chunk_consumed(self, n):
+        self.chunk_left -= n
+        if not self.chunk_left:
+            self._safe_read(2)      # toss the CRLF at the end of the chunk
+            self.chunk_left = None
 
+    def _read_chunked(self, amt):
+        assert self.chunked != _UNKNOWN
+        value = []
+        partial = lambda: ''.join(value)
+        while amt is None or amt > 0:
+            chunk_left = self._get_chunk_left(partial)
+            if not chunk_left:
+                break
+            n = chunk_left if amt is None else min(amt, chunk_left)
+            value.append(self._safe_read(n))
+            self._chunk_consumed(n)
+            if amt is not None:
+                amt -= n
         return ''.join(value)
 
+    def _readinto_chunked(self, b):
+        # The chunks are read straight into b, without intermediate strings
+        # when fp supports readinto().
+        assert self.chunked != _UNKNOWN
+        mvb = memoryview(b)
+        total = 0
+        partial = lambda: mvb[:total].tobytes()
+        while total < len(mvb):
+            chunk_left = self._get_chunk_left(partial)
+            if not chunk_left:
+                break
+            n = min(len(mvb) - total, chunk_left)
+            self._safe_readinto(mvb[total:total + n])
+            self._chunk_consumed(n)
+            total += n
+        return total
+
     def _safe_read(self, amt):
         """Read the number of bytes requested, compensating for partial reads.
 
@@ -651,6 +781,24 @@ class HTTPResponse:
             amt -= len(chunk)
         return ''.join(s)
 
+    def _safe_readinto(self, b):
+        """Same as _safe_read, but for reading into a buffer."""
+        total = 0
+        while total < len(b):
+            n = self._fp_readinto(b[total:total + MAXAMOUNT])
+            if not n:
+                raise IncompleteRead(b[:total].tobytes(), len(b) - total)
+            total += n
+        return total
+
+    def _fp_readinto(self, b):
+        readinto = getattr(self.fp, 'readinto', None)
+        if readinto is not None:
+            return readinto(b)
+        s = self.fp.read(len(b))
+        b[:len(s)] = s
+        return len(s)
+
     def fileno(self):
         return self.fp.fileno()
 
@@ -666,6 +814,41 @@ class HTTPResponse:
         return self.msg.items()
 
 
+# objects supporting the buffer interface which can be sent as request bodies
+_buffer_types = (buffer, bytearray, array)
+if mmap is not None:
+    _buffer_types += (mmap.mmap,)
+
+
+def _split_hostport(host, port, default_port):
+    if port is None:
+        i = host.rfind(':')
+        j = host.rfind(']')         # ipv6 addresses have [...]
+        if i > j:
+            try:
+                port = int(host[i+1:])
+            except ValueError:
+                if host[i+1:] == "":  # http://foo.com:/ == http://foo.com/
+                    port = default_port
+                else:
+                    raise InvalidURL("nonnumeric port: '%s'" % host[i+1:])
+            host = host[:i]
+        else:
+            port = default_port
+        if host and host[0] == '[' and host[-1] == ']':
+            host = host[1:-1]
+    return host, port
+
+
+def _file_length(fd, tell):
+    # Return the length of the rest of a regular file as a string, or None
+    # for other files, whose size says nothing about what can be read.
+    st = os.fstat(fd)
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return str(max(st.st_size - tell(), 0))
+
+
 class HTTPConnection:
 
     _http_vsn = 11
@@ -676,6 +859,8 @@ class HTTPConnection:
     auto_open = 1
     debuglevel = 0
     strict = 0
+    # size of the blocks read from file bodies
+    blocksize = 65536
 
     def __init__(self, host, port=None, strict=None,
                  timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
@@ -708,24 +893,7 @@ class HTTPConnection:
             self._tunnel_headers.clear()
 
     def _set_hostport(self, host, port):
-        if port is None:
-            i = host.rfind(':')
-            j = host.rfind(']')         # ipv6 addresses have [...]
-            if i > j:
-                try:
-                    port = int(host[i+1:])
-                except ValueError:
-                    if host[i+1:] == "":  # http://foo.com:/ == http://foo.com/
-                        port = self.default_port
-                    else:
-                        raise InvalidURL("nonnumeric port: '%s'" % host[i+1:])
-                host = host[:i]
-            else:
-                port = self.default_port
-            if host and host[0] == '[' and host[-1] == ']':
-                host = host[1:-1]
-        self.host = host
-        self.port = port
+        self.host, self.port = _split_hostport(host, port, self.default_port)
 
     def set_debuglevel(self, level):
         self.debuglevel = level
@@ -774,7 +942,17 @@ class HTTPConnection:
         self.__state = _CS_IDLE
 
     def send(self, data):
-        """Send `data' to the server."""
+        """Send `data' to the server.
+
+        data may be a string, an object supporting the buffer interface
+        (such as buffer, memoryview, bytearray, array or mmap), a file
+        object or a file descriptor, a file-like object with a read()
+        method, or an iterable of strings.
+        """
+        self._send(data)
+
+    def _send(self, data, prefix='', chunked=False):
+        # prefix, if any, is sent in the same write as the start of data
         if self.sock is None:
             if self.auto_open:
                 self.connect()
@@ -782,16 +960,123 @@ class HTTPConnection:
                 raise NotConnected()
 
         if self.debuglevel > 0:
+            if prefix:
+                print "send:", repr(prefix)
             print "send:", repr(data)
-        blocksize = 8192
-        if hasattr(data,'read') and not isinstance(data, array):
+        if chunked:
+            self._send_chunked(data, prefix)
+            return
+        sendall = self.sock.sendall
+        n = self.blocksize
+        if isinstance(data, str):
+            sendall(prefix + data)
+        elif isinstance(data, memoryview):
+            sendall(prefix + data[:n].tobytes())
+            if len(data) > n:
+                sendall(data[n:])
+        elif isinstance(data, _buffer_types):
+            sendall(prefix + buffer(data, 0, n)[:])
+            if len(buffer(data)) > n:
+                sendall(buffer(data, n))
+        elif isinstance(data, (int, long, file)):
+            if not self._send_mapped(data, prefix):
+                if isinstance(data, file):
+                    self._send_readable(data.read, prefix)
+                else:
+                    self._send_readable(lambda n: os.read(data, n), prefix)
+        elif hasattr(data, 'read'):
             if self.debuglevel > 0: print "sendIng a read()able"
-            datablock = data.read(blocksize)
-            while datablock:
-                self.sock.sendall(datablock)
-                datablock = data.read(blocksize)
+            self._send_readable(data.read, prefix)
+        elif hasattr(data, '__iter__'):
+            for chunk in data:
+                if prefix:
+                    chunk = prefix + chunk
+                    prefix = ''
+                sendall(chunk)
+            if prefix:
+                sendall(prefix)
+        else:
+            if prefix:
+                sendall(prefix)
+            sendall(data)
+
+    def _send_chunked(self, data, prefix):
+        # Send data with the chunked transfer coding, for a body whose
+        # length isn't known in advance.
+        if isinstance(data, (int, long)):
+            read = lambda n: os.read(data, n)
+        else:
+            read = getattr(data, 'read', None)
+        if read is not None:
+            chunks = iter(lambda: read(self.blocksize), '')
+        elif isinstance(data, (basestring, memoryview) + _buffer_types):
+            chunks = [data]
+        else:
+            chunks = data
+        sendall = self.sock.sendall
+        for chunk in chunks:
+            if isinstance(chunk, memoryview):
+                chunk = chunk.tobytes()
+            elif not isinstance(chunk, basestring):
+                chunk = buffer(chunk)[:]
+            if not chunk:
+                # an empty chunk would end the body
+                continue
+            sendall('%s%X\r\n%s\r\n' % (prefix, len(chunk), chunk))
+            prefix = ''
+        sendall(prefix + '0\r\n\r\n')
+
+    def _send_readable(self, read, prefix):
+        self.sock.sendall(prefix + read(self.blocksize))
+        while True:
+            datablock = read(self.blocksize)
+            if not datablock:
+                break
+            self.sock.sendall(datablock)
+
+    def _send_mapped(self, data, prefix):
+        # Send the rest of a regular file from a memory map of it, so that
+        # its contents go from the page cache to the socket without being
+        # read and copied block by block.  Return False when the file
+        # can't be mapped.
+        if mmap is None:
+            return False
+        if isinstance(data, file):
+            if 'b' not in data.mode and os.name == 'nt':
+                return False
+            fd = data.fileno()
+        else:
+            fd = data
+        try:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode):
+                return False
+            size = st.st_size
+            if isinstance(data, file):
+                pos = data.tell()
+            else:
+                pos = os.lseek(fd, 0, os.SEEK_CUR)
+            if pos >= size:
+                return False
+            m = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        except (EnvironmentError, ValueError, OverflowError):
+            return False
+        try:
+            step = self.blocksize
+            self.sock.sendall(prefix + m[pos:pos+step])
+            pos += step
+            step *= 16
+            while pos < size:
+                self.sock.sendall(buffer(m, pos, step))
+                pos += step
+        finally:
+            m.close()
+        # leave the file at its end, as if it had been read
+        if isinstance(data, file):
+            data.seek(size)
         else:
-            self.sock.sendall(data)
+            os.lseek(fd, size, os.SEEK_SET)
+        return True
 
     def _output(self, s):
         """Add a line of output to the current request buffer.
@@ -800,7 +1085,7 @@ class HTTPConnection:
         """
         self._buffer.append(s)
 
-    def _send_output(self, message_body=None):
+    def _send_output(self, message_body=None, encode_chunked=False):
         """Send the currently buffered request and clear the buffer.
 
         Appends an extra \\r\\n to the buffer.
@@ -809,17 +1094,13 @@ class HTTPConnection:
         self._buffer.extend(("", ""))
         msg = "\r\n".join(self._buffer)
         del self._buffer[:]
-        # If msg and message_body are sent in a single send() call,
-        # it will avoid performance problems caused by the interaction
-        # between delayed ack and the Nagle algorithm.
-        if isinstance(message_body, str):
-            msg += message_body
-            message_body = None
-        self.send(msg)
-        if message_body is not None:
-            #message_body was not a string (i.e. it is a file) and
-            #we must run the risk of Nagle
-            self.send(message_body)
+        # If msg and (the start of) message_body are sent in a single
+        # send() call, it will avoid performance problems caused by the
+        # interaction between delayed ack and the Nagle algorithm.
+        if message_body is None:
+            self.send(msg)
+        else:
+            self._send(message_body, msg, encode_chunked)
 
     def putrequest(self, method, url, skip_host=0, skip_accept_encoding=0):
         """Send a request to the server.
@@ -942,41 +1223,56 @@ class HTTPConnection:
         hdr = '%s: %s' % (header, '\r\n\t'.join([str(v) for v in values]))
         self._output(hdr)
 
-    def endheaders(self, message_body=None):
+    def endheaders(self, message_body=None, encode_chunked=False):
         """Indicate that the last header line has been sent to the server.
 
         This method sends the request to the server.  The optional
         message_body argument can be used to pass a message body
         associated with the request.  The message body will be sent in
         the same packet as the message headers if it is string, otherwise it is
-        sent as a separate packet.
+        sent as a separate packet.  If encode_chunked is true, the body is
+        sent with the chunked transfer coding, which the caller must have
+        announced with a Transfer-Encoding header.
         """
         if self.__state == _CS_REQ_STARTED:
             self.__state = _CS_REQ_SENT
         else:
             raise CannotSendHeader()
-        self._send_output(message_body)
+        self._send_output(message_body, encode_chunked)
 
     def request(self, method, url, body=None, headers={}):
         """Send a complete request to the server."""
         self._send_request(method, url, body, headers)
 
     def _set_content_length(self, body):
-        # Set the content-length based on the body.
+        # Set the content-length based on the body, and return whether it
+        # could be determined.
         thelen = None
-        try:
-            thelen = str(len(body))
-        except TypeError, te:
-            # If this is a file-like object, try to
-            # fstat its file descriptor
+        if isinstance(body, (int, long)):
+            thelen = _file_length(body, lambda: os.lseek(body, 0, os.SEEK_CUR))
+        elif isinstance(body, (array, memoryview)):
+            thelen = str(len(body) * body.itemsize)
+        elif (hasattr(body, '__iter__') and not hasattr(body, 'read') and
+              not isinstance(body, _buffer_types)):
+            # the length of an iterable must be given explicitly
+            pass
+        else:
             try:
-                thelen = str(os.fstat(body.fileno()).st_size)
-            except (AttributeError, OSError):
-                # Don't send a length if this failed
-                if self.debuglevel > 0: print "Cannot stat!!"
+                thelen = str(len(body))
+            except (TypeError, AttributeError):
+                # If this is a file-like object, try to
+                # fstat its file descriptor
+                try:
+                    thelen = _file_length(body.fileno(), body.tell)
+                except (AttributeError, ValueError, EnvironmentError):
+                    pass
+                if thelen is None:
+                    # Don't send a length if this failed
+                    if self.debuglevel > 0: print "Cannot stat!!"
 
         if thelen is not None:
             self.putheader('Content-Length', thelen)
+        return thelen is not None
 
     def _send_request(self, method, url, body, headers):
         # Honor explicitly requested Host: and Accept-Encoding: headers.
@@ -989,14 +1285,24 @@ class HTTPConnection:
 
         self.putrequest(method, url, **skips)
 
+        encode_chunked = False
         if body is not None and 'content-length' not in header_names:
-            self._set_content_length(body)
+            if (not self._set_content_length(body) and
+                'transfer-encoding' not in header_names and
+                self._http_vsn == 11):
+                # the server could not tell where the body ends
+                self.putheader('Transfer-Encoding', 'chunked')
+                encode_chunked = True
         for hdr, value in headers.iteritems():
             self.putheader(hdr, value)
-        self.endheaders(body)
+        self.endheaders(body, encode_chunked)
 
-    def getresponse(self, buffering=False):
-        "Get the response from the server."
+    def getresponse(self, buffering=False, decode_content=False):
+        """Get the response from the server.
+
+        If decode_content is true, a gzip or deflate Content-Encoding of
+        the body is decoded as it is read.
+        """
 
         # if a prior response has been completed, then forget about it.
         if self.__response and self.__response.isclosed():
@@ -1029,6 +1335,8 @@ class HTTPConnection:
             #only add this keyword if non-default, for compatibility with
             #other response_classes.
             kwds["buffering"] = True;
+        if decode_content:
+            kwds["decode_content"] = True
         response = self.response_class(*args, **kwds)
 
         response.begin()
@@ -1045,6 +1353,205 @@ class HTTPConnection:
         return response
 
 
+class _PooledHTTPResponse(HTTPResponse):
+    # Gives its connection back to the pool once it is closed, which read()
+    # does at the end of the body.
+
+    _pool = None
+    _conn = None
+
+    def close(self):
+        fp = self.fp
+        HTTPResponse.close(self)
+        if fp is None or self._pool is None:
+            return
+        pool, conn = self._pool, self._conn
+        self._pool = self._conn = None
+        if not (self._method == 'HEAD' or self.length == 0 or
+                self.chunked and self.chunk_left == 0):
+            # closed before the end of the body
+            conn.close()
+        pool.put_connection(conn)
+
+
+class HTTPConnectionPool:
+    """A thread-safe pool of keep-alive connections.
+
+    The connections are kept per scheme, host and port.  At most maxsize
+    connections are opened to each of them; when they are all in use,
+    get_connection() waits for one to be given back if block is true, and
+    otherwise opens an extra connection which is closed when it is given
+    back.  The other arguments are passed to the connection classes.
+    """
+
+    connection_class = HTTPConnection
+    # methods which may be sent again when a kept connection turns out to
+    # have been closed by the server
+    _idempotent = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS',
+                             'TRACE'])
+
+    def __init__(self, maxsize=10, block=True,
+                 timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None,
+                 key_file=None, cert_file=None, strict=None):
+        self.maxsize = maxsize
+        self.block = block
+        self.timeout = timeout
+        self.source_address = source_address
+        self.key_file = key_file
+        self.cert_file = cert_file
+        self.strict = strict
+        self._cond = _threading.Condition(_threading.Lock())
+        self._idle = {}                 # key -> list of idle connections
+        self._count = {}                # key -> number of connections
+
+    def request(self, method, url, body=None, headers={}):
+        """Send a request for the absolute url and return the response.
+
+        The connection goes back to the pool when the response has been
+        read to the end or closed.
+        """
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        selector = path or '/'
+        if query:
+            selector = selector + '?' + query
+        return self._request(scheme, netloc, method, selector, body, headers)
+
+    def _request(self, scheme, host, method, selector, body, headers,
+                 debuglevel=0, buffering=False,
+                 timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        retry = (method in self._idempotent and
+                 (body is None or isinstance(body, str)))
+        while True:
+            conn = self.get_connection(scheme, host)
+            conn.set_debuglevel(debuglevel)
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                _set_timeout(conn, timeout)
+            reused = conn.sock is not None
+            try:
+                conn.request(method, selector, body, headers)
+                response = conn.getresponse(buffering=buffering)
+            except (socket.error, BadStatusLine):
+                conn.close()
+                self.put_connection(conn)
+                if reused and retry:
+                    # the server may have closed it just before we sent
+                    # the request: try again once, on a new connection
+                    retry = False
+                    continue
+                raise
+            except:
+                conn.close()
+                self.put_connection(conn)
+                raise
+            response._pool = self
+            response._conn = conn
+            return response
+
+    def get_connection(self, scheme, host, port=None):
+        """Return a connection to host, which may be in the form host:port.
+
+        An idle connection is reused unless the server has closed it.
+        """
+        if scheme == 'http':
+            cls = self.connection_class
+            kwds = {}
+        elif scheme == 'https' and 'HTTPSConnection' in globals():
+            cls = HTTPSConnection
+            kwds = {'key_file': self.key_file, 'cert_file': self.cert_file}
+        else:
+            raise InvalidURL("unsupported scheme %r" % (scheme,))
+        host, port = _split_hostport(host, port, cls.default_port)
+        key = (scheme, host, port)
+        self._cond.acquire()
+        try:
+            while True:
+                idle = self._idle.get(key)
+                while idle:
+                    old = idle.pop()
+                    if not _is_dropped(old.sock):
+                        # it may have been used with another timeout
+                        _set_timeout(old, self.timeout)
+                        return old
+                    old.close()
+                    self._count[key] -= 1
+                if self._count.get(key, 0) < self.maxsize or not self.block:
+                    self._count[key] = self._count.get(key, 0) + 1
+                    break
+                self._cond.wait()
+        finally:
+            self._cond.release()
+        conn = cls(host, port, strict=self.strict, timeout=self.timeout,
+                   source_address=self.source_address, **kwds)
+        conn.response_class = _PooledHTTPResponse
+        conn._pool_key = key
+        return conn
+
+    def put_connection(self, conn):
+        """Give back a connection from get_connection().
+
+        Its last response must have been read to the end, otherwise the
+        connection must have been closed.
+        """
+        key = conn._pool_key
+        if conn.sock is not None and hasattr(conn, '_save_session'):
+            # a TLS 1.3 session is only known after a response was read
+            conn._save_session()
+        self._cond.acquire()
+        try:
+            idle = self._idle.setdefault(key, [])
+            if conn.sock is not None and len(idle) < self.maxsize:
+                idle.append(conn)
+            else:
+                conn.close()
+                self._count[key] -= 1
+                if not self._count[key]:
+                    del self._count[key]
+                if not idle:
+                    del self._idle[key]
+            self._cond.notify()
+        finally:
+            self._cond.release()
+
+    def close(self):
+        """Close the idle connections."""
+        self._cond.acquire()
+        try:
+            for key, idle in self._idle.items():
+                for conn in idle:
+                    conn.close()
+                self._count[key] -= len(idle)
+                if not self._count[key]:
+                    del self._count[key]
+            self._idle.clear()
+            self._cond.notify_all()
+        finally:
+            self._cond.release()
+
+
+def _set_timeout(conn, timeout):
+    # Change the timeout of a connection, including its open socket.
+    conn.timeout = timeout
+    if conn.sock is not None:
+        if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+            timeout = socket.getdefaulttimeout()
+        conn.sock.settimeout(timeout)
+
+
+def _is_dropped(sock):
+    # An idle connection becomes readable when the server closes it (or
+    # sends something unexpected): it can't be used anymore.
+    if sock is None:
+        return True
+    try:
+        if hasattr(select, 'poll'):
+            p = select.poll()
+            p.register(sock, select.POLLIN)
+            return bool(p.poll(0))
+        return bool(select.select([sock], [], [], 0)[0])
+    except (select.error, ValueError, socket.error):
+        return True
+
+
 class HTTP:
     "Compatibility class with httplib.py from 1.5."
 
@@ -1146,13 +1653,22 @@ else:
 
         default_port = HTTPS_PORT
 
+        # TLS sessions are shared between connections to the same server
+        # (and with the same client certificate) through this cache, so
+        # that reconnecting only takes an abbreviated handshake.  Set it
+        # to None to always do a full handshake.
+        session_cache = ssl.SSLSessionCache()
+
         def __init__(self, host, port=None, key_file=None, cert_file=None,
                      strict=None, timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
-                     source_address=None):
+                     source_address=None, session_cache=None):
             HTTPConnection.__init__(self, host, port, strict, timeout,
                                     source_address)
             self.key_file = key_file
             self.cert_file = cert_file
+            if session_cache is not None:
+                self.session_cache = session_cache
+            self._session_entry = None
 
         def connect(self):
             "Connect to a host on a given (SSL) port."
@@ -1162,7 +1678,44 @@ else:
             if self._tunnel_host:
                 self.sock = sock
                 self._tunnel()
-            self.sock = ssl.wrap_socket(sock, self.key_file, self.cert_file)
+            cache = self.session_cache
+            if cache is None:
+                self.sock = ssl.wrap_socket(sock, self.key_file,
+                                            self.cert_file)
+                return
+            if self._tunnel_host:
+                # the session is the one of the server at the end of the
+                # tunnel, not of the proxy
+                host, port = _split_hostport(self._tunnel_host,
+                                             self._tunnel_port,
+                                             self.default_port)
+            else:
+                host, port = self.host, self.port
+            key = (host, port, self.key_file, self.cert_file)
+            try:
+                self.sock = ssl.wrap_socket(sock, self.key_file,
+                                            self.cert_file,
+                                            session=cache.get(key))
+            except ssl.SSLError:
+                cache.discard(key)
+                raise
+            self._session_entry = (cache, key)
+            self._save_session()
+
+        def close(self):
+            # With TLS 1.3 the server sends the session after the handshake,
+            # so it is only known once a response has been read: save it
+            # again before the socket goes away.
+            self._save_session()
+            HTTPConnection.close(self)
+
+        def _save_session(self):
+            if self.sock is None or self._session_entry is None:
+                return
+            session = self.sock.session
+            if session is not None:
+                cache, key = self._session_entry
+                cache.set(key, session)
 
     __all__.append("HTTPSConnection")
 
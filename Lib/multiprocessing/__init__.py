@@ -49,7 +49,7 @@ __all__ = [
     'allow_connection_pickling', 'BufferTooShort', 'TimeoutError',
     'Lock', 'RLock', 'Semaphore', 'BoundedSemaphore', 'Condition',
     'Event', 'Queue', 'JoinableQueue', 'Pool', 'Value', 'Array',
-    'RawValue', 'RawArray', 'SUBDEBUG', 'SUBWARNING',
+    'RawValue', 'RawArray', 'SharedBuffer', 'SUBDEBUG', 'SUBWARNING',
     ]
 
 __author__ = 'R. Oudkerk (r.m.oudkerk@gmail.com)'
@@ -210,19 +210,19 @@ def Event():
     from multiprocessing.synchronize import Event
     return Event()
 
-def Queue(maxsize=0):
+def Queue(maxsize=0, coalesce=False):
     '''
     Returns a queue object
     '''
     from multiprocessing.queues import Queue
-    return Queue(maxsize)
+    return Queue(maxsize, coalesce)
 
-def JoinableQueue(maxsize=0):
+def JoinableQueue(maxsize=0, coalesce=False):
     '''
     Returns a queue object
     '''
     from multiprocessing.queues import JoinableQueue
-    return JoinableQueue(maxsize)
+    return JoinableQueue(maxsize, coalesce)
 
 def Pool(processes=None, initializer=None, initargs=(), maxtasksperchild=None):
     '''
@@ -259,6 +259,13 @@ def Array(typecode_or_type, size_or_initializer, **kwds):
     from multiprocessing.sharedctypes import Array
     return Array(typecode_or_type, size_or_initializer, **kwds)
 
+def SharedBuffer(size_or_initializer):
+    '''
+    Returns a block of shared memory which is pickled by reference
+    '''
+    from multiprocessing.sharedctypes import SharedBuffer
+    return SharedBuffer(size_or_initializer)
+
 #
 #
 #
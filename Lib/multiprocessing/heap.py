@@ -41,11 +41,14 @@ import threading
 import itertools
 
 import _multiprocessing
-from multiprocessing.util import Finalize, info
+from multiprocessing.util import Finalize, info, get_temp_dir
 from multiprocessing.forking import assert_spawning
 
 __all__ = ['BufferWrapper']
 
+# arenas which may be mapped by name, indexed by name
+_shared_arenas = {}
+
 #
 # Inheirtable class which wraps an mmap, and from which blocks can be allocated
 #
@@ -74,6 +77,15 @@ if sys.platform == 'win32':
             self.buffer = mmap.mmap(-1, self.size, tagname=self.name)
             assert win32.GetLastError() == win32.ERROR_ALREADY_EXISTS
 
+    class SharedArena(Arena):
+
+        def __init__(self, size, name=None):
+            if name is None:
+                Arena.__init__(self, size)
+            else:
+                self.__setstate__((size, name))
+            _shared_arenas[self.name] = self
+
 else:
 
     class Arena(object):
@@ -83,6 +95,49 @@ else:
             self.size = size
             self.name = None
 
+    #
+    # An anonymous mmap is only shared with processes forked after it was
+    # created, so an arena which other processes must be able to open by
+    # name is backed by a file -- in /dev/shm where available so that its
+    # pages are never written back to disk
+    #
+
+    def _arena_dir():
+        if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+            return '/dev/shm'
+        return get_temp_dir()
+
+    class SharedArena(object):
+
+        def __init__(self, size, name=None):
+            if name is None:
+                fd, name = tempfile.mkstemp(prefix='pym-%d-' % os.getpid(),
+                                            dir=_arena_dir())
+                Finalize(None, os.unlink, args=(name,), exitpriority=-100)
+                try:
+                    os.ftruncate(fd, size)
+                except:
+                    os.close(fd)
+                    raise
+            else:
+                fd = os.open(name, os.O_RDWR)
+            try:
+                self.buffer = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            self.size = size
+            self.name = name
+            _shared_arenas[self.name] = self
+
+def open_arena(name, size):
+    '''
+    Return the shared arena called `name`, mapping it if necessary
+    '''
+    try:
+        return _shared_arenas[name]
+    except KeyError:
+        return SharedArena(size, name)
+
 #
 # Class allowing allocation of chunks of memory from arenas
 #
@@ -90,6 +145,7 @@ else:
 class Heap(object):
 
     _alignment = 8
+    _arena_type = Arena
 
     def __init__(self, size=mmap.PAGESIZE):
         self._lastpid = os.getpid()
@@ -117,7 +173,7 @@ class Heap(object):
             length = self._roundup(max(self._size, size), mmap.PAGESIZE)
             self._size *= 2
             info('allocating a new mmap of length %d', length)
-            arena = Arena(length)
+            arena = self._arena_type(length)
             self._arenas.append(arena)
             return (arena, 0, length)
         else:
@@ -230,6 +286,14 @@ class Heap(object):
         finally:
             self._lock.release()
 
+#
+# Heap whose blocks can be opened by name from any process
+#
+
+class SharedHeap(Heap):
+
+    _arena_type = SharedArena
+
 #
 # Class representing a chunk of an mmap -- can be inherited
 #
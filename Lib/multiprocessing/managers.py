@@ -53,9 +53,9 @@ from multiprocessing.forking import exit, Popen, assert_spawning, ForkingPickler
 from multiprocessing.util import Finalize, info
 
 try:
-    from cPickle import PicklingError
+    from cPickle import PicklingError, loads
 except ImportError:
-    from pickle import PicklingError
+    from pickle import PicklingError, loads
 
 #
 # Register some things for pickling
@@ -150,7 +150,8 @@ class Server(object):
     Server class which runs in a process controlled by a manager object
     '''
     public = ['shutdown', 'create', 'accept_connection', 'get_methods',
-              'debug_info', 'number_of_objects', 'dummy', 'incref', 'decref']
+              'debug_info', 'number_of_objects', 'dummy', 'incref', 'decref',
+              'accept_watcher']
 
     def __init__(self, registry, address, authkey, serializer):
         assert isinstance(authkey, bytes)
@@ -164,6 +165,8 @@ class Server(object):
 
         self.id_to_obj = {'0': (None, ())}
         self.id_to_refcount = {}
+        self.id_to_watchers = {}
+        self.watchers = {}
         self.mutex = threading.RLock()
         self.stop = 0
 
@@ -262,6 +265,9 @@ class Server(object):
                     else:
                         msg = ('#RETURN', res)
 
+                if ident in self.id_to_watchers:
+                    self.notify_watchers(ident, methodname)
+
             except AttributeError:
                 if methodname is None:
                     msg = ('#TRACEBACK', format_exc())
@@ -299,6 +305,54 @@ class Server(object):
     def fallback_getvalue(self, conn, ident, obj):
         return obj
 
+    def fallback_batch(self, conn, ident, obj, calls):
+        '''
+        Call several methods of `obj` in order and return a list of
+        (kind, result) pairs -- stops at the first call which fails
+        '''
+        exposed, gettypeid = self.id_to_obj[ident][1:]
+        results = []
+        for methodname, args, kwds in calls:
+            try:
+                if methodname not in exposed:
+                    raise AttributeError(
+                        'method %r of %r object is not in exposed=%r' %
+                        (methodname, type(obj), exposed)
+                        )
+                res = getattr(obj, methodname)(*args, **kwds)
+            except Exception, e:
+                results.append(('#ERROR', e))
+            else:
+                typeid = gettypeid and gettypeid.get(methodname, None)
+                if typeid:
+                    rident, rexposed = self.create(conn, typeid, res)
+                    token = Token(typeid, self.address, rident)
+                    results.append(('#PROXY', (rexposed, token)))
+                else:
+                    results.append(('#RETURN', res))
+            if ident in self.id_to_watchers:
+                self.notify_watchers(ident, methodname)
+            if results[-1][0] == '#ERROR':
+                break
+        return results
+
+    def fallback_watch(self, conn, ident, obj, name, readonly):
+        '''
+        Ask for watcher `name` to be told when `obj` may have changed,
+        that is whenever a method not in `readonly` is called
+        '''
+        self.mutex.acquire()
+        try:
+            if name not in self.watchers:
+                raise ValueError('no watcher named %r' % name)
+            watchers = self.id_to_watchers.setdefault(ident, {})
+            readonly = frozenset(readonly)
+            if name in watchers:
+                readonly &= watchers[name]
+            watchers[name] = readonly
+        finally:
+            self.mutex.release()
+
     def fallback_str(self, conn, ident, obj):
         return str(obj)
 
@@ -308,9 +362,55 @@ class Server(object):
     fallback_mapping = {
         '__str__':fallback_str,
         '__repr__':fallback_repr,
-        '#GETVALUE':fallback_getvalue
+        '#GETVALUE':fallback_getvalue,
+        '#BATCH':fallback_batch,
+        '#WATCH':fallback_watch
         }
 
+    def notify_watchers(self, ident, methodname):
+        '''
+        Tell each watcher of `ident` that the referent may have changed
+        '''
+        for name, readonly in self.id_to_watchers.get(ident, {}).items():
+            if methodname not in readonly:
+                watcher = self.watchers.get(name)
+                if watcher is not None:
+                    c, lock = watcher
+                    lock.acquire()
+                    try:
+                        c.send(ident)
+                    except Exception, e:
+                        util.info('failed to notify watcher %r: %r', name, e)
+                    finally:
+                        lock.release()
+
+    def accept_watcher(self, c, name):
+        '''
+        Keep this connection open to send invalidation messages over it
+        '''
+        threading.current_thread().name = name
+        self.mutex.acquire()
+        try:
+            self.watchers[name] = (c, threading.Lock())
+        finally:
+            self.mutex.release()
+        c.send(('#RETURN', None))
+        try:
+            while not self.stop:
+                c.recv()            # nothing is expected except EOF
+        except (EOFError, IOError):
+            pass
+        util.debug('got EOF -- removing watcher %r', name)
+        self.mutex.acquire()
+        try:
+            del self.watchers[name]
+            for watchers in self.id_to_watchers.values():
+                watchers.pop(name, None)
+        finally:
+            self.mutex.release()
+        c.close()
+        sys.exit(0)
+
     def dummy(self, c):
         pass
 
@@ -436,6 +536,7 @@ class Server(object):
             self.id_to_refcount[ident] -= 1
             if self.id_to_refcount[ident] == 0:
                 del self.id_to_obj[ident], self.id_to_refcount[ident]
+                self.id_to_watchers.pop(ident, None)
                 util.debug('disposing of obj with id %r', ident)
         finally:
             self.mutex.release()
@@ -632,6 +733,7 @@ class BaseManager(object):
             del BaseProxy._address_to_local[address]
         except KeyError:
             pass
+        BaseProxy._address_to_watcher.pop(address, None)
 
     address = property(lambda self: self._address)
 
@@ -685,6 +787,85 @@ class ProcessLocalSet(set):
     def __reduce__(self):
         return type(self), ()
 
+#
+# Caches of results used by proxies, and the connection over which the
+# server tells a process that they have become stale
+#
+
+class ResultCache(object):
+    '''
+    Maps (methodname, args) to the pickled reply of the server
+    '''
+    def __init__(self):
+        self.generation = 0
+        self._replies = {}
+
+    def get(self, key):
+        return self._replies.get(key)
+
+    def __getitem__(self, key):
+        return self._replies[key]
+
+    def __setitem__(self, key, data):
+        self._replies[key] = data
+
+    def __len__(self):
+        return len(self._replies)
+
+    def invalidate(self):
+        self.generation += 1
+        self._replies.clear()
+
+
+class Watcher(object):
+    '''
+    Receives invalidation messages from a manager's server in a daemon
+    thread and invalidates the caches registered for the referent
+    '''
+    def __init__(self, address, authkey, Client):
+        self.pid = os.getpid()
+        self.name = '%s|Watcher-%d' % (current_process().name, self.pid)
+        self.alive = True
+        self._caches = {}
+        self._lock = threading.Lock()
+        self._conn = Client(address, authkey=authkey)
+        dispatch(self._conn, None, 'accept_watcher', (self.name,))
+        t = threading.Thread(target=self._run, name=self.name)
+        t.daemon = True
+        t.start()
+
+    def register(self, ident, cache):
+        self._lock.acquire()
+        try:
+            if ident not in self._caches:
+                self._caches[ident] = weakref.WeakSet()
+            self._caches[ident].add(cache)
+        finally:
+            self._lock.release()
+
+    def _invalidate(self, idents):
+        self._lock.acquire()
+        try:
+            caches = []
+            for ident in idents:
+                caches.extend(self._caches.get(ident, ()))
+        finally:
+            self._lock.release()
+        for cache in caches:
+            cache.invalidate()
+
+    def _run(self):
+        try:
+            while 1:
+                self._invalidate([self._conn.recv()])
+        except (EOFError, IOError):
+            pass
+        # the manager has gone away, so nothing can be trusted any more
+        util.debug('watcher %r got EOF', self.name)
+        self.alive = False
+        self._invalidate(self._caches.keys())
+        self._conn.close()
+
 #
 # Definition of BaseProxy
 #
@@ -694,7 +875,10 @@ class BaseProxy(object):
     A base for proxies of shared objects
     '''
     _address_to_local = {}
+    _address_to_watcher = {}
     _mutex = util.ForkAwareThreadLock()
+    _cacheable_ = ()
+    _cache = None
 
     def __init__(self, token, serializer, manager=None,
                  authkey=None, exposed=None, incref=True):
@@ -747,6 +931,23 @@ class BaseProxy(object):
         '''
         Try to call a method of the referrent and return a copy of the result
         '''
+        cache = self._cache
+        key = None
+        if cache is not None:
+            if methodname not in self._cached_methods:
+                # the call may change the referent
+                cache.invalidate()
+            elif not kwds and self._watcher.alive:
+                try:
+                    data = cache.get((methodname, args))
+                except TypeError:
+                    pass            # unhashable arguments
+                else:
+                    if data is not None:
+                        return loads(data)[1]
+                    key = (methodname, args)
+                    generation = cache.generation
+
         try:
             conn = self._tls.connection
         except AttributeError:
@@ -756,8 +957,88 @@ class BaseProxy(object):
             conn = self._tls.connection
 
         conn.send((self._id, methodname, args, kwds))
+        if key is None:
+            kind, result = conn.recv()
+        else:
+            data = conn.recv_bytes()
+            kind, result = loads(data)
+            # only keep the reply if no invalidation arrived meanwhile
+            if kind == '#RETURN' and cache.generation == generation:
+                cache[key] = data
+
+        return self._convert_result(kind, result)
+
+    def _callmethods(self, calls):
+        '''
+        Call several methods of the referent using a single message and
+        return a list of copies of the results
+
+        Each item of `calls` is a tuple `(methodname, args)` or
+        `(methodname, args, kwds)`.  The calls are made in order; if one
+        raises an exception the rest are skipped and it is reraised.
+        '''
+        requests = []
+        for call in calls:
+            methodname, args = call[0], tuple(call[1])
+            kwds = len(call) > 2 and dict(call[2]) or {}
+            requests.append((methodname, args, kwds))
+
+        if self._cache is not None:
+            for methodname, args, kwds in requests:
+                if methodname not in self._cached_methods:
+                    self._cache.invalidate()
+                    break
+
+        try:
+            conn = self._tls.connection
+        except AttributeError:
+            util.debug('thread %r does not own a connection',
+                       threading.current_thread().name)
+            self._connect()
+            conn = self._tls.connection
+
+        conn.send((self._id, '#BATCH', (requests,), {}))
         kind, result = conn.recv()
+        if kind != '#RETURN':
+            raise convert_to_error(kind, result)
+        return [self._convert_result(kind, value) for kind, value in result]
+
+    def _enable_cache(self, methods=None):
+        '''
+        Cache the results of calls to `methods`, which must not modify the
+        referent; the server invalidates the cache when any other method
+        is called through any proxy for the referent
+        '''
+        if methods is None:
+            methods = self._cacheable_
+        if self._serializer != 'pickle':
+            raise ValueError('caching requires the pickle serializer')
 
+        BaseProxy._mutex.acquire()
+        try:
+            watcher = BaseProxy._address_to_watcher.get(self._token.address)
+            if (watcher is None or not watcher.alive or
+                watcher.pid != os.getpid()):
+                watcher = Watcher(self._token.address, self._authkey,
+                                  self._Client)
+                BaseProxy._address_to_watcher[self._token.address] = watcher
+        finally:
+            BaseProxy._mutex.release()
+
+        cache = ResultCache()
+        watcher.register(self._id, cache)
+        self._callmethod('#WATCH', (watcher.name, tuple(methods)))
+        self._watcher = watcher
+        self._cached_methods = frozenset(methods)
+        self._cache = cache
+
+    def _disable_cache(self):
+        '''
+        Stop caching the results of method calls
+        '''
+        self._cache = None
+
+    def _convert_result(self, kind, result):
         if kind == '#RETURN':
             return result
         elif kind == '#PROXY':
@@ -826,6 +1107,13 @@ class BaseProxy(object):
         except Exception, e:
             # the proxy may just be for a manager which has shutdown
             util.info('incref failed: %s' % e)
+        if self._cache is not None:
+            # invalidations are only delivered to the parent process
+            self._cache = None
+            try:
+                self._enable_cache(self._cached_methods)
+            except Exception, e:
+                util.info('failed to re-enable cache: %s' % e)
 
     def __reduce__(self):
         kwds = {}
@@ -1034,6 +1322,7 @@ class NamespaceProxy(BaseProxy):
 
 class ValueProxy(BaseProxy):
     _exposed_ = ('get', 'set')
+    _cacheable_ = ('get',)
     def get(self):
         return self._callmethod('get')
     def set(self, value):
@@ -1049,6 +1338,8 @@ BaseListProxy = MakeProxyType('BaseListProxy', (
     'reverse', 'sort', '__imul__'
     ))                  # XXX __getslice__ and __setslice__ unneeded in Py3.0
 class ListProxy(BaseListProxy):
+    _cacheable_ = ('__contains__', '__getitem__', '__getslice__', '__len__',
+                   'count', 'index')
     def __iadd__(self, value):
         self._callmethod('extend', (value,))
         return self
@@ -1062,16 +1353,21 @@ DictProxy = MakeProxyType('DictProxy', (
     '__setitem__', 'clear', 'copy', 'get', 'has_key', 'items',
     'keys', 'pop', 'popitem', 'setdefault', 'update', 'values'
     ))
+DictProxy._cacheable_ = (
+    '__contains__', '__getitem__', '__len__', 'copy', 'get', 'has_key',
+    'items', 'keys', 'values'
+    )
 
 
 ArrayProxy = MakeProxyType('ArrayProxy', (
     '__len__', '__getitem__', '__setitem__', '__getslice__', '__setslice__'
     ))                  # XXX __getslice__ and __setslice__ unneeded in Py3.0
+ArrayProxy._cacheable_ = ('__len__', '__getitem__', '__getslice__')
 
 
 PoolProxy = MakeProxyType('PoolProxy', (
     'apply', 'apply_async', 'close', 'imap', 'imap_unordered', 'join',
-    'map', 'map_async', 'terminate'
+    'map', 'map_async', 'stats', 'terminate'
     ))
 PoolProxy._method_to_typeid_ = {
     'apply_async': 'AsyncResult',
@@ -44,8 +44,10 @@ import itertools
 import collections
 import time
 
+from cPickle import dumps, loads, HIGHEST_PROTOCOL
+
 from multiprocessing import Process, cpu_count, TimeoutError
-from multiprocessing.util import Finalize, debug
+from multiprocessing.util import Finalize, debug, _pinned
 
 #
 # Constants representing the state of a pool
@@ -108,21 +110,77 @@ def worker(inqueue, outqueue, initializer=None, initargs=(), maxtasks=None):
             debug('worker got sentinel -- exiting')
             break
 
-        job, i, func, args, kwds = task
+        (job, i, func, args, kwds), queued = task
+        started = time.time()
         try:
             result = (True, func(*args, **kwds))
         except Exception, e:
             result = (False, e)
+        timing = (started - queued, time.time() - started)
         try:
-            put((job, i, result))
+            put((job, i, result, timing))
         except Exception as e:
             wrapped = MaybeEncodingError(e, result[1])
             debug("Possible encoding error while sending result: %s" % (
                 wrapped))
-            put((job, i, (False, wrapped)))
+            put((job, i, (False, wrapped), timing))
         completed += 1
     debug('worker exiting after %d tasks' % completed)
 
+#
+# Counters describing the work done by a pool
+#
+
+class PoolStats(object):
+    '''
+    Running totals kept by the task and result handler threads of a pool
+    '''
+    # the task handler thread is the only writer of `tasks`, `chunks` and
+    # `bytes_sent`, the result handler thread of the remaining counters
+
+    def __init__(self):
+        self.tasks = 0                  # function calls submitted
+        self.chunks = 0                 # messages sent to the workers
+        self.results = 0                # messages received from the workers
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.queue_wait = 0.0           # seconds between submit and start
+        self.task_time = 0.0            # seconds spent executing tasks
+
+    def _add_task(self, task):
+        self.chunks += 1
+        if task[2] is mapstar:
+            self.tasks += len(task[3][0][1])
+        else:
+            self.tasks += 1
+
+    def _add_result(self, timing):
+        self.results += 1
+        self.queue_wait += timing[0]
+        self.task_time += timing[1]
+
+    def asdict(self):
+        return dict(tasks=self.tasks, chunks=self.chunks,
+                    results=self.results, bytes_sent=self.bytes_sent,
+                    bytes_received=self.bytes_received,
+                    queue_wait=self.queue_wait, task_time=self.task_time)
+
+def _counting_send(conn, stats):
+    send_bytes = conn.send_bytes
+    def send(obj):
+        buf = dumps(obj, HIGHEST_PROTOCOL)
+        stats.bytes_sent += len(buf)
+        send_bytes(buf)
+    return send
+
+def _counting_recv(conn, stats):
+    recv_bytes = conn.recv_bytes
+    def recv():
+        buf = recv_bytes()
+        stats.bytes_received += len(buf)
+        return loads(buf)
+    return recv
+
 #
 # Class representing a process pool
 #
@@ -133,8 +191,13 @@ class Pool(object):
     '''
     Process = Process
 
+    # with `chunksize='auto'` chunks are sized so that a worker spends
+    # about this many seconds on each
+    chunk_time = 0.05
+
     def __init__(self, processes=None, initializer=None, initargs=(),
                  maxtasksperchild=None):
+        self._stats = PoolStats()
         self._setup_queues()
         self._taskqueue = Queue.Queue()
         self._cache = {}
@@ -169,7 +232,8 @@ class Pool(object):
 
         self._task_handler = threading.Thread(
             target=Pool._handle_tasks,
-            args=(self._taskqueue, self._quick_put, self._outqueue, self._pool)
+            args=(self._taskqueue, self._quick_put, self._outqueue,
+                  self._pool, self._stats, self._cache)
             )
         self._task_handler.daemon = True
         self._task_handler._state = RUN
@@ -177,7 +241,8 @@ class Pool(object):
 
         self._result_handler = threading.Thread(
             target=Pool._handle_results,
-            args=(self._outqueue, self._quick_get, self._cache)
+            args=(self._outqueue, self._quick_get, self._cache,
+                  self._stats)
             )
         self._result_handler.daemon = True
         self._result_handler._state = RUN
@@ -232,8 +297,8 @@ class Pool(object):
         from .queues import SimpleQueue
         self._inqueue = SimpleQueue()
         self._outqueue = SimpleQueue()
-        self._quick_put = self._inqueue._writer.send
-        self._quick_get = self._outqueue._reader.recv
+        self._quick_put = _counting_send(self._inqueue._writer, self._stats)
+        self._quick_get = _counting_recv(self._outqueue._reader, self._stats)
 
     def apply(self, func, args=(), kwds={}):
         '''
@@ -242,47 +307,72 @@ class Pool(object):
         assert self._state == RUN
         return self.apply_async(func, args, kwds).get()
 
-    def map(self, func, iterable, chunksize=None):
+    def map(self, func, iterable, chunksize=None, max_inflight=None):
         '''
         Equivalent of `map()` builtin
         '''
         assert self._state == RUN
-        return self.map_async(func, iterable, chunksize).get()
+        return self.map_async(func, iterable, chunksize,
+                              max_inflight=max_inflight).get()
 
-    def imap(self, func, iterable, chunksize=1):
+    def imap(self, func, iterable, chunksize=1, max_inflight=None):
         '''
         Equivalent of `itertools.imap()` -- can be MUCH slower than `Pool.map()`
         '''
         assert self._state == RUN
-        if chunksize == 1:
-            result = IMapIterator(self._cache)
-            self._taskqueue.put((((result._job, i, func, (x,), {})
-                         for i, x in enumerate(iterable)), result._set_length))
+        if chunksize == 'auto':
+            sizer = ChunkSizer(self.chunk_time, 2 * self._processes)
+            result = IMapIterator(self._cache, max_inflight, sizer)
+            tasks = ((result._job, i, mapstar, (x,), {})
+                     for i, x in enumerate(sizer.batches(func, iterable)))
+            self._taskqueue.put(result._throttle(
+                tasks, result._set_length, self._taskqueue))
+            return (item for chunk in result for item in chunk)
+        elif chunksize == 1:
+            result = IMapIterator(self._cache, max_inflight)
+            tasks = ((result._job, i, func, (x,), {})
+                     for i, x in enumerate(iterable))
+            self._taskqueue.put(result._throttle(
+                tasks, result._set_length, self._taskqueue))
             return result
         else:
             assert chunksize > 1
             task_batches = Pool._get_tasks(func, iterable, chunksize)
-            result = IMapIterator(self._cache)
-            self._taskqueue.put((((result._job, i, mapstar, (x,), {})
-                     for i, x in enumerate(task_batches)), result._set_length))
+            result = IMapIterator(self._cache, max_inflight)
+            tasks = ((result._job, i, mapstar, (x,), {})
+                     for i, x in enumerate(task_batches))
+            self._taskqueue.put(result._throttle(
+                tasks, result._set_length, self._taskqueue))
             return (item for chunk in result for item in chunk)
 
-    def imap_unordered(self, func, iterable, chunksize=1):
+    def imap_unordered(self, func, iterable, chunksize=1, max_inflight=None):
         '''
         Like `imap()` method but ordering of results is arbitrary
         '''
         assert self._state == RUN
-        if chunksize == 1:
-            result = IMapUnorderedIterator(self._cache)
-            self._taskqueue.put((((result._job, i, func, (x,), {})
-                         for i, x in enumerate(iterable)), result._set_length))
+        if chunksize == 'auto':
+            sizer = ChunkSizer(self.chunk_time, 2 * self._processes)
+            result = IMapUnorderedIterator(self._cache, max_inflight, sizer)
+            tasks = ((result._job, i, mapstar, (x,), {})
+                     for i, x in enumerate(sizer.batches(func, iterable)))
+            self._taskqueue.put(result._throttle(
+                tasks, result._set_length, self._taskqueue))
+            return (item for chunk in result for item in chunk)
+        elif chunksize == 1:
+            result = IMapUnorderedIterator(self._cache, max_inflight)
+            tasks = ((result._job, i, func, (x,), {})
+                     for i, x in enumerate(iterable))
+            self._taskqueue.put(result._throttle(
+                tasks, result._set_length, self._taskqueue))
             return result
         else:
             assert chunksize > 1
             task_batches = Pool._get_tasks(func, iterable, chunksize)
-            result = IMapUnorderedIterator(self._cache)
-            self._taskqueue.put((((result._job, i, mapstar, (x,), {})
-                     for i, x in enumerate(task_batches)), result._set_length))
+            result = IMapUnorderedIterator(self._cache, max_inflight)
+            tasks = ((result._job, i, mapstar, (x,), {})
+                     for i, x in enumerate(task_batches))
+            self._taskqueue.put(result._throttle(
+                tasks, result._set_length, self._taskqueue))
             return (item for chunk in result for item in chunk)
 
     def apply_async(self, func, args=(), kwds={}, callback=None):
@@ -294,7 +384,8 @@ class Pool(object):
         self._taskqueue.put(([(result._job, None, func, args, kwds)], None))
         return result
 
-    def map_async(self, func, iterable, chunksize=None, callback=None):
+    def map_async(self, func, iterable, chunksize=None, callback=None,
+                  max_inflight=None):
         '''
         Asynchronous equivalent of `map()` builtin
         '''
@@ -302,17 +393,27 @@ class Pool(object):
         if not hasattr(iterable, '__len__'):
             iterable = list(iterable)
 
-        if chunksize is None:
+        sizer = None
+        if chunksize is None or chunksize == 'auto':
+            if chunksize == 'auto':
+                sizer = ChunkSizer(self.chunk_time, 2 * self._processes)
             chunksize, extra = divmod(len(iterable), len(self._pool) * 4)
             if extra:
                 chunksize += 1
         if len(iterable) == 0:
             chunksize = 0
 
-        task_batches = Pool._get_tasks(func, iterable, chunksize)
-        result = MapResult(self._cache, chunksize, len(iterable), callback)
-        self._taskqueue.put((((result._job, i, mapstar, (x,), {})
-                              for i, x in enumerate(task_batches)), None))
+        if sizer is not None:
+            # never make chunks larger than the default size
+            sizer.maxsize = chunksize
+            task_batches = sizer.batches(func, iterable, record_starts=True)
+        else:
+            task_batches = Pool._get_tasks(func, iterable, chunksize)
+        result = MapResult(self._cache, chunksize, len(iterable), callback,
+                           max_inflight, sizer)
+        tasks = ((result._job, i, mapstar, (x,), {})
+                 for i, x in enumerate(task_batches))
+        self._taskqueue.put(result._throttle(tasks, None, self._taskqueue))
         return result
 
     @staticmethod
@@ -329,7 +430,7 @@ class Pool(object):
         debug('worker handler exiting')
 
     @staticmethod
-    def _handle_tasks(taskqueue, put, outqueue, pool):
+    def _handle_tasks(taskqueue, put, outqueue, pool, stats, cache):
         thread = threading.current_thread()
 
         for taskseq, set_length in iter(taskqueue.get, None):
@@ -338,11 +439,22 @@ class Pool(object):
                 if thread._state:
                     debug('task handler found thread._state != RUN')
                     break
+                # counted first so that stats() never sees its result
+                # before the task itself
+                stats._add_task(task)
+                # shared buffers pickled by reference must outlive the
+                # message, so the job keeps them until it is done
+                job = cache.get(task[0])
+                pins = _pinned.objects = []
                 try:
-                    put(task)
+                    put((task, time.time()))
                 except IOError:
                     debug('could not put task on queue')
                     break
+                finally:
+                    _pinned.objects = None
+                if pins and job is not None:
+                    job._pins = (job._pins or []) + pins
             else:
                 if set_length:
                     debug('doing set_length()')
@@ -368,7 +480,7 @@ class Pool(object):
         debug('task handler exiting')
 
     @staticmethod
-    def _handle_results(outqueue, get, cache):
+    def _handle_results(outqueue, get, cache, stats):
         thread = threading.current_thread()
 
         while 1:
@@ -387,9 +499,10 @@ class Pool(object):
                 debug('result handler got sentinel')
                 break
 
-            job, i, obj = task
+            job, i, obj, timing = task
+            stats._add_result(timing)
             try:
-                cache[job]._set(i, obj)
+                cache[job]._set(i, obj, timing)
             except KeyError:
                 pass
 
@@ -403,9 +516,10 @@ class Pool(object):
             if task is None:
                 debug('result handler ignoring extra sentinel')
                 continue
-            job, i, obj = task
+            job, i, obj, timing = task
+            stats._add_result(timing)
             try:
-                cache[job]._set(i, obj)
+                cache[job]._set(i, obj, timing)
             except KeyError:
                 pass
 
@@ -439,6 +553,12 @@ class Pool(object):
               'pool objects cannot be passed between processes or pickled'
               )
 
+    def stats(self):
+        '''
+        Return a dict of counters describing the work done by the pool
+        '''
+        return self._stats.asdict()
+
     def close(self):
         debug('closing pool')
         if self._state == RUN:
@@ -454,6 +574,11 @@ class Pool(object):
     def join(self):
         debug('joining pool')
         assert self._state in (CLOSE, TERMINATE)
+        # the results of an imap() job with an in-flight limit may never be
+        # consumed, which would leave the rest of its tasks unsent for good
+        for job in self._cache.values():
+            if job._inflight is not None:
+                job._inflight.open()
         self._worker_handler.join()
         self._task_handler.join()
         self._result_handler.join()
@@ -515,12 +640,177 @@ class Pool(object):
                     debug('cleaning up worker %d' % p.pid)
                     p.join()
 
+#
+# Class used to bound the number of outstanding tasks of a job
+#
+
+class InflightLimit(object):
+    '''
+    Counter of the tasks of a job which have been submitted to the pool
+    but whose results have not yet been consumed
+    '''
+
+    def __init__(self, limit):
+        if type(limit) not in (int, long) or limit < 1:
+            raise ValueError("max_inflight must be a positive integer")
+        self._lock = threading.Lock()
+        self._free = limit
+        self._open = False
+        self._waiter = None
+
+    def try_acquire(self, waiter):
+        '''
+        Take a slot if one is free, else arrange for `waiter.resume()` to be
+        called once one is
+        '''
+        self._lock.acquire()
+        try:
+            if self._free > 0 or self._open:
+                self._free -= 1
+                return True
+            self._waiter = waiter
+            return False
+        finally:
+            self._lock.release()
+
+    def release(self):
+        self._lock.acquire()
+        try:
+            self._free += 1
+            waiter, self._waiter = self._waiter, None
+        finally:
+            self._lock.release()
+        if waiter is not None:
+            waiter.resume()
+
+    def open(self):
+        '''
+        Stop limiting -- used when the pool is terminated or the results
+        of the job will no longer be consumed
+        '''
+        self._lock.acquire()
+        try:
+            self._open = True
+            waiter, self._waiter = self._waiter, None
+        finally:
+            self._lock.release()
+        if waiter is not None:
+            waiter.resume()
+
+#
+# Class used to hand the tasks of a limited job to the task handler
+#
+
+class TaskThrottle(object):
+    '''
+    Sequence of the tasks of a job which stops while one of the job's
+    limits has no free slot, and puts itself back on the task queue once
+    a slot is released
+    '''
+    # the task handler thread moves on to the tasks of other jobs while
+    # this one is waiting, so a job whose results are not being consumed
+    # never holds up the rest of the pool
+
+    def __init__(self, taskseq, limits, set_length, taskqueue):
+        self._taskseq = iter(taskseq)
+        self._limits = limits
+        self._set_length = set_length
+        self._taskqueue = taskqueue
+        self._length = 0
+
+    def resume(self):
+        self._taskqueue.put((self, None))
+
+    def __iter__(self):
+        while 1:
+            # take a slot from every limit before pulling the next item
+            # from the input
+            for i, limit in enumerate(self._limits):
+                if not limit.try_acquire(self):
+                    for taken in self._limits[:i]:
+                        taken.release()
+                    return
+            try:
+                task = self._taskseq.next()
+            except StopIteration:
+                if self._set_length:
+                    self._set_length(self._length)
+                return
+            self._length += 1
+            yield task
+
+#
+# Class used to choose chunk sizes for `chunksize='auto'`
+#
+
+class ChunkSizer(object):
+    '''
+    Chooses the size of each chunk of a job from the time workers took
+    over the chunks which have already come back
+    '''
+
+    def __init__(self, target, depth, maxsize=None):
+        self.chunksize = 1
+        self.maxsize = maxsize
+        self._target = target
+        self._per_item = None
+        self._starts = {}
+        # bound the number of outstanding chunks so that the sizes chosen
+        # follow the measurements closely
+        self.slots = InflightLimit(depth)
+
+    def batches(self, func, it, record_starts=False):
+        # each chunk is only made once the job's TaskThrottle has taken
+        # one of our slots for it
+        it = iter(it)
+        start = 0
+        for i in itertools.count():
+            x = tuple(itertools.islice(it, self.chunksize))
+            if not x:
+                return
+            if record_starts:
+                self._starts[i] = start
+                start += len(x)
+            yield (func, x)
+
+    def pop_start(self, i):
+        return self._starts.pop(i)
+
+    def record(self, obj, timing):
+        '''
+        Update the chunk size using the result of a chunk and the time the
+        worker took over it
+        '''
+        success, value = obj
+        if success and value and timing is not None:
+            per_item = timing[1] / len(value)
+            if self._per_item is None:
+                self._per_item = per_item
+            else:
+                self._per_item += (per_item - self._per_item) * 0.25
+            if self._per_item > 0:
+                size = int(self._target / self._per_item)
+            else:
+                size = self.chunksize * 2
+            size = max(1, min(size, self.chunksize * 2))
+            if self.maxsize:
+                size = min(size, self.maxsize)
+            self.chunksize = size
+        self.slots.release()
+
+    def open(self):
+        self.slots.open()
+
 #
 # Class whose instances are returned by `Pool.apply_async()`
 #
 
 class ApplyResult(object):
 
+    _inflight = None
+    _pins = None
+    _sizer = None
+
     def __init__(self, cache, callback):
         self._cond = threading.Condition(threading.Lock())
         self._job = job_counter.next()
@@ -553,7 +843,7 @@ class ApplyResult(object):
         else:
             raise self._value
 
-    def _set(self, i, obj):
+    def _set(self, i, obj, timing=None):
         self._success, self._value = obj
         if self._callback and self._success:
             self._callback(self._value)
@@ -571,7 +861,11 @@ class ApplyResult(object):
 
 class MapResult(ApplyResult):
 
-    def __init__(self, cache, chunksize, length, callback):
+    def __init__(self, cache, chunksize, length, callback, max_inflight=None,
+                 sizer=None):
+        if max_inflight is not None:
+            self._inflight = InflightLimit(max_inflight)
+        self._sizer = sizer
         ApplyResult.__init__(self, cache, callback)
         self._success = True
         self._value = [None] * length
@@ -580,14 +874,43 @@ class MapResult(ApplyResult):
             self._number_left = 0
             self._ready = True
             del cache[self._job]
+        elif sizer is not None:
+            # chunks vary in size so count items rather than chunks
+            self._number_left = length
         else:
             self._number_left = length//chunksize + bool(length % chunksize)
 
-    def _set(self, i, success_result):
+    def _throttle(self, taskseq, set_length, taskqueue):
+        # returns the item to put on the task queue for taskseq
+        limits = []
+        if self._inflight is not None:
+            limits.append(self._inflight)
+        if self._sizer is not None:
+            limits.append(self._sizer.slots)
+        if not limits:
+            return (taskseq, set_length)
+        return (TaskThrottle(taskseq, limits, set_length, taskqueue), None)
+
+    def _set(self, i, success_result, timing=None):
         success, result = success_result
+        if self._inflight is not None:
+            if success:
+                self._inflight.release()
+            else:
+                # results of the remaining chunks will be discarded
+                self._inflight.open()
+        if self._sizer is not None:
+            self._sizer.record(success_result, timing)
+            if not success:
+                self._sizer.open()
         if success:
-            self._value[i*self._chunksize:(i+1)*self._chunksize] = result
-            self._number_left -= 1
+            if self._sizer is None:
+                self._value[i*self._chunksize:(i+1)*self._chunksize] = result
+                self._number_left -= 1
+            else:
+                start = self._sizer.pop_start(i)
+                self._value[start:start+len(result)] = result
+                self._number_left -= len(result)
             if self._number_left == 0:
                 if self._callback:
                     self._callback(self._value)
@@ -616,7 +939,9 @@ class MapResult(ApplyResult):
 
 class IMapIterator(object):
 
-    def __init__(self, cache):
+    _pins = None
+
+    def __init__(self, cache, max_inflight=None, sizer=None):
         self._cond = threading.Condition(threading.Lock())
         self._job = job_counter.next()
         self._cache = cache
@@ -624,11 +949,27 @@ class IMapIterator(object):
         self._index = 0
         self._length = None
         self._unsorted = {}
+        if max_inflight is not None:
+            self._inflight = InflightLimit(max_inflight)
+        else:
+            self._inflight = None
+        self._sizer = sizer
         cache[self._job] = self
 
     def __iter__(self):
         return self
 
+    def _throttle(self, taskseq, set_length, taskqueue):
+        # returns the item to put on the task queue for taskseq
+        limits = []
+        if self._inflight is not None:
+            limits.append(self._inflight)
+        if self._sizer is not None:
+            limits.append(self._sizer.slots)
+        if not limits:
+            return (taskseq, set_length)
+        return (TaskThrottle(taskseq, limits, set_length, taskqueue), None)
+
     def next(self, timeout=None):
         self._cond.acquire()
         try:
@@ -647,6 +988,9 @@ class IMapIterator(object):
         finally:
             self._cond.release()
 
+        if self._inflight is not None:
+            self._inflight.release()
+
         success, value = item
         if success:
             return value
@@ -654,7 +998,9 @@ class IMapIterator(object):
 
     __next__ = next                    # XXX
 
-    def _set(self, i, obj):
+    def _set(self, i, obj, timing=None):
+        if self._sizer is not None:
+            self._sizer.record(obj, timing)
         self._cond.acquire()
         try:
             if self._index == i:
@@ -689,7 +1035,9 @@ class IMapIterator(object):
 
 class IMapUnorderedIterator(IMapIterator):
 
-    def _set(self, i, obj):
+    def _set(self, i, obj, timing=None):
+        if self._sizer is not None:
+            self._sizer.record(obj, timing)
         self._cond.acquire()
         try:
             self._items.append(obj)
@@ -41,8 +41,10 @@ import collections
 import time
 import atexit
 import weakref
+import struct
 
 from Queue import Empty, Full
+from cPickle import dumps, HIGHEST_PROTOCOL
 import _multiprocessing
 from multiprocessing import Pipe
 from multiprocessing.synchronize import Lock, BoundedSemaphore, Semaphore, Condition
@@ -55,10 +57,11 @@ from multiprocessing.forking import assert_spawning
 
 class Queue(object):
 
-    def __init__(self, maxsize=0):
+    def __init__(self, maxsize=0, coalesce=False):
         if maxsize <= 0:
             maxsize = _multiprocessing.SemLock.SEM_VALUE_MAX
         self._maxsize = maxsize
+        self._coalesce = coalesce
         self._reader, self._writer = Pipe(duplex=False)
         self._rlock = Lock()
         self._opid = os.getpid()
@@ -67,6 +70,9 @@ class Queue(object):
         else:
             self._wlock = Lock()
         self._sem = BoundedSemaphore(maxsize)
+        # serialises put_many() callers taking several slots, so that two of
+        # them can never each hold part of what they need
+        self._bulklock = Lock()
 
         self._after_fork()
 
@@ -76,11 +82,13 @@ class Queue(object):
     def __getstate__(self):
         assert_spawning(self)
         return (self._maxsize, self._reader, self._writer,
-                self._rlock, self._wlock, self._sem, self._opid)
+                self._rlock, self._wlock, self._sem, self._opid,
+                self._coalesce, self._bulklock)
 
     def __setstate__(self, state):
         (self._maxsize, self._reader, self._writer,
-         self._rlock, self._wlock, self._sem, self._opid) = state
+         self._rlock, self._wlock, self._sem, self._opid,
+         self._coalesce, self._bulklock) = state
         self._after_fork()
 
     def _after_fork(self):
@@ -110,6 +118,41 @@ class Queue(object):
         finally:
             self._notempty.release()
 
+    def put_many(self, objs, block=True, timeout=None):
+        assert not self._closed
+        batch = _Batch(objs)
+        if not batch:
+            return
+        self._acquire_slots(len(batch), block, timeout)
+
+        self._notempty.acquire()
+        try:
+            if self._thread is None:
+                self._start_thread()
+            self._buffer.append(batch)
+            self._notempty.notify()
+        finally:
+            self._notempty.release()
+
+    def _acquire_slots(self, n, block, timeout):
+        # take n slots from the semaphore or none at all
+        if n > self._maxsize:
+            raise ValueError("more than maxsize items")
+        if block and timeout is not None:
+            deadline = time.time() + timeout
+        if not self._bulklock.acquire(block, timeout):
+            raise Full
+        try:
+            for i in xrange(n):
+                if block and timeout is not None:
+                    timeout = max(deadline - time.time(), 0)
+                if not self._sem.acquire(block, timeout):
+                    for j in xrange(i):
+                        self._sem.release()
+                    raise Full
+        finally:
+            self._bulklock.release()
+
     def get(self, block=True, timeout=None):
         if block and timeout is None:
             self._rlock.acquire()
@@ -138,6 +181,33 @@ class Queue(object):
             finally:
                 self._rlock.release()
 
+    def get_many(self, max_items=None, block=True, timeout=None):
+        '''
+        Remove and return a list of up to `max_items` items, blocking as for
+        `get()` until at least one is available
+        '''
+        if block and timeout is not None:
+            deadline = time.time() + timeout
+        if not self._rlock.acquire(block, timeout):
+            raise Empty
+        try:
+            if block and timeout is not None:
+                timeout = deadline - time.time()
+                if timeout < 0 or not self._poll(timeout):
+                    raise Empty
+            elif not block and not self._poll():
+                raise Empty
+            res = []
+            while max_items is None or len(res) < max_items:
+                res.append(self._recv())
+                if not self._poll():
+                    break
+            for i in xrange(len(res)):
+                self._sem.release()
+            return res
+        finally:
+            self._rlock.release()
+
     def qsize(self):
         # Raises NotImplementedError on Mac OSX because of broken sem_getvalue()
         return self._maxsize - self._sem._semlock._get_value()
@@ -179,10 +249,14 @@ class Queue(object):
 
         # Start thread which transfers data from buffer to pipe
         self._buffer.clear()
+        if self._wlock is None:
+            writefd = None
+        else:
+            writefd = self._writer.fileno()
         self._thread = threading.Thread(
             target=Queue._feed,
             args=(self._buffer, self._notempty, self._send,
-                  self._wlock, self._writer.close),
+                  self._wlock, self._writer.close, self._coalesce, writefd),
             name='QueueFeederThread'
             )
         self._thread.daemon = True
@@ -227,7 +301,8 @@ class Queue(object):
             notempty.release()
 
     @staticmethod
-    def _feed(buffer, notempty, send, writelock, close):
+    def _feed(buffer, notempty, send, writelock, close, coalesce=False,
+              writefd=None):
         debug('starting thread to feed data to pipe')
         from .util import is_exiting
 
@@ -258,7 +333,25 @@ class Queue(object):
                             close()
                             return
 
-                        if wacquire is None:
+                        if coalesce and buffer:
+                            obj = _coalesce(obj, buffer)
+
+                        if type(obj) is _Batch:
+                            # each item is still a message of its own, so
+                            # that any reader can take it
+                            if wacquire is None:
+                                # a win32 pipe is message oriented
+                                for item in obj:
+                                    send(item)
+                            else:
+                                # but the whole batch is written at once
+                                data = _frame_batch(obj)
+                                wacquire()
+                                try:
+                                    _write_all(writefd, data)
+                                finally:
+                                    wrelease()
+                        elif wacquire is None:
                             send(obj)
                         else:
                             wacquire()
@@ -284,6 +377,46 @@ class Queue(object):
 
 _sentinel = object()
 
+#
+# Batches of items which the feeder thread writes to the pipe together
+#
+
+class _Batch(list):
+    pass
+
+def _frame_batch(batch):
+    # the messages of the items of batch, framed as Connection.send()
+    # frames one: a 32 bit length in network order followed by the pickle
+    frames = []
+    for item in batch:
+        data = dumps(item, HIGHEST_PROTOCOL)
+        if len(data) > 0x7fffffff:
+            raise ValueError("message too long")
+        frames.append(struct.pack('!I', len(data)))
+        frames.append(data)
+    return ''.join(frames)
+
+def _write_all(fd, data):
+    n = os.write(fd, data)
+    while n < len(data):
+        n += os.write(fd, buffer(data, n))
+
+def _coalesce(obj, buffer):
+    # pack obj and the items buffered after it into one batch -- called by
+    # the feeder thread which is the only one to remove items from buffer
+    batch = _Batch()
+    while 1:
+        if type(obj) is _Batch:
+            batch.extend(obj)
+        else:
+            batch.append(obj)
+        if not buffer:
+            return batch
+        obj = buffer.popleft()
+        if obj is _sentinel:
+            buffer.appendleft(obj)
+            return batch
+
 #
 # A queue type which also supports join() and task_done() methods
 #
@@ -294,8 +427,8 @@ _sentinel = object()
 
 class JoinableQueue(Queue):
 
-    def __init__(self, maxsize=0):
-        Queue.__init__(self, maxsize)
+    def __init__(self, maxsize=0, coalesce=False):
+        Queue.__init__(self, maxsize, coalesce)
         self._unfinished_tasks = Semaphore(0)
         self._cond = Condition()
 
@@ -323,6 +456,26 @@ class JoinableQueue(Queue):
             self._cond.release()
             self._notempty.release()
 
+    def put_many(self, objs, block=True, timeout=None):
+        assert not self._closed
+        batch = _Batch(objs)
+        if not batch:
+            return
+        self._acquire_slots(len(batch), block, timeout)
+
+        self._notempty.acquire()
+        self._cond.acquire()
+        try:
+            if self._thread is None:
+                self._start_thread()
+            self._buffer.append(batch)
+            for i in xrange(len(batch)):
+                self._unfinished_tasks.release()
+            self._notempty.notify()
+        finally:
+            self._cond.release()
+            self._notempty.release()
+
     def task_done(self):
         self._cond.acquire()
         try:
@@ -35,11 +35,15 @@
 import sys
 import ctypes
 import weakref
+import threading
+import _multiprocessing
 
 from multiprocessing import heap, RLock
 from multiprocessing.forking import assert_spawning, ForkingPickler
+from multiprocessing.util import Finalize, pin_while_sending
 
-__all__ = ['RawValue', 'RawArray', 'Value', 'Array', 'copy', 'synchronized']
+__all__ = ['RawValue', 'RawArray', 'Value', 'Array', 'copy', 'synchronized',
+           'SharedBuffer']
 
 #
 #
@@ -165,6 +169,87 @@ def rebuild_ctype(type_, wrapper, length):
     obj._wrapper = wrapper
     return obj
 
+#
+# Buffer in shared memory which is pickled by reference
+#
+
+class SharedBuffer(object):
+    '''
+    Block of shared memory which is pickled as a reference (arena name,
+    offset and length) rather than by value, so it can be passed to any
+    process on the same machine -- including the workers of an existing
+    pool -- without copying its contents
+    '''
+
+    _heap = heap.SharedHeap()
+    _write_lock = threading.Lock()
+    _block = None       # only set in the process which owns the block
+
+    def __init__(self, size_or_initializer):
+        if isinstance(size_or_initializer, (int, long)):
+            data = None
+            size = size_or_initializer
+        else:
+            data = buffer(size_or_initializer)
+            size = len(data)
+        block = SharedBuffer._heap.malloc(size)
+        arena, start, stop = block
+        self._arena, self._start, self._size = arena, start, size
+        if data is None:
+            address, length = _multiprocessing.address_of_buffer(arena.buffer)
+            ctypes.memset(address + start, 0, size)
+        else:
+            SharedBuffer._write_lock.acquire()
+            try:
+                arena.buffer.seek(start)
+                arena.buffer.write(data)
+            finally:
+                SharedBuffer._write_lock.release()
+        # the block is freed when the creating process drops its last
+        # reference -- unpickling in that process returns this object, and
+        # a pool keeps the buffers sent with a task until its result is in
+        self._block = block
+        Finalize(self, SharedBuffer._heap.free, args=(block,))
+        _owned_buffers[(arena.name, start)] = self
+
+    def __len__(self):
+        return self._size
+
+    def __reduce__(self):
+        if self._block is not None:
+            pin_while_sending(self)
+        return rebuild_shared_buffer, (self._arena.name, self._arena.size,
+                                       self._start, self._size)
+
+    def get_buffer(self):
+        '''
+        Return a read-only `buffer` object referring to the shared memory
+        '''
+        return buffer(self._arena.buffer, self._start, self._size)
+
+    def get_array(self, typecode_or_type='c'):
+        '''
+        Return a ctypes array which refers to the shared memory
+        '''
+        type_ = typecode_to_type.get(typecode_or_type, typecode_or_type)
+        length = self._size // ctypes.sizeof(type_)
+        return (type_ * length).from_buffer(self._arena.buffer, self._start)
+
+    def __repr__(self):
+        return '<SharedBuffer of %d bytes at %s+%d>' % (
+            self._size, self._arena.name, self._start)
+
+_owned_buffers = weakref.WeakValueDictionary()
+
+def rebuild_shared_buffer(name, arena_size, start, size):
+    obj = _owned_buffers.get((name, start))
+    if obj is not None and obj._size == size:
+        return obj
+    obj = SharedBuffer.__new__(SharedBuffer)
+    obj._arena = heap.open_arena(name, arena_size)
+    obj._start, obj._size = start, size
+    return obj
+
 #
 # Function to create properties
 #
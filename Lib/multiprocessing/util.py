@@ -315,3 +315,19 @@ class ForkAwareLocal(threading.local):
         register_after_fork(self, lambda obj : obj.__dict__.clear())
     def __reduce__(self):
         return type(self), ()
+
+#
+# Objects which are pickled by reference (like SharedBuffer) and must be
+# kept alive by the sender until the receiver is done with them
+#
+
+_pinned = threading.local()
+
+def pin_while_sending(obj):
+    '''
+    Called when `obj` is pickled by reference; if the current thread is
+    collecting pinned objects (see `Pool`) then `obj` is added to them
+    '''
+    pins = getattr(_pinned, 'objects', None)
+    if pins is not None:
+        pins.append(obj)
@@ -26,6 +26,10 @@ socket.getdefaulttimeout() -- get the default timeout value
 socket.setdefaulttimeout() -- set the default timeout value
 create_connection() -- connects to an address, with an optional timeout and
                        optional source address.
+setaddrinfocache() -- set the AddrInfoCache used by create_connection()
+getdefaultconnectdelay() -- get the delay between parallel connection attempts
+setdefaultconnectdelay() -- set the delay between parallel connection attempts
+getaddrinfocache() -- get the AddrInfoCache used by create_connection()
 
  [*] not available on all platforms!
 
@@ -80,11 +84,13 @@ else:
          SSL_ERROR_INVALID_ERROR_CODE
 
 import os, sys, warnings
+from time import time as _time
+from collections import OrderedDict as _OrderedDict
 
 try:
-    from cStringIO import StringIO
+    import thread as _thread
 except ImportError:
-    from StringIO import StringIO
+    import dummy_thread as _thread
 
 try:
     import errno
@@ -93,7 +99,9 @@ except ImportError:
 EBADF = getattr(errno, 'EBADF', 9)
 EINTR = getattr(errno, 'EINTR', 4)
 
-__all__ = ["getfqdn", "create_connection"]
+__all__ = ["getfqdn", "create_connection", "AddrInfoCache",
+           "getaddrinfocache", "setaddrinfocache", "getdefaultconnectdelay",
+           "setdefaultconnectdelay"]
 __all__.extend(os._get_exports_list(_socket))
 
 
@@ -240,8 +248,8 @@ class _fileobject(object):
 
     __slots__ = ["mode", "bufsize", "softspace",
                  # "closed" is a property, see below
-                 "_sock", "_rbufsize", "_wbufsize", "_rbuf", "_wbuf", "_wbuf_len",
-                 "_close"]
+                 "_sock", "_rbufsize", "_wbufsize", "_rbuf", "_rpos", "_rend",
+                 "_wbuf", "_close"]
 
     def __init__(self, sock, mode='rb', bufsize=-1, close=False):
         self._sock = sock
@@ -260,13 +268,15 @@ class _fileobject(object):
         else:
             self._rbufsize = bufsize
         self._wbufsize = bufsize
-        # We use StringIO for the read buffer to avoid holding a list
-        # of variously sized string objects which have been known to
-        # fragment the heap due to how they are malloc()ed and often
-        # realloc()ed down much smaller than their original allocation.
-        self._rbuf = StringIO()
-        self._wbuf = [] # A list of strings
-        self._wbuf_len = 0
+        # The read buffer is a single bytearray that recv_into() fills in
+        # place.  The unread data is _rbuf[_rpos:_rend]; consuming data only
+        # advances _rpos, so readline() does not copy whatever is left in
+        # the buffer after each line.  The bytearray is reused rather than
+        # reallocated for every recv(), which also avoids the heap
+        # fragmentation a list of variously sized strings causes.
+        self._rbuf = bytearray()
+        self._rpos = self._rend = 0
+        self._wbuf = bytearray()
         self._close = close
 
     def _getclosed(self):
@@ -291,9 +301,7 @@ class _fileobject(object):
 
     def flush(self):
         if self._wbuf:
-            data = "".join(self._wbuf)
-            self._wbuf = []
-            self._wbuf_len = 0
+            data = self._wbuf
             buffer_size = max(self._rbufsize, self.default_bufsize)
             data_size = len(data)
             write_offset = 0
@@ -303,11 +311,9 @@ class _fileobject(object):
                     self._sock.sendall(view[write_offset:write_offset+buffer_size])
                     write_offset += buffer_size
             finally:
-                if write_offset < data_size:
-                    remainder = data[write_offset:]
-                    del view, data  # explicit free
-                    self._wbuf.append(remainder)
-                    self._wbuf_len = len(remainder)
+                # Keep whatever could not be sent for the next flush().
+                del view
+                del data[:write_offset]
 
     def fileno(self):
         return self._sock.fileno()
@@ -316,197 +322,201 @@ class _fileobject(object):
         data = str(data) # XXX Should really reject non-string non-buffers
         if not data:
             return
-        self._wbuf.append(data)
-        self._wbuf_len += len(data)
+        self._wbuf += data
         if (self._wbufsize == 0 or
             self._wbufsize == 1 and '\n' in data or
-            self._wbuf_len >= self._wbufsize):
+            len(self._wbuf) >= self._wbufsize):
             self.flush()
 
     def writelines(self, list):
-        # XXX We could do better here for very long lists
         # XXX Should really reject non-string non-buffers
-        lines = filter(None, map(str, list))
-        self._wbuf_len += sum(map(len, lines))
-        self._wbuf.extend(lines)
+        wbuf = self._wbuf
+        for line in list:
+            wbuf += str(line)
         if (self._wbufsize <= 1 or
-            self._wbuf_len >= self._wbufsize):
+            len(wbuf) >= self._wbufsize):
             self.flush()
 
+    def _reserve(self, size):
+        # Make room for size bytes after the unread data, moving that data
+        # to the front of the buffer and growing the buffer only as needed.
+        buf = self._rbuf
+        if len(buf) - self._rend >= size:
+            return
+        if self._rpos:
+            n = self._rend - self._rpos
+            buf[:n] = buf[self._rpos:self._rend]
+            self._rpos, self._rend = 0, n
+            if len(buf) - n >= size:
+                return
+        buf += bytearray(max(size - (len(buf) - self._rend), len(buf)))
+
+    def _append(self, data):
+        n = len(data)
+        self._reserve(n)
+        self._rbuf[self._rend:self._rend + n] = data
+        self._rend += n
+
+    def _recv(self, size):
+        # Receive at most size bytes onto the end of the read buffer and
+        # return how many arrived (0 at EOF).  Sockets providing recv_into()
+        # write straight into the buffer; anything else (urllib2 wraps an
+        # HTTPResponse with only a recv() method) is copied in.
+        recv_into = getattr(self._sock, 'recv_into', None)
+        while True:
+            try:
+                if recv_into is None:
+                    data = self._sock.recv(size)
+                    self._append(data)
+                    return len(data)
+                self._reserve(size)
+                end = self._rend
+                n = recv_into(memoryview(self._rbuf)[end:end + size])
+            except error, e:
+                if e.args[0] == EINTR:
+                    continue
+                raise
+            self._rend += n
+            return n
+
+    def _take(self, size):
+        # Return and consume the first size bytes of unread data.
+        start = self._rpos
+        end = start + size
+        if size < self.default_bufsize:
+            data = str(self._rbuf[start:end])
+        else:
+            data = memoryview(self._rbuf)[start:end].tobytes()
+        if end < self._rend:
+            self._rpos = end
+        else:
+            self._rpos = self._rend = 0
+            if len(self._rbuf) > 4 * max(self._rbufsize, self.default_bufsize):
+                # Don't hang on to the memory of one unusually large read.
+                self._rbuf = bytearray()
+        return data
+
     def read(self, size=-1):
         # Use max, disallow tiny reads in a loop as they are very inefficient.
         # We never leave read() with any leftover data from a new recv() call
         # in our internal buffer.
         rbufsize = max(self._rbufsize, self.default_bufsize)
-        # Our use of StringIO rather than lists of string objects returned by
-        # recv() minimizes memory usage and fragmentation that occurs when
-        # rbufsize is large compared to the typical return value of recv().
-        buf = self._rbuf
-        buf.seek(0, 2)  # seek end
         if size < 0:
             # Read until EOF
-            self._rbuf = StringIO()  # reset _rbuf.  we consume it via buf.
+            while self._recv(rbufsize):
+                pass
+            return self._take(self._rend - self._rpos)
+        # Read until size bytes or EOF seen, whichever comes first
+        buf_len = self._rend - self._rpos
+        if buf_len >= size:
+            # Already have size bytes in our buffer?  Extract and return.
+            return self._take(size)
+        if not buf_len:
             while True:
                 try:
-                    data = self._sock.recv(rbufsize)
+                    data = self._sock.recv(size)
                 except error, e:
                     if e.args[0] == EINTR:
                         continue
                     raise
-                if not data:
-                    break
-                buf.write(data)
-            return buf.getvalue()
-        else:
-            # Read until size bytes or EOF seen, whichever comes first
-            buf_len = buf.tell()
-            if buf_len >= size:
-                # Already have size bytes in our buffer?  Extract and return.
-                buf.seek(0)
-                rv = buf.read(size)
-                self._rbuf = StringIO()
-                self._rbuf.write(buf.read())
-                return rv
-
-            self._rbuf = StringIO()  # reset _rbuf.  we consume it via buf.
-            while True:
-                left = size - buf_len
-                # recv() will malloc the amount of memory given as its
-                # parameter even though it often returns much less data
-                # than that.  The returned data string is short lived
-                # as we copy it into a StringIO and free it.  This avoids
-                # fragmentation issues on many platforms.
-                try:
-                    data = self._sock.recv(left)
-                except error, e:
-                    if e.args[0] == EINTR:
-                        continue
-                    raise
-                if not data:
-                    break
-                n = len(data)
-                if n == size and not buf_len:
-                    # Shortcut.  Avoid buffer data copies when:
-                    # - We have no data in our buffer.
-                    # AND
-                    # - Our call to recv returned exactly the
-                    #   number of bytes we were asked to read.
-                    return data
-                if n == left:
-                    buf.write(data)
-                    del data  # explicit free
-                    break
-                assert n <= left, "recv(%d) returned %d bytes" % (left, n)
-                buf.write(data)
-                buf_len += n
-                del data  # explicit free
-                #assert buf_len == buf.tell()
-            return buf.getvalue()
+                break
+            if len(data) == size or not data:
+                # Shortcut.  Avoid buffer data copies when our call to recv
+                # returned exactly the number of bytes we were asked to read.
+                return data
+            self._append(data)
+            buf_len = len(data)
+            del data  # explicit free
+        while buf_len < size:
+            n = self._recv(size - buf_len)
+            if not n:
+                break
+            buf_len += n
+        return self._take(min(buf_len, size))
+
+    def readinto(self, b):
+        """Read up to len(b) bytes into the writable buffer b.
+
+        Like read(), this only returns early at EOF; the number of bytes
+        read is returned.  Data beyond what is already buffered is received
+        directly into b.
+        """
+        view = memoryview(b)
+        size = len(view)
+        n = min(self._rend - self._rpos, size)
+        if n:
+            start = self._rpos
+            view[:n] = memoryview(self._rbuf)[start:start + n]
+            if start + n < self._rend:
+                self._rpos = start + n
+            else:
+                self._rpos = self._rend = 0
+        recv_into = getattr(self._sock, 'recv_into', None)
+        while n < size:
+            try:
+                if recv_into is None:
+                    data = self._sock.recv(size - n)
+                    received = len(data)
+                    view[n:n + received] = data
+                else:
+                    received = recv_into(view[n:])
+            except error, e:
+                if e.args[0] == EINTR:
+                    continue
+                raise
+            if not received:
+                break
+            n += received
+        return n
 
     def readline(self, size=-1):
         buf = self._rbuf
-        buf.seek(0, 2)  # seek end
-        if buf.tell() > 0:
-            # check if we already have it in our buffer
-            buf.seek(0)
-            bline = buf.readline(size)
-            if bline.endswith('\n') or len(bline) == size:
-                self._rbuf = StringIO()
-                self._rbuf.write(buf.read())
-                return bline
-            del bline
-        if size < 0:
-            # Read until \n or EOF, whichever comes first
+        # Bytes after _rpos already searched for a newline; only data
+        # received since the last search gets scanned again.
+        scanned = 0
+        while True:
+            start = self._rpos
+            avail = self._rend - start
+            end = self._rend
+            if 0 <= size < avail:
+                end = start + size
+            nl = buf.find('\n', start + scanned, end)
+            if nl >= 0:
+                return self._take(nl + 1 - start)
+            if 0 <= size <= avail:
+                return self._take(size)
             if self._rbufsize <= 1:
-                # Speed up unbuffered case
-                buf.seek(0)
-                buffers = [buf.read()]
-                self._rbuf = StringIO()  # reset _rbuf.  we consume it via buf.
-                data = None
-                recv = self._sock.recv
-                while True:
-                    try:
-                        while data != "\n":
-                            data = recv(1)
-                            if not data:
-                                break
-                            buffers.append(data)
-                    except error, e:
-                        # The try..except to catch EINTR was moved outside the
-                        # recv loop to avoid the per byte overhead.
-                        if e.args[0] == EINTR:
-                            continue
-                        raise
-                    break
-                return "".join(buffers)
-
-            buf.seek(0, 2)  # seek end
-            self._rbuf = StringIO()  # reset _rbuf.  we consume it via buf.
-            while True:
-                try:
-                    data = self._sock.recv(self._rbufsize)
-                except error, e:
-                    if e.args[0] == EINTR:
-                        continue
-                    raise
-                if not data:
-                    break
-                nl = data.find('\n')
-                if nl >= 0:
-                    nl += 1
-                    buf.write(data[:nl])
-                    self._rbuf.write(data[nl:])
-                    del data
-                    break
-                buf.write(data)
-            return buf.getvalue()
-        else:
-            # Read until size bytes or \n or EOF seen, whichever comes first
-            buf.seek(0, 2)  # seek end
-            buf_len = buf.tell()
-            if buf_len >= size:
-                buf.seek(0)
-                rv = buf.read(size)
-                self._rbuf = StringIO()
-                self._rbuf.write(buf.read())
-                return rv
-            self._rbuf = StringIO()  # reset _rbuf.  we consume it via buf.
-            while True:
-                try:
-                    data = self._sock.recv(self._rbufsize)
-                except error, e:
-                    if e.args[0] == EINTR:
-                        continue
-                    raise
-                if not data:
-                    break
-                left = size - buf_len
-                # did we just receive a newline?
-                nl = data.find('\n', 0, left)
-                if nl >= 0:
-                    nl += 1
-                    # save the excess data to _rbuf
-                    self._rbuf.write(data[nl:])
-                    if buf_len:
-                        buf.write(data[:nl])
+                return self._readline_unbuffered(size)
+            scanned = avail
+            if not self._recv(self._rbufsize):
+                return self._take(avail)
+
+    def _readline_unbuffered(self, size):
+        # Read a byte at a time so that nothing past the newline is taken
+        # from the socket.  The try..except to catch EINTR is kept outside
+        # the recv loop to avoid the per byte overhead.
+        buffers = [self._take(self._rend - self._rpos)]
+        left = size - len(buffers[0])
+        recv = self._sock.recv
+        data = None
+        while True:
+            try:
+                while data != "\n" and (size < 0 or left > 0):
+                    data = recv(1)
+                    if not data:
                         break
-                    else:
-                        # Shortcut.  Avoid data copy through buf when returning
-                        # a substring of our first recv().
-                        return data[:nl]
-                n = len(data)
-                if n == size and not buf_len:
-                    # Shortcut.  Avoid data copy through buf when
-                    # returning exactly all of our first recv().
-                    return data
-                if n >= left:
-                    buf.write(data[:left])
-                    self._rbuf.write(data[left:])
-                    break
-                buf.write(data)
-                buf_len += n
-                #assert buf_len == buf.tell()
-            return buf.getvalue()
+                    buffers.append(data)
+                    left -= len(data)
+            except error, e:
+                if e.args[0] == EINTR:
+                    continue
+                raise
+            break
+        line = "".join(buffers)
+        if left < 0 <= size:
+            self._append(line[size:])
+            line = line[:size]
+        return line
 
     def readlines(self, sizehint=0):
         total = 0
@@ -533,9 +543,10 @@ class _fileobject(object):
         return line
 
 _GLOBAL_DEFAULT_TIMEOUT = object()
+_GLOBAL_DEFAULT_DELAY = object()
 
 def create_connection(address, timeout=_GLOBAL_DEFAULT_TIMEOUT,
-                      source_address=None):
+                      source_address=None, connect_delay=_GLOBAL_DEFAULT_DELAY):
     """Connect to *address* and return the socket object.
 
     Convenience function.  Connect to *address* (a 2-tuple ``(host,
@@ -546,11 +557,29 @@ def create_connection(address, timeout=_GLOBAL_DEFAULT_TIMEOUT,
     is used.  If *source_address* is set it must be a tuple of (host, port)
     for the socket to bind as a source address before making the connection.
     An host of '' or port 0 tells the OS to use the default.
+
+    The addresses of *host* are tried one after the other.  If
+    *connect_delay* (by default the value returned by
+    :func:`getdefaultconnectdelay`) is not None, a connection attempt to
+    the next address is started every *connect_delay* seconds, or as soon
+    as an attempt fails, without waiting for the previous ones to fail;
+    the first connection established is returned.
     """
 
     host, port = address
     err = None
-    for res in getaddrinfo(host, port, 0, SOCK_STREAM):
+    if _addrinfo_cache is not None:
+        addrinfo = _addrinfo_cache.getaddrinfo(host, port, 0, SOCK_STREAM)
+    else:
+        addrinfo = getaddrinfo(host, port, 0, SOCK_STREAM)
+    if connect_delay is _GLOBAL_DEFAULT_DELAY:
+        connect_delay = _default_connect_delay
+    if connect_delay is not None and len(addrinfo) > 1:
+        if timeout is _GLOBAL_DEFAULT_TIMEOUT:
+            timeout = getdefaulttimeout()
+        return _connect_staggered(_interleave_families(addrinfo), timeout,
+                                  source_address, connect_delay)
+    for res in addrinfo:
         af, socktype, proto, canonname, sa = res
         sock = None
         try:
@@ -571,3 +600,193 @@ def create_connection(address, timeout=_GLOBAL_DEFAULT_TIMEOUT,
         raise err
     else:
         raise error("getaddrinfo returns an empty list")
+
+def _interleave_families(addrinfo):
+    # Alternate between the address families, starting with the one the
+    # resolver preferred, so that a broken IPv6 (or IPv4) route only delays
+    # every other attempt (RFC 6555).
+    families = []
+    groups = {}
+    for res in addrinfo:
+        if res[0] not in groups:
+            families.append(res[0])
+            groups[res[0]] = []
+        groups[res[0]].append(res)
+    result = []
+    while len(result) < len(addrinfo):
+        for af in families:
+            if groups[af]:
+                result.append(groups[af].pop(0))
+    return result
+
+_CONNECT_IN_PROGRESS = set(getattr(errno, name) for name in
+                           ('EINPROGRESS', 'EWOULDBLOCK', 'EAGAIN')
+                           if hasattr(errno, name))
+_CONNECT_IN_PROGRESS.add(10035)         # WSAEWOULDBLOCK
+
+def _connect_staggered(addrinfo, sock_timeout, source_address, delay):
+    import select
+    if sock_timeout is not None:
+        deadline = _time() + sock_timeout
+    pending = {}                        # socket -> address
+    err = None
+    todo = list(addrinfo)
+    next_attempt = _time()
+    try:
+        while True:
+            now = _time()
+            if todo and now >= next_attempt:
+                af, socktype, proto, canonname, sa = todo.pop(0)
+                sock = None
+                try:
+                    sock = socket(af, socktype, proto)
+                    sock.setblocking(0)
+                    if source_address:
+                        sock.bind(source_address)
+                    code = sock.connect_ex(sa)
+                    if code not in _CONNECT_IN_PROGRESS and code != 0:
+                        raise error(code, os.strerror(code))
+                except error as _:
+                    err = _
+                    if sock is not None:
+                        sock.close()
+                    continue            # start the next attempt now
+                if code == 0:
+                    sock.settimeout(sock_timeout)
+                    return sock
+                pending[sock] = sa
+                next_attempt = now + delay
+            if not pending and not todo:
+                break
+            if sock_timeout is not None and now >= deadline:
+                raise timeout('timed out')
+            wait = None
+            if todo:
+                wait = max(0, next_attempt - now)
+            if sock_timeout is not None:
+                wait = max(0, deadline - now if wait is None else
+                              min(wait, deadline - now))
+            if not pending:
+                continue                # the next attempt is due now
+            socks = pending.keys()
+            try:
+                r, w, x = select.select([], socks, socks, wait)
+            except select.error as e:
+                if e.args[0] != EINTR:
+                    raise
+                continue
+            for sock in set(w + x):
+                code = sock.getsockopt(SOL_SOCKET, SO_ERROR)
+                if code == 0:
+                    del pending[sock]
+                    sock.settimeout(sock_timeout)
+                    return sock
+                err = error(code, os.strerror(code))
+                del pending[sock]
+                sock.close()
+                # an attempt failed: don't wait to start the next one
+                next_attempt = _time()
+    finally:
+        for sock in pending:
+            sock.close()
+    if err is not None:
+        raise err
+    raise error("getaddrinfo returns an empty list")
+
+_default_connect_delay = None
+
+def getdefaultconnectdelay():
+    """getdefaultconnectdelay() -> delay or None
+
+    Return the default connect_delay of create_connection() in seconds, or
+    None if the addresses of a host are tried one after the other.
+    """
+    return _default_connect_delay
+
+def setdefaultconnectdelay(delay):
+    """setdefaultconnectdelay(delay)
+
+    Set the default connect_delay of create_connection(): when it isn't
+    None, the connection attempts to the addresses of a host are started
+    delay seconds apart and the first one to succeed is used.  0.25 is a
+    reasonable value.
+    """
+    global _default_connect_delay
+    if delay is not None and delay < 0:
+        raise ValueError("delay must be non-negative")
+    _default_connect_delay = delay
+
+
+class AddrInfoCache(object):
+    """A thread-safe cache of getaddrinfo() results.
+
+    Results are kept for ttl seconds, and name resolution failures for
+    negative_ttl seconds.  At most maxsize results are kept, the least
+    recently used being discarded first.  The hits and misses attributes
+    count the lookups answered from the cache and from the resolver.
+    """
+
+    def __init__(self, ttl=60.0, negative_ttl=10.0, maxsize=1024):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = _OrderedDict()  # key -> (expiry, result, error)
+        self._lock = _thread.allocate_lock()
+        self._resolve = getaddrinfo
+
+    def getaddrinfo(self, host, port, family=0, socktype=0, proto=0,
+                    flags=0):
+        """Same as the getaddrinfo() function, through the cache."""
+        key = (host, port, family, socktype, proto, flags)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > _time():
+                self._entries[key] = entry
+                self.hits += 1
+                if entry[2] is not None:
+                    raise entry[2]
+                return list(entry[1])
+            self.misses += 1
+        try:
+            result = self._resolve(*key)
+        except gaierror as e:
+            if e.args[0] == getattr(_socket, 'EAI_AGAIN', None):
+                # temporary failure: try again next time
+                raise
+            self._store(key, _time() + self.negative_ttl, None, e)
+            raise
+        self._store(key, _time() + self.ttl, result, None)
+        return list(result)
+
+    def _store(self, key, expiry, result, err):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expiry, result, err)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forget all the cached results."""
+        with self._lock:
+            self._entries.clear()
+
+_addrinfo_cache = None
+
+def getaddrinfocache():
+    """getaddrinfocache() -> AddrInfoCache or None
+
+    Return the AddrInfoCache used by create_connection(), or None if its
+    lookups aren't cached.
+    """
+    return _addrinfo_cache
+
+def setaddrinfocache(cache):
+    """setaddrinfocache(cache)
+
+    Make create_connection() resolve host names through cache, an
+    AddrInfoCache.  None disables caching.
+    """
+    global _addrinfo_cache
+    _addrinfo_cache = cache
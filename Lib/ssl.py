@@ -7,6 +7,8 @@ This module provides some more Pythonic support for SSL.
 Object types:
 
   SSLSocket -- subtype of socket.socket which does SSL over the socket
+  SSLSession -- a negotiated session, which a later connection can resume
+  SSLSessionCache -- thread-safe cache of client sessions, e.g. per host
 
 Exceptions:
 
@@ -61,6 +63,7 @@ import _ssl             # if we can't import it, let the error propagate
 
 from _ssl import OPENSSL_VERSION_NUMBER, OPENSSL_VERSION_INFO, OPENSSL_VERSION
 from _ssl import SSLError
+from _ssl import SSLSession
 from _ssl import CERT_NONE, CERT_OPTIONAL, CERT_REQUIRED
 from _ssl import RAND_status, RAND_egd, RAND_add
 from _ssl import \
@@ -91,6 +94,13 @@ from socket import socket, _fileobject, _delegate_methods, error as socket_error
 from socket import getnameinfo as _getnameinfo
 import base64        # for DER-to-PEM translation
 import errno
+from collections import OrderedDict
+from time import time as _time
+
+try:
+    import thread as _thread
+except ImportError:
+    import dummy_thread as _thread
 
 # Disable weak or insecure ciphers by default
 # (OpenSSL's default setting is 'DEFAULT:!aNULL:!eNULL')
@@ -107,7 +117,7 @@ class SSLSocket(socket):
                  server_side=False, cert_reqs=CERT_NONE,
                  ssl_version=PROTOCOL_SSLv23, ca_certs=None,
                  do_handshake_on_connect=True,
-                 suppress_ragged_eofs=True, ciphers=None):
+                 suppress_ragged_eofs=True, ciphers=None, session=None):
         socket.__init__(self, _sock=sock._sock)
         # The initializer for socket overrides the methods send(), recv(), etc.
         # in the instancce, which we don't need -- but we want to provide the
@@ -123,6 +133,9 @@ class SSLSocket(socket):
 
         if certfile and not keyfile:
             keyfile = certfile
+        if server_side and session is not None:
+            raise ValueError("session is only valid for client-side sockets")
+        self._session = session
         # see if it's connected
         try:
             socket.getpeername(self)
@@ -139,6 +152,8 @@ class SSLSocket(socket):
                                         keyfile, certfile,
                                         cert_reqs, ssl_version, ca_certs,
                                         ciphers)
+            if session is not None:
+                self._sslobj.set_session(session)
             if do_handshake_on_connect:
                 self.do_handshake()
         self.keyfile = keyfile
@@ -187,6 +202,25 @@ class SSLSocket(socket):
         else:
             return self._sslobj.cipher()
 
+    @property
+    def session(self):
+
+        """The SSLSession negotiated for this connection (before the
+        handshake, the one passed in to be resumed), or None."""
+
+        if not self._sslobj:
+            return self._session
+        return self._sslobj.get_session()
+
+    @property
+    def session_reused(self):
+
+        """True if the handshake resumed the session passed in."""
+
+        if not self._sslobj:
+            return False
+        return self._sslobj.session_reused()
+
     def send(self, data, flags=0):
         if self._sslobj:
             if flags != 0:
@@ -312,6 +346,8 @@ class SSLSocket(socket):
         self._sslobj = _ssl.sslwrap(self._sock, False, self.keyfile, self.certfile,
                                     self.cert_reqs, self.ssl_version,
                                     self.ca_certs, self.ciphers)
+        if self._session is not None:
+            self._sslobj.set_session(self._session)
         try:
             socket.connect(self, addr)
             if self.do_handshake_on_connect:
@@ -371,14 +407,61 @@ def wrap_socket(sock, keyfile=None, certfile=None,
                 server_side=False, cert_reqs=CERT_NONE,
                 ssl_version=PROTOCOL_SSLv23, ca_certs=None,
                 do_handshake_on_connect=True,
-                suppress_ragged_eofs=True, ciphers=None):
+                suppress_ragged_eofs=True, ciphers=None, session=None):
 
     return SSLSocket(sock, keyfile=keyfile, certfile=certfile,
                      server_side=server_side, cert_reqs=cert_reqs,
                      ssl_version=ssl_version, ca_certs=ca_certs,
                      do_handshake_on_connect=do_handshake_on_connect,
                      suppress_ragged_eofs=suppress_ragged_eofs,
-                     ciphers=ciphers)
+                     ciphers=ciphers, session=session)
+
+
+class SSLSessionCache(object):
+
+    """A thread-safe cache of client sessions, so that repeated connections
+    to a server can resume a session instead of doing a full handshake.
+
+    Keys are chosen by the caller, and should include everything the
+    session must agree with besides the server's address (certificates,
+    verification settings); sessions are not checked again on resumption.
+    At most maxsize sessions are kept, the least recently used being
+    discarded first, and expired sessions are never returned.
+    """
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._sessions = OrderedDict()
+        self._lock = _thread.allocate_lock()
+
+    def get(self, key):
+        """Return the session stored for key, or None."""
+        with self._lock:
+            session = self._sessions.pop(key, None)
+            if session is not None:
+                if session.time() + session.timeout() > _time():
+                    self._sessions[key] = session
+                else:
+                    session = None
+            return session
+
+    def set(self, key, session):
+        """Store session for key, replacing any previous one."""
+        with self._lock:
+            self._sessions.pop(key, None)
+            self._sessions[key] = session
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+
+    def discard(self, key):
+        """Forget the session stored for key, if any."""
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def clear(self):
+        """Forget all the sessions."""
+        with self._lock:
+            self._sessions.clear()
 
 
 # some utility functions
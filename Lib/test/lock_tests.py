@@ -62,6 +62,14 @@ class BaseTestCase(unittest.TestCase):
         support.threading_cleanup(*self._threads)
         support.reap_children()
 
+    def assertTimeout(self, actual, expected):
+        # The waiting and/or time.time() can be imprecise, which
+        # is why comparing to the expected value would sometimes fail
+        # (especially under Windows).
+        self.assertGreaterEqual(actual, expected * 0.6)
+        # Test nothing insane happened
+        self.assertLess(actual, expected * 10.0)
+
 
 class BaseLockTests(BaseTestCase):
     """
@@ -130,6 +138,51 @@ class BaseLockTests(BaseTestCase):
         # Check the lock is unacquired
         Bunch(f, 1).wait_for_finished()
 
+    def test_timeout(self):
+        lock = self.locktype()
+        # Can't set timeout if not blocking
+        self.assertRaises(ValueError, lock.acquire, 0, 1)
+        # Invalid timeout values
+        self.assertRaises(ValueError, lock.acquire, timeout=-100)
+        self.assertRaises(OverflowError, lock.acquire, timeout=1e100)
+        self.assertRaises(OverflowError, lock.acquire,
+                          timeout=threading.TIMEOUT_MAX + 1)
+        # TIMEOUT_MAX is ok
+        lock.acquire(timeout=threading.TIMEOUT_MAX)
+        lock.release()
+        t1 = time.time()
+        self.assertTrue(lock.acquire(timeout=5))
+        t2 = time.time()
+        # Just a sanity test that it didn't actually wait for the timeout.
+        self.assertLess(t2 - t1, 5)
+        results = []
+        def f():
+            t1 = time.time()
+            results.append(lock.acquire(timeout=0.5))
+            t2 = time.time()
+            results.append(t2 - t1)
+        Bunch(f, 1).wait_for_finished()
+        self.assertFalse(results[0])
+        self.assertTimeout(results[1], 0.5)
+
+    def test_timeout_wakeup(self):
+        # A timed acquire returns as soon as the lock is released
+        lock = self.locktype()
+        lock.acquire()
+        results = []
+        def f():
+            t1 = time.time()
+            results.append(lock.acquire(timeout=10))
+            results.append(time.time() - t1)
+            lock.release()
+        b = Bunch(f, 1)
+        b.wait_for_started()
+        _wait()
+        lock.release()
+        b.wait_for_finished()
+        self.assertTrue(results[0])
+        self.assertLess(results[1], 5)
+
     def test_thread_leak(self):
         # The lock shouldn't leak a Thread instance when used from a foreign
         # (non-threading) thread.
@@ -406,6 +459,25 @@ class ConditionTests(BaseTestCase):
         for dt in results:
             self.assertTrue(dt >= 0.2, dt)
 
+    def test_notify_timed_waiter(self):
+        # A waiter with a timeout is woken by notify() without delay
+        cond = self.condtype()
+        results = []
+        def f():
+            cond.acquire()
+            t1 = time.time()
+            cond.wait(10)
+            results.append(time.time() - t1)
+            cond.release()
+        b = Bunch(f, 1)
+        b.wait_for_started()
+        _wait()
+        cond.acquire()
+        cond.notify()
+        cond.release()
+        b.wait_for_finished()
+        self.assertLess(results[0], 5)
+
 
 class BaseSemaphoreTests(BaseTestCase):
     """
@@ -487,6 +559,19 @@ class BaseSemaphoreTests(BaseTestCase):
         # ordered.
         self.assertEqual(sorted(results), [False] * 7 + [True] *  3 )
 
+    def test_acquire_timeout(self):
+        sem = self.semtype(2)
+        self.assertRaises(ValueError, sem.acquire, False, timeout=1.0)
+        self.assertTrue(sem.acquire(timeout=0.005))
+        self.assertTrue(sem.acquire(timeout=0.005))
+        self.assertFalse(sem.acquire(timeout=0.005))
+        sem.release()
+        self.assertTrue(sem.acquire(timeout=0.005))
+        t = time.time()
+        self.assertFalse(sem.acquire(timeout=0.5))
+        dt = time.time() - t
+        self.assertTimeout(dt, 0.5)
+
     def test_default_value(self):
         # The default initial value is 1.
         sem = self.semtype()
@@ -544,3 +629,297 @@ class BoundedSemaphoreTests(BaseSemaphoreTests):
         sem.acquire()
         sem.release()
         self.assertRaises(ValueError, sem.release)
+
+
+class RWLockTests(BaseTestCase):
+    """
+    Tests for reader/writer locks.
+    """
+
+    def test_shared_readers(self):
+        rw = self.rwlocktype()
+        self.assertTrue(rw.acquire_read())
+        self.assertTrue(rw.acquire_read(False))
+        self.assertFalse(rw.acquire_write(False))
+        rw.release_read()
+        rw.release_read()
+        self.assertTrue(rw.acquire_write(False))
+        self.assertFalse(rw.acquire_read(False))
+        self.assertFalse(rw.acquire_write(False))
+        rw.release_write()
+
+    def test_release_unacquired(self):
+        rw = self.rwlocktype()
+        self.assertRaises(RuntimeError, rw.release_read)
+        self.assertRaises(RuntimeError, rw.release_write)
+        rw.acquire_read()
+        self.assertRaises(RuntimeError, rw.release_write)
+        rw.release_read()
+
+    def test_write_different_thread(self):
+        rw = self.rwlocktype()
+        def f():
+            rw.acquire_write()
+        Bunch(f, 1).wait_for_finished()
+        self.assertRaises(RuntimeError, rw.release_write)
+
+    def test_concurrent_readers(self):
+        rw = self.rwlocktype()
+        N = 5
+        inside = []
+        release = threading.Event()
+        def f():
+            with rw.reader:
+                inside.append(1)
+                release.wait()
+        b = Bunch(f, N)
+        while len(inside) < N:
+            _wait()
+        self.assertFalse(rw.acquire_write(False))
+        release.set()
+        b.wait_for_finished()
+        self.assertTrue(rw.acquire_write(False))
+        rw.release_write()
+
+    def test_writer_excludes(self):
+        rw = self.rwlocktype()
+        results = []
+        rw.acquire_write()
+        def reader():
+            with rw.reader:
+                results.append('r')
+        def writer():
+            with rw.writer:
+                results.append('w')
+        b1 = Bunch(reader, 3)
+        b2 = Bunch(writer, 2)
+        b1.wait_for_started()
+        b2.wait_for_started()
+        _wait()
+        self.assertEqual(results, [])
+        rw.release_write()
+        b1.wait_for_finished()
+        b2.wait_for_finished()
+        self.assertEqual(sorted(results), ['r'] * 3 + ['w'] * 2)
+
+    def test_writer_preferred(self):
+        rw = self.rwlocktype()
+        results = []
+        rw.acquire_read()
+        def writer():
+            with rw.writer:
+                results.append('w')
+        def reader():
+            with rw.reader:
+                results.append('r')
+        b1 = Bunch(writer, 1)
+        b1.wait_for_started()
+        _wait()
+        # a waiting writer holds back new readers
+        self.assertFalse(rw.acquire_read(False))
+        b2 = Bunch(reader, 1)
+        b2.wait_for_started()
+        _wait()
+        self.assertEqual(results, [])
+        rw.release_read()
+        b1.wait_for_finished()
+        b2.wait_for_finished()
+        self.assertEqual(results, ['w', 'r'])
+
+    def test_timeout(self):
+        rw = self.rwlocktype()
+        self.assertRaises(ValueError, rw.acquire_read, False, timeout=1.0)
+        self.assertRaises(ValueError, rw.acquire_write, False, timeout=1.0)
+        rw.acquire_read()
+        results = []
+        def f():
+            t1 = time.time()
+            results.append(rw.acquire_write(timeout=0.5))
+            results.append(time.time() - t1)
+        Bunch(f, 1).wait_for_finished()
+        self.assertFalse(results[0])
+        self.assertTimeout(results[1], 0.5)
+        # the writer which gave up no longer holds back readers
+        self.assertTrue(rw.acquire_read(timeout=0.5))
+        rw.release_read()
+        rw.release_read()
+
+    def test_timed_out_writer_wakes_readers(self):
+        rw = self.rwlocktype()
+        rw.acquire_read()
+        results = []
+        def writer():
+            results.append(rw.acquire_write(timeout=0.3))
+        b1 = Bunch(writer, 1)
+        b1.wait_for_started()
+        _wait()
+        def reader():
+            with rw.reader:
+                results.append('r')
+        b2 = Bunch(reader, 1)
+        b1.wait_for_finished()
+        b2.wait_for_finished()
+        self.assertEqual(results, [False, 'r'])
+        rw.release_read()
+
+    def test_with_exception(self):
+        rw = self.rwlocktype()
+        def _with(side):
+            with side:
+                raise TypeError
+        self.assertRaises(TypeError, _with, rw.reader)
+        self.assertRaises(TypeError, _with, rw.writer)
+        self.assertTrue(rw.acquire_write(False))
+        rw.release_write()
+
+
+class BarrierTests(BaseTestCase):
+    """
+    Tests for Barrier objects.
+    """
+    N = 5
+    defaultTimeout = 2.0
+
+    def setUp(self):
+        BaseTestCase.setUp(self)
+        self.barrier = self.barriertype(self.N, timeout=self.defaultTimeout)
+
+    def tearDown(self):
+        self.barrier.abort()
+        BaseTestCase.tearDown(self)
+
+    def run_threads(self, f):
+        b = Bunch(f, self.N - 1)
+        f()
+        b.wait_for_finished()
+
+    def multipass(self, results, n):
+        m = self.barrier.parties
+        self.assertEqual(m, self.N)
+        for i in range(n):
+            results[0].append(True)
+            self.assertEqual(len(results[1]), i * m)
+            self.barrier.wait()
+            results[1].append(True)
+            self.assertEqual(len(results[0]), (i + 1) * m)
+            self.barrier.wait()
+        self.assertEqual(self.barrier.n_waiting, 0)
+        self.assertFalse(self.barrier.broken)
+
+    def test_constructor(self):
+        self.assertRaises(ValueError, self.barriertype, 0)
+
+    def test_barrier(self, passes=1):
+        results = [[], []]
+        def f():
+            self.multipass(results, passes)
+        self.run_threads(f)
+
+    def test_barrier_10(self):
+        self.test_barrier(10)
+
+    def test_wait_return(self):
+        results = []
+        def f():
+            r = self.barrier.wait()
+            results.append(r)
+        self.run_threads(f)
+        self.assertEqual(sorted(results), range(self.N))
+
+    def test_action(self):
+        results = []
+        def action():
+            results.append(True)
+        barrier = self.barriertype(self.N, action)
+        def f():
+            barrier.wait()
+            self.assertEqual(len(results), 1)
+        self.run_threads(f)
+
+    def test_abort(self):
+        results1 = []
+        results2 = []
+        def f():
+            try:
+                i = self.barrier.wait()
+                if i == self.N // 2:
+                    raise RuntimeError
+                self.barrier.wait()
+                results1.append(True)
+            except threading.BrokenBarrierError:
+                results2.append(True)
+            except RuntimeError:
+                self.barrier.abort()
+        self.run_threads(f)
+        self.assertEqual(len(results1), 0)
+        self.assertEqual(len(results2), self.N - 1)
+        self.assertTrue(self.barrier.broken)
+
+    def test_reset(self):
+        results1 = []
+        results2 = []
+        results3 = []
+        def f():
+            i = self.barrier.wait()
+            if i == self.N // 2:
+                # wait until the other threads are all in the barrier
+                while self.barrier.n_waiting < self.N - 1:
+                    time.sleep(0.001)
+                self.barrier.reset()
+            else:
+                try:
+                    self.barrier.wait()
+                    results1.append(True)
+                except threading.BrokenBarrierError:
+                    results2.append(True)
+            # now, pass the barrier again
+            self.barrier.wait()
+            results3.append(True)
+        self.run_threads(f)
+        self.assertEqual(len(results1), 0)
+        self.assertEqual(len(results2), self.N - 1)
+        self.assertEqual(len(results3), self.N)
+
+    def test_action_exception(self):
+        class MyError(Exception):
+            pass
+        results = []
+        def action():
+            raise MyError
+        barrier = self.barriertype(self.N, action)
+        def f():
+            try:
+                barrier.wait()
+            except MyError:
+                results.append('error')
+            except threading.BrokenBarrierError:
+                results.append('broken')
+        self.run_threads(f)
+        self.assertEqual(sorted(results), ['broken'] * (self.N - 1) +
+                                          ['error'])
+        self.assertTrue(barrier.broken)
+
+    def test_timeout(self):
+        def f():
+            i = self.barrier.wait()
+            if i == self.N // 2:
+                # one thread is late
+                time.sleep(1.0)
+            # the others time out and break the barrier
+            self.assertRaises(threading.BrokenBarrierError,
+                              self.barrier.wait, 0.5)
+        self.run_threads(f)
+
+    def test_default_timeout(self):
+        barrier = self.barriertype(self.N, timeout=0.3)
+        def f():
+            i = barrier.wait()
+            if i == self.N // 2:
+                time.sleep(1.0)
+            self.assertRaises(threading.BrokenBarrierError, barrier.wait)
+        self.run_threads(f)
+
+    def test_single_thread(self):
+        b = self.barriertype(1)
+        b.wait()
+        b.wait()
@@ -1,6 +1,6 @@
 # test asynchat
 
-import asyncore, asynchat, socket, time
+import asyncore, asynchat, socket, select, time
 import unittest
 import sys
 from test import test_support
@@ -99,6 +99,7 @@ if threading:
 @unittest.skipUnless(threading, 'Threading required for this test.')
 class TestAsynchat(unittest.TestCase):
     usepoll = False
+    useepoll = False
 
     def setUp (self):
         self._threads = test_support.threading_setup()
@@ -119,7 +120,8 @@ class TestAsynchat(unittest.TestCase):
         c.push("world%s" % term)
         c.push("I'm not dead yet!%s" % term)
         c.push(SERVER_QUIT)
-        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01)
+        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01,
+                      use_epoll=self.useepoll)
         s.join()
 
         self.assertEqual(c.contents, ["hello world", "I'm not dead yet!"])
@@ -150,7 +152,8 @@ class TestAsynchat(unittest.TestCase):
         data = "hello world, I'm not dead yet!\n"
         c.push(data)
         c.push(SERVER_QUIT)
-        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01)
+        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01,
+                      use_epoll=self.useepoll)
         s.join()
 
         self.assertEqual(c.contents, [data[:termlen]])
@@ -171,7 +174,8 @@ class TestAsynchat(unittest.TestCase):
         data = "hello world, I'm not dead yet!\n"
         c.push(data)
         c.push(SERVER_QUIT)
-        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01)
+        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01,
+                      use_epoll=self.useepoll)
         s.join()
 
         self.assertEqual(c.contents, [])
@@ -183,7 +187,8 @@ class TestAsynchat(unittest.TestCase):
         data = "hello world\nI'm not dead yet!\n"
         p = asynchat.simple_producer(data+SERVER_QUIT, buffer_size=8)
         c.push_with_producer(p)
-        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01)
+        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01,
+                      use_epoll=self.useepoll)
         s.join()
 
         self.assertEqual(c.contents, ["hello world", "I'm not dead yet!"])
@@ -193,7 +198,8 @@ class TestAsynchat(unittest.TestCase):
         c = echo_client('\n', s.port)
         data = "hello world\nI'm not dead yet!\n"
         c.push_with_producer(data+SERVER_QUIT)
-        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01)
+        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01,
+                      use_epoll=self.useepoll)
         s.join()
 
         self.assertEqual(c.contents, ["hello world", "I'm not dead yet!"])
@@ -204,7 +210,8 @@ class TestAsynchat(unittest.TestCase):
         c = echo_client('\n', s.port)
         c.push("hello world\n\nI'm not dead yet!\n")
         c.push(SERVER_QUIT)
-        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01)
+        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01,
+                      use_epoll=self.useepoll)
         s.join()
 
         self.assertEqual(c.contents, ["hello world", "", "I'm not dead yet!"])
@@ -216,7 +223,8 @@ class TestAsynchat(unittest.TestCase):
         c.push("hello world\nI'm not dead yet!\n")
         c.push(SERVER_QUIT)
         c.close_when_done()
-        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01)
+        asyncore.loop(use_poll=self.usepoll, count=300, timeout=.01,
+                      use_epoll=self.useepoll)
 
         # Only allow the server to start echoing data back to the client after
         # the client has closed its connection.  This prevents a race condition
@@ -235,6 +243,152 @@ class TestAsynchat(unittest.TestCase):
 class TestAsynchat_WithPoll(TestAsynchat):
     usepoll = True
 
+@unittest.skipUnless(hasattr(select, 'epoll'), 'select.epoll required')
+class TestAsynchat_WithEpoll(TestAsynchat):
+    useepoll = True
+
+class fed_chat(asynchat.async_chat):
+    # reads from a list of strings instead of a socket
+
+    def __init__(self, chunks, terminator):
+        asynchat.async_chat.__init__(self, map={})
+        self.chunks = chunks
+        self.set_terminator(terminator)
+        self.buffer = ''
+        self.contents = []
+
+    def recv(self, buffer_size):
+        return self.chunks.pop(0)
+
+    def collect_incoming_data(self, data):
+        self.buffer += data
+
+    def found_terminator(self):
+        self.contents.append(self.buffer)
+        self.buffer = ''
+
+
+class TestHandleRead(unittest.TestCase):
+
+    def test_many_terminators(self):
+        lines = ['line %d' % i for i in range(1000)]
+        c = fed_chat(['\r\n'.join(lines) + '\r'], '\r\n')
+        c.handle_read()
+        self.assertEqual(c.contents, lines[:-1])
+        self.assertEqual(c.buffer, lines[-1])
+        self.assertEqual(c.ac_in_buffer, '\r')
+
+    def test_split_terminator(self):
+        c = fed_chat(['a\r', '\nb\r\r', '\n\r\nc'], '\r\n')
+        for i in range(3):
+            c.handle_read()
+        self.assertEqual(c.contents, ['a', 'b\r', ''])
+        self.assertEqual(c.buffer, 'c')
+        self.assertEqual(c.ac_in_buffer, '')
+
+    def test_change_terminator(self):
+        # the terminator may be changed by found_terminator()
+        class chat(fed_chat):
+            def found_terminator(self):
+                fed_chat.found_terminator(self)
+                if self.contents[-1] == 'SIZE':
+                    self.set_terminator(5)
+                elif self.get_terminator() == 0:
+                    self.set_terminator('\n')
+        c = chat(['SIZE\n12', '34', '5tail\nrest'], '\n')
+        for i in range(3):
+            c.handle_read()
+        self.assertEqual(c.contents, ['SIZE', '12345', 'tail'])
+        self.assertEqual(c.buffer, 'rest')
+
+    def test_handler_error(self):
+        # the data following a terminator whose handler raised is kept
+        class chat(fed_chat):
+            def found_terminator(self):
+                fed_chat.found_terminator(self)
+                if len(self.contents) == 1:
+                    raise ValueError
+        c = chat(['a\nb\nc', '\n'], '\n')
+        self.assertRaises(ValueError, c.handle_read)
+        self.assertEqual(c.ac_in_buffer, 'b\nc')
+        c.handle_read()
+        self.assertEqual(c.contents, ['a', 'b', 'c'])
+
+    def test_discard_buffers(self):
+        # input discarded by a handler is not processed
+        class chat(fed_chat):
+            def found_terminator(self):
+                fed_chat.found_terminator(self)
+                self.discard_buffers()
+        c = chat(['a\nb\nc\n'], '\n')
+        c.handle_read()
+        self.assertEqual(c.contents, ['a'])
+        self.assertEqual(c.ac_in_buffer, '')
+
+    def test_handler_sees_unprocessed_input(self):
+        # while a handler runs, ac_in_buffer holds the input which has not
+        # been processed yet, and a handler may change it
+        self.check_unprocessed_input(fed_chat)
+
+    def test_new_style_subclass(self):
+        # ac_in_buffer can be set on an instance of a new-style class too
+        class chat(fed_chat, object):
+            pass
+        c = chat(['b\r\nc\r', '\n'], '\r\n')
+        c.ac_in_buffer = 'a\r\n'
+        c.handle_read()
+        self.assertEqual(c.contents, ['a', 'b'])
+        self.assertEqual(c.ac_in_buffer, '\r')
+        c.discard_buffers()
+        self.assertEqual(c.ac_in_buffer, '')
+        c.handle_read()
+        self.assertEqual(c.contents, ['a', 'b'])
+        self.assertEqual(c.buffer, 'c\n')
+        self.check_unprocessed_input(chat)
+
+    def check_unprocessed_input(self, base):
+        seen = []
+        class chat(base):
+            def collect_incoming_data(self, data):
+                seen.append(('collect', data, self.ac_in_buffer))
+                fed_chat.collect_incoming_data(self, data)
+            def found_terminator(self):
+                seen.append(('found', self.ac_in_buffer))
+                fed_chat.found_terminator(self)
+                if self.ac_in_buffer.startswith('skip\n'):
+                    self.ac_in_buffer = self.ac_in_buffer[5:]
+        c = chat(['a\nskip\nb\nc'], '\n')
+        c.handle_read()
+        self.assertEqual(seen, [('collect', 'a', 'a\nskip\nb\nc'),
+                                ('found', 'skip\nb\nc'),
+                                ('collect', 'b', 'b\nc'),
+                                ('found', 'c'),
+                                ('collect', 'c', 'c')])
+        self.assertEqual(c.contents, ['a', 'b'])
+        self.assertEqual(c.ac_in_buffer, '')
+        self.assertEqual(c.buffer, 'c')
+
+
+class TestPush(unittest.TestCase):
+
+    def test_large_push(self):
+        # data larger than ac_out_buffer_size is sent in pieces
+        a, b = socket.socketpair()
+        try:
+            c = asynchat.async_chat(a, map={})
+            data = ''.join([chr(i % 256) for i in range(100000)])
+            c.push(data)
+            received = []
+            while len(''.join(received)) < len(data):
+                c.initiate_send()
+                received.append(b.recv(65536))
+            self.assertEqual(''.join(received), data)
+            self.assertFalse(c.producer_fifo)
+        finally:
+            a.close()
+            b.close()
+
+
 class TestHelperFunctions(unittest.TestCase):
     def test_find_prefix_at_end(self):
         self.assertEqual(asynchat.find_prefix_at_end("qwerty\r", "\r\n"), 1)
@@ -267,7 +421,8 @@ class TestFifo(unittest.TestCase):
 
 def test_main(verbose=None):
     test_support.run_unittest(TestAsynchat, TestAsynchat_WithPoll,
-                              TestHelperFunctions, TestFifo)
+                              TestAsynchat_WithEpoll, TestHandleRead,
+                              TestPush, TestHelperFunctions, TestFifo)
 
 if __name__ == "__main__":
     test_main(verbose=True)
@@ -0,0 +1,260 @@
+import asyncore
+import httplib
+import select
+import socket
+import time
+import unittest
+from test import test_support
+
+threading = test_support.import_module('threading')
+import BaseHTTPServer
+import SocketServer
+import asynchttp
+
+HOST = test_support.HOST
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def send_body(self, body, headers=()):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith('/len/'):
+            self.send_body(self.path)
+        elif self.path == '/chunked':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for chunk in ('hello ', 'chunked ', 'world'):
+                self.wfile.write('%x;ext=1\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write('0\r\nX-Trailer: 1\r\n\r\n')
+        elif self.path == '/eof':
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write('until close')
+            self.close_connection = 1
+        elif self.path == '/sleep':
+            time.sleep(0.5)
+            self.send_body('late')
+        elif self.path == '/drop':
+            # announce keep-alive, then close the connection anyway
+            self.send_body('dropped')
+            self.close_connection = 1
+        elif self.path == '/badchunk':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write('zz\r\n')
+        elif self.path == '/continue':
+            self.wfile.write('HTTP/1.1 100 Continue\r\nX-Skip: 1\r\n\r\n')
+            self.send_body('continued')
+        else:
+            self.send_error(404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '1000')
+        self.end_headers()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.send_body(body.upper())
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def handle_error(self, request, client_address):
+        # the client gives up on /sleep when testing timeouts
+        pass
+
+
+class HTTPClientTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server((HOST, 0), Handler)
+        self.base = 'http://%s:%d' % (HOST, self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+        self.map = {}
+        self.client = asynchttp.HTTPClient(max_per_host=2, map=self.map)
+
+    def tearDown(self):
+        self.client.close()
+        asyncore.close_all(self.map)
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def fetch(self, path, **kw):
+        results = []
+        response = self.client.fetch(self.base + path, results.append, **kw)
+        self.client.run()
+        self.assertEqual(results, [response])
+        return response
+
+    def test_keep_alive(self):
+        results = []
+        for i in range(20):
+            self.client.fetch(self.base + '/len/%d' % i, results.append)
+        self.client.run()
+        self.assertEqual(len(results), 20)
+        for response in results:
+            self.assertIsNone(response.error)
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.reason, 'OK')
+            self.assertEqual(response.version, 11)
+            self.assertEqual(self.base + response.body, response.url)
+            self.assertEqual(response.getheader('content-length'),
+                             str(len(response.body)))
+        self.assertEqual(sorted(r.body for r in results),
+                         sorted('/len/%d' % i for i in range(20)))
+        # the requests shared max_per_host connections
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(len(self.client._idle.values()[0]), 2)
+
+    @unittest.skipUnless(hasattr(select, 'epoll'), 'select.epoll required')
+    def test_run_epoll(self):
+        results = []
+        for i in range(5):
+            self.client.fetch(self.base + '/len/%d' % i, results.append)
+        self.client.run(use_epoll=True)
+        self.assertEqual(sorted(r.body for r in results),
+                         sorted('/len/%d' % i for i in range(5)))
+        self.assertNotIn(id(self.map), asyncore._epoll_states)
+
+    def test_chunked(self):
+        response = self.fetch('/chunked')
+        self.assertIsNone(response.error)
+        self.assertEqual(response.body, 'hello chunked world')
+        # the connection is reused after a chunked response
+        self.fetch('/len/x')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_body_until_close(self):
+        response = self.fetch('/eof')
+        self.assertEqual(response.body, 'until close')
+        self.assertEqual(self.client._idle, {})
+
+    def test_head(self):
+        response = self.fetch('/', method='HEAD')
+        self.assertEqual(response.body, '')
+        self.assertEqual(response.getheader('content-length'), '1000')
+
+    def test_post(self):
+        response = self.fetch('/', method='POST', body='data',
+                              headers={'X-Test': 'yes'})
+        self.assertEqual(response.body, 'DATA')
+
+    def test_continue(self):
+        response = self.fetch('/continue')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.body, 'continued')
+        self.assertIsNone(response.getheader('x-skip'))
+
+    def test_not_found(self):
+        response = self.fetch('/missing')
+        self.assertIsNone(response.error)
+        self.assertEqual(response.status, 404)
+
+    def test_timeout(self):
+        start = time.time()
+        response = self.fetch('/sleep', timeout=0.1)
+        self.assertLess(time.time() - start, 0.4)
+        self.assertIsInstance(response.error, socket.timeout)
+        self.assertIsNone(response.status)
+        # a request waiting for a connection times out too
+        self.client.max_per_host = 1
+        first = self.client.fetch(self.base + '/sleep')
+        second = self.client.fetch(self.base + '/len/1', timeout=0.1)
+        self.client.run()
+        self.assertIsNone(first.error)
+        self.assertIsInstance(second.error, socket.timeout)
+
+    def test_retry_on_closed_connection(self):
+        self.fetch('/drop')
+        # the server closed the connection after announcing keep-alive
+        time.sleep(0.1)
+        response = self.fetch('/len/2')
+        self.assertIsNone(response.error)
+        self.assertEqual(response.body, '/len/2')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_callback_error(self):
+        def callback(response):
+            raise ZeroDivisionError
+        self.client.fetch(self.base + '/len/1', callback)
+        self.assertRaises(ZeroDivisionError, self.client.run)
+
+    def test_timer_callback_error(self):
+        def callback(response):
+            raise ZeroDivisionError
+        self.client.fetch(self.base + '/sleep', callback, timeout=0.1)
+        self.assertRaises(ZeroDivisionError, self.client.run)
+        # a later error of a channel is reported in the response
+        response = self.fetch('/badchunk')
+        self.assertIsInstance(response.error, httplib.IncompleteRead)
+
+    def test_bad_url(self):
+        self.assertRaises(ValueError, self.client.fetch, 'ftp://x/')
+        self.assertRaises(httplib.InvalidURL, self.client.fetch,
+                          'http://x:y/')
+
+
+class ErrorTests(unittest.TestCase):
+
+    def test_connection_refused(self):
+        sock = socket.socket()
+        port = test_support.bind_port(sock)
+        sock.close()
+        map = {}
+        client = asynchttp.HTTPClient(map=map)
+        response = client.fetch('http://%s:%d/' % (HOST, port))
+        client.run()
+        self.assertIsInstance(response.error, socket.error)
+        self.assertEqual(map, {})
+
+    def test_bad_status_line(self):
+        sock = socket.socket()
+        port = test_support.bind_port(sock)
+        sock.listen(1)
+        def serve():
+            conn, addr = sock.accept()
+            conn.recv(1000)
+            conn.sendall('garbage\r\n\r\n')
+            conn.close()
+        thread = threading.Thread(target=serve)
+        thread.start()
+        try:
+            map = {}
+            client = asynchttp.HTTPClient(map=map)
+            response = client.fetch('http://%s:%d/' % (HOST, port))
+            client.run()
+        finally:
+            thread.join()
+            sock.close()
+        self.assertIsInstance(response.error, httplib.BadStatusLine)
+        self.assertEqual(map, {})
+
+
+def test_main():
+    test_support.run_unittest(HTTPClientTests, ErrorTests)
+
+if __name__ == '__main__':
+    test_main()
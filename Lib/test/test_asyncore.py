@@ -227,6 +227,69 @@ class HelperFunctionTests(unittest.TestCase):
         self.assertEqual(info, '[%s|%s|%s]' % (f, function, line))
 
 
+class TimerTests(unittest.TestCase):
+
+    def tearDown(self):
+        asyncore.close_all(self.map)
+
+    def setUp(self):
+        self.map = {}
+
+    def test_order(self):
+        fired = []
+        now = time.time()
+        for i, delay in enumerate([3, 1, 2, 1, 0]):
+            asyncore.call_at(now - 10 + delay, fired.append, (i,),
+                             map=self.map)
+        asyncore.run_timers(self.map)
+        # calls with the same deadline are made in scheduling order
+        self.assertEqual(fired, [4, 1, 3, 2, 0])
+
+    def test_cancel(self):
+        fired = []
+        calls = [asyncore.call_later(-1, fired.append, (i,), map=self.map)
+                 for i in range(200)]
+        for call in calls[:150]:
+            call.cancel()
+        calls[0].cancel()
+        queue = asyncore._timer_queues[id(self.map)]
+        # the cancelled calls have been dropped from the heap
+        self.assertLess(len(queue.heap), 100)
+        asyncore.run_timers(self.map)
+        self.assertEqual(fired, range(150, 200))
+        # cancelling a call which has been made does nothing
+        calls[-1].cancel()
+        self.assertNotIn(id(self.map), asyncore._timer_queues)
+
+    def test_kwargs(self):
+        fired = []
+        def callback(*args, **kwargs):
+            fired.append((args, kwargs))
+        asyncore.call_later(-1, callback, (1, 2), {'x': 3}, map=self.map)
+        asyncore.run_timers(self.map)
+        self.assertEqual(fired, [((1, 2), {'x': 3})])
+
+    def test_error(self):
+        # the calls not yet made are kept when a callback raises
+        fired = []
+        def fail():
+            1 // 0
+        asyncore.call_later(-2, fail, map=self.map)
+        asyncore.call_later(-1, fired.append, (1,), map=self.map)
+        self.assertRaises(ZeroDivisionError, asyncore.run_timers, self.map)
+        asyncore.run_timers(self.map)
+        self.assertEqual(fired, [1])
+
+    def test_close_all(self):
+        fired = []
+        call = asyncore.call_later(-1, fired.append, (1,), map=self.map)
+        asyncore.close_all(self.map)
+        asyncore.run_timers(self.map)
+        call.cancel()
+        self.assertEqual(fired, [])
+        self.assertNotIn(id(self.map), asyncore._timer_queues)
+
+
 class DispatcherTests(unittest.TestCase):
     def setUp(self):
         pass
@@ -511,7 +574,8 @@ class BaseTestAPI(unittest.TestCase):
         timeout = float(timeout) / 100
         count = 100
         while asyncore.socket_map and count > 0:
-            asyncore.loop(timeout=0.01, count=1, use_poll=self.use_poll)
+            asyncore.loop(timeout=0.01, count=1, use_poll=self.use_poll,
+                          use_epoll=self.use_epoll)
             if instance.flag:
                 return
             count -= 1
@@ -649,7 +713,8 @@ class BaseTestAPI(unittest.TestCase):
         self.assertFalse(client.accepting)
 
         # execute some loops so that client connects to server
-        asyncore.loop(timeout=0.01, use_poll=self.use_poll, count=100)
+        asyncore.loop(timeout=0.01, use_poll=self.use_poll, count=100,
+                      use_epoll=self.use_epoll)
         self.assertFalse(server.connected)
         self.assertTrue(server.accepting)
         self.assertTrue(client.connected)
@@ -724,19 +789,217 @@ class BaseTestAPI(unittest.TestCase):
             finally:
                 s.close()
 
+    def test_call_later(self):
+        # the loop wakes up for the nearest pending call
+        map = {}
+        fired = []
+        a, b = socket.socketpair()
+        try:
+            asyncore.dispatcher(a, map)
+            asyncore.call_later(0.05, fired.append, ('second',), map=map)
+            asyncore.call_at(time.time() + 0.01, fired.append, ('first',),
+                             map=map)
+            call = asyncore.call_later(0.02, fired.append, ('never',),
+                                       map=map)
+            call.cancel()
+            start = time.time()
+            while len(fired) < 2 and time.time() - start < 10:
+                asyncore.loop(timeout=30, count=1, map=map,
+                              use_poll=self.use_poll,
+                              use_epoll=self.use_epoll)
+            self.assertLess(time.time() - start, 10)
+            self.assertEqual(fired, ['first', 'second'])
+            self.assertNotIn(id(map), asyncore._timer_queues)
+        finally:
+            asyncore.close_all(map)
+            b.close()
+
+    def test_call_later_reschedule(self):
+        # a call scheduled by a callback is made on the next pass
+        map = {}
+        fired = []
+        def callback():
+            fired.append(None)
+            asyncore.call_later(0, callback, map=map)
+        a, b = socket.socketpair()
+        try:
+            asyncore.dispatcher(a, map)
+            asyncore.call_later(0, callback, map=map)
+            asyncore.loop(timeout=30, count=3, map=map,
+                          use_poll=self.use_poll, use_epoll=self.use_epoll)
+            self.assertEqual(len(fired), 3)
+        finally:
+            asyncore.close_all(map)
+            b.close()
+        self.assertNotIn(id(map), asyncore._timer_queues)
+
 
 class TestAPI_UseSelect(BaseTestAPI):
     use_poll = False
+    use_epoll = False
 
 @unittest.skipUnless(hasattr(select, 'poll'), 'select.poll required')
 class TestAPI_UsePoll(BaseTestAPI):
     use_poll = True
+    use_epoll = False
+
+@unittest.skipUnless(hasattr(select, 'epoll'), 'select.epoll required')
+class TestAPI_UseEpoll(BaseTestAPI):
+    use_poll = False
+    use_epoll = True
+
+    def test_interest_updated(self):
+        # with a sweep interval, readable() and writable() are only called
+        # again for dispatchers with events or which called events_changed()
+        map = {}
+        calls = []
+        class Idle(asyncore.dispatcher):
+            def readable(self):
+                calls.append(self)
+                return True
+            def writable(self):
+                return False
+            def handle_read(self):
+                self.recv(10)
+        a, b = socket.socketpair()
+        c, d = socket.socketpair()
+        try:
+            first = Idle(a, map)
+            second = Idle(c, map)
+            # every dispatcher is checked by the first call
+            d.send('x')
+            asyncore.epoll_poll(10, map, 60)
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(set(calls), set([first, second]))
+            # then only those with events
+            del calls[:]
+            b.send('x')
+            asyncore.epoll_poll(10, map, 60)
+            self.assertEqual(calls, [second])
+            del calls[:]
+            d.send('x')
+            asyncore.epoll_poll(10, map, 60)
+            self.assertEqual(calls, [first])
+            # and those which called events_changed()
+            del calls[:]
+            first.events_changed()
+            d.send('x')
+            asyncore.epoll_poll(10, map, 60)
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(set(calls), set([first, second]))
+        finally:
+            asyncore.close_all(map)
+            for s in (b, d):
+                s.close()
+        self.assertEqual(map, {})
+        self.assertNotIn(id(map), asyncore._epoll_states)
+
+    def test_loop_sweep(self):
+        # loop() checks the idle channels on each pass by default, and only
+        # on the first one with sweep=None
+        for sweep, expected in ((0.0, 15), (None, 5)):
+            map = {}
+            calls = []
+            class Idle(asyncore.dispatcher):
+                def readable(self):
+                    calls.append(self)
+                    return True
+                def writable(self):
+                    return False
+            class Active(asyncore.dispatcher):
+                def writable(self):
+                    return False
+                def handle_read(self):
+                    self.recv(1)
+            pairs = [socket.socketpair() for i in range(6)]
+            try:
+                for a, b in pairs[:5]:
+                    Idle(a, map)
+                Active(pairs[5][0], map)
+                pairs[5][1].send('xxx')
+                asyncore.loop(timeout=10, count=3, map=map, use_epoll=True,
+                              sweep=sweep)
+                self.assertEqual(len(calls), expected)
+            finally:
+                asyncore.close_all(map)
+                for a, b in pairs:
+                    b.close()
+
+    def test_writable_change(self):
+        # data pushed from outside an event handler must be sent
+        map = {}
+        a, b = socket.socketpair()
+        try:
+            sender = asyncore.dispatcher_with_send(a, map)
+            asyncore.loop(timeout=0.01, count=2, map=map, use_epoll=True)
+            sender.out_buffer = 'x' * 100
+            sender.events_changed()
+            asyncore.loop(timeout=0.01, count=2, map=map, use_epoll=True)
+            self.assertEqual(sender.out_buffer, '')
+            self.assertEqual(b.recv(200), 'x' * 100)
+        finally:
+            asyncore.close_all(map)
+            b.close()
+
+    def test_writable_change_from_timer(self):
+        # loop() notices a change of interest which nobody reported
+        map = {}
+        a, b = socket.socketpair()
+        try:
+            sender = asyncore.dispatcher_with_send(a, map)
+            def queue():
+                sender.out_buffer = 'x' * 100
+            asyncore.call_later(0, queue, map=map)
+            asyncore.loop(timeout=30, count=3, map=map, use_epoll=True)
+            self.assertEqual(sender.out_buffer, '')
+            self.assertEqual(b.recv(200), 'x' * 100)
+        finally:
+            asyncore.close_all(map)
+            b.close()
+
+    def test_loop_closes_epoll(self):
+        # the epoll object of a map is not kept once loop() returns
+        for count in (None, 2):
+            map = {}
+            a, b = socket.socketpair()
+            try:
+                class Closer(asyncore.dispatcher):
+                    def handle_read(self):
+                        self.recv(10)
+                        self.close()
+                    def writable(self):
+                        return False
+                Closer(a, map)
+                if count is None:
+                    b.send('x')
+                asyncore.loop(timeout=0.01, count=count, map=map,
+                              use_epoll=True)
+                self.assertNotIn(id(map), asyncore._epoll_states)
+            finally:
+                asyncore.close_all(map)
+                b.close()
+
+    def test_stale_epoll_replaced(self):
+        # a state left behind by another map with the same id() is closed
+        map = {}
+        a, b = socket.socketpair()
+        try:
+            asyncore.dispatcher(a, map)
+            stale = asyncore._epoll_state({})
+            asyncore._epoll_states[id(map)] = stale
+            asyncore.epoll_poll(0, map)
+            self.assertTrue(stale.epoll.closed)
+            self.assertIsNot(asyncore._epoll_states[id(map)], stale)
+        finally:
+            asyncore.close_all(map)
+            b.close()
+        self.assertNotIn(id(map), asyncore._epoll_states)
 
 
 def test_main():
-    tests = [HelperFunctionTests, DispatcherTests, DispatcherWithSendTests,
+    tests = [HelperFunctionTests, TimerTests, DispatcherTests, DispatcherWithSendTests,
              DispatcherWithSendTests_UsePoll, TestAPI_UseSelect,
-             TestAPI_UsePoll, FileWrapperTest]
+             TestAPI_UsePoll, TestAPI_UseEpoll, FileWrapperTest]
     run_unittest(*tests)
 
 if __name__ == "__main__":
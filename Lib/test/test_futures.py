@@ -0,0 +1,195 @@
+# Tests for the futures module
+import time
+import unittest
+from test import test_support
+threading = test_support.import_module('threading')
+# Skip tests if _multiprocessing wasn't built.
+test_support.import_module('_multiprocessing')
+# Skip tests if sem_open implementation is broken.
+test_support.import_module('multiprocessing.synchronize')
+
+import futures
+from futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                     CancelledError, TimeoutError, as_completed, wait,
+                     FIRST_COMPLETED, FIRST_EXCEPTION, ALL_COMPLETED)
+
+
+def mul(x, y):
+    return x * y
+
+def sleep_and_return(delay, value):
+    time.sleep(delay)
+    return value
+
+def sleep_and_raise(delay):
+    time.sleep(delay)
+    raise ValueError('failed after %s' % delay)
+
+
+class ExecutorTest(unittest.TestCase):
+    # subclasses set executor_type
+    worker_count = 2
+
+    def setUp(self):
+        self.executor = self.executor_type(self.worker_count)
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def test_submit(self):
+        f = self.executor.submit(pow, 2, 8)
+        self.assertEqual(f.result(), 256)
+        self.assertTrue(f.done())
+        self.assertFalse(f.running())
+        self.assertFalse(f.cancelled())
+        self.assertEqual(f.exception(), None)
+
+    def test_submit_keyword(self):
+        f = self.executor.submit(mul, 2, y=8)
+        self.assertEqual(f.result(), 16)
+
+    def test_exception(self):
+        f = self.executor.submit(sleep_and_raise, 0)
+        self.assertRaises(ValueError, f.result)
+        self.assertIsInstance(f.exception(), ValueError)
+
+    def test_result_timeout(self):
+        f = self.executor.submit(sleep_and_return, 0.5, 1)
+        self.assertRaises(TimeoutError, f.result, 0.01)
+        self.assertEqual(f.result(), 1)
+
+    def test_map(self):
+        self.assertEqual(list(self.executor.map(pow, range(10), range(10))),
+                         map(pow, range(10), range(10)))
+
+    def test_map_chunksize(self):
+        for chunksize in (2, 3, 100):
+            result = self.executor.map(pow, range(10), range(10),
+                                       chunksize=chunksize)
+            self.assertEqual(list(result), map(pow, range(10), range(10)))
+        self.assertRaises(ValueError, self.executor.map, pow, [], [],
+                          chunksize=0)
+        self.assertRaises(TypeError, self.executor.map, pow, [], [],
+                          chunk_size=2)
+
+    def test_map_exception(self):
+        it = self.executor.map(divmod, [1, 1, 1], [1, 0, 1])
+        self.assertEqual(it.next(), (1, 0))
+        self.assertRaises(ZeroDivisionError, it.next)
+
+    def test_map_timeout(self):
+        it = self.executor.map(sleep_and_return, [0, 0, 2], [1, 2, 3],
+                               timeout=0.5)
+        self.assertEqual(it.next(), 1)
+        self.assertEqual(it.next(), 2)
+        self.assertRaises(TimeoutError, it.next)
+
+    def test_cancel(self):
+        # occupy every worker plus the extra dispatched slot
+        blockers = [self.executor.submit(sleep_and_return, 0.5, i)
+                    for i in range(self.worker_count + 1)]
+        f = self.executor.submit(pow, 2, 2)
+        self.assertFalse(f.running())
+        self.assertTrue(f.cancel())
+        self.assertTrue(f.cancel())
+        self.assertTrue(f.cancelled())
+        self.assertTrue(f.done())
+        self.assertRaises(CancelledError, f.result)
+        self.assertRaises(CancelledError, f.exception)
+
+        self.assertTrue(blockers[0].running())
+        self.assertFalse(blockers[0].cancel())
+        self.assertEqual([b.result() for b in blockers],
+                         range(self.worker_count + 1))
+
+    def test_done_callback(self):
+        results = []
+        f = self.executor.submit(sleep_and_return, 0.1, 5)
+        f.add_done_callback(lambda f: results.append(f.result()))
+        f.result()
+        for i in range(50):
+            if results:
+                break
+            time.sleep(0.01)
+        self.assertEqual(results, [5])
+        # called immediately once the future is done
+        f.add_done_callback(lambda f: results.append(-f.result()))
+        self.assertEqual(results, [5, -5])
+
+    def test_as_completed(self):
+        fs = [self.executor.submit(sleep_and_return, delay, delay)
+              for delay in (0.4, 0.0, 0.2)]
+        result = [f.result() for f in as_completed(fs)]
+        self.assertEqual(sorted(result), [0.0, 0.2, 0.4])
+        self.assertEqual(result[0], 0.0)
+
+    def test_as_completed_timeout(self):
+        fs = [self.executor.submit(sleep_and_return, 0, 1),
+              self.executor.submit(sleep_and_return, 2, 2)]
+        it = as_completed(fs, timeout=0.5)
+        self.assertEqual(it.next().result(), 1)
+        self.assertRaises(TimeoutError, it.next)
+
+    def test_wait_first_completed(self):
+        slow = self.executor.submit(sleep_and_return, 1, 1)
+        fast = self.executor.submit(sleep_and_return, 0, 2)
+        done, not_done = wait([slow, fast], return_when=FIRST_COMPLETED)
+        self.assertEqual(done, set([fast]))
+        self.assertEqual(not_done, set([slow]))
+
+    def test_wait_first_exception(self):
+        slow = self.executor.submit(sleep_and_return, 1, 1)
+        failing = self.executor.submit(sleep_and_raise, 0.1)
+        done, not_done = wait([slow, failing], return_when=FIRST_EXCEPTION)
+        self.assertEqual(done, set([failing]))
+        self.assertEqual(not_done, set([slow]))
+
+    def test_wait_all_completed(self):
+        fs = [self.executor.submit(sleep_and_return, 0.1, i) for i in range(4)]
+        done, not_done = wait(fs, return_when=ALL_COMPLETED)
+        self.assertEqual(done, set(fs))
+        self.assertEqual(not_done, set())
+        self.assertRaises(ValueError, wait, fs, return_when='SOMETIME')
+
+    def test_wait_timeout(self):
+        fast = self.executor.submit(sleep_and_return, 0, 1)
+        slow = self.executor.submit(sleep_and_return, 2, 2)
+        done, not_done = wait([fast, slow], timeout=0.5)
+        self.assertEqual(done, set([fast]))
+        self.assertEqual(not_done, set([slow]))
+
+    def test_shutdown(self):
+        fs = [self.executor.submit(sleep_and_return, 0.1, i) for i in range(6)]
+        self.executor.shutdown(wait=True)
+        self.assertEqual([f.result() for f in fs], range(6))
+        self.assertRaises(RuntimeError, self.executor.submit, pow, 2, 2)
+
+    def test_context_manager(self):
+        with self.executor_type(self.worker_count) as executor:
+            fs = [executor.submit(sleep_and_return, 0.05, i)
+                  for i in range(6)]
+        self.assertTrue(all(f.done() for f in fs))
+
+
+class ThreadPoolExecutorTest(ExecutorTest):
+    executor_type = ThreadPoolExecutor
+
+    def test_default_workers(self):
+        executor = ThreadPoolExecutor()
+        try:
+            self.assertEqual(executor._pool._processes,
+                             futures.cpu_count() * 5)
+        finally:
+            executor.shutdown()
+
+
+class ProcessPoolExecutorTest(ExecutorTest):
+    executor_type = ProcessPoolExecutor
+
+
+def test_main():
+    test_support.run_unittest(ThreadPoolExecutorTest,
+                              ProcessPoolExecutorTest)
+
+if __name__ == "__main__":
+    test_main()
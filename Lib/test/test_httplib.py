@@ -4,6 +4,14 @@ import httplib
 import StringIO
 import socket
 import errno
+import os
+import time
+import BaseHTTPServer
+import SocketServer
+try:
+    import threading
+except ImportError:
+    threading = None
 
 import unittest
 TestCase = unittest.TestCase
@@ -253,6 +261,114 @@ class BasicTest(TestCase):
         sock.data = ''
         conn.send(StringIO.StringIO(expected))
         self.assertEqual(expected, sock.data)
+        for body in (buffer(expected), memoryview(expected),
+                     bytearray(expected), iter(expected.split(' ', 3))):
+            sock.data = ''
+            conn.send(body)
+            self.assertEqual(expected.replace(' ', '', 3) if
+                             not hasattr(body, '__len__') else expected,
+                             sock.data)
+
+    def test_send_large_blocks(self):
+        class RecordingSocket(FakeSocket):
+            def __init__(self):
+                FakeSocket.__init__(self, None)
+                self.calls = []
+            def sendall(self, data):
+                self.calls.append(len(data))
+                self.data += (data.tobytes() if isinstance(data, memoryview)
+                              else str(buffer(data)))
+        body = 'x' * (httplib.HTTPConnection.blocksize * 20 + 10)
+        with open(test_support.TESTFN, 'wb') as f:
+            f.write(body)
+        self.addCleanup(test_support.unlink, test_support.TESTFN)
+        with open(test_support.TESTFN, 'rb') as f:
+            f.read(10)
+            fd = os.open(test_support.TESTFN, os.O_RDONLY)
+            try:
+                for data in (f, fd, StringIO.StringIO(body),
+                             bytearray(body), memoryview(body)):
+                    conn = httplib.HTTPConnection('example.com')
+                    conn.sock = sock = RecordingSocket()
+                    conn.request('PUT', '/', data,
+                                 {'Content-Length': len(body)}
+                                 if isinstance(data, StringIO.StringIO)
+                                 else {})
+                    headers, sent = sock.data.split('\r\n\r\n', 1)
+                    if data is f:
+                        self.assertEqual(sent, body[10:])
+                        self.assertEqual(f.read(), '')
+                        # only the rest of the file is announced
+                        self.assertIn('Content-Length: %d' % (len(body) - 10),
+                                      headers)
+                    else:
+                        self.assertEqual(sent, body)
+                        self.assertIn('Content-Length: %d' % len(body),
+                                      headers)
+                    if data is fd:
+                        self.assertEqual(os.read(fd, 10), '')
+                    # the headers go with the first block of the body
+                    self.assertEqual(sock.calls[0], len(headers) + 4 +
+                                     httplib.HTTPConnection.blocksize)
+                    self.assertLessEqual(len(sock.calls), 22)
+            finally:
+                os.close(fd)
+
+    def test_content_length(self):
+        for body, length in ((array.array('i', [1, 2]), 8),
+                             (memoryview(array.array('i', [1, 2]).tostring()),
+                              8),
+                             (buffer('abc', 1), 2)):
+            conn = httplib.HTTPConnection('example.com')
+            conn.sock = sock = FakeSocket(None)
+            conn.request('POST', '/', body)
+            self.assertIn('Content-Length: %d\r\n' % length, sock.data)
+        # a body whose length isn't known is sent chunked
+        for body in (['a', '', bytearray('bc')], StringIO.StringIO('abc')):
+            conn = httplib.HTTPConnection('example.com')
+            conn.sock = sock = FakeSocket(None)
+            conn.request('POST', '/', body)
+            headers, sent = sock.data.split('\r\n\r\n', 1)
+            self.assertNotIn('Content-Length', headers)
+            self.assertIn('Transfer-Encoding: chunked', headers)
+            self.assertIn(sent, ('1\r\na\r\n2\r\nbc\r\n0\r\n\r\n',
+                                 '3\r\nabc\r\n0\r\n\r\n'))
+        # unless the caller gives the length or the framing
+        for header in ('Content-Length', 'Transfer-Encoding'):
+            conn = httplib.HTTPConnection('example.com')
+            conn.sock = sock = FakeSocket(None)
+            conn.request('POST', '/', ['a', 'b'], {header: '2'})
+            self.assertNotIn('chunked', sock.data)
+            self.assertTrue(sock.data.endswith('\r\n\r\nab'))
+
+    def test_content_length_fd(self):
+        with open(test_support.TESTFN, 'wb') as f:
+            f.write('hello body')
+        self.addCleanup(test_support.unlink, test_support.TESTFN)
+        # the length of a regular file is what is left from its offset
+        fd = os.open(test_support.TESTFN, os.O_RDONLY)
+        try:
+            os.lseek(fd, 6, os.SEEK_SET)
+            conn = httplib.HTTPConnection('example.com')
+            conn.sock = sock = FakeSocket(None)
+            conn.request('POST', '/', fd)
+            self.assertIn('Content-Length: 4\r\n\r\nbody', sock.data)
+        finally:
+            os.close(fd)
+        # a pipe has no length, and its data is sent chunked
+        r, w = os.pipe()
+        try:
+            os.write(w, 'hello body')
+            os.close(w)
+            conn = httplib.HTTPConnection('example.com')
+            conn.sock = sock = FakeSocket(None)
+            conn.request('POST', '/', r)
+            self.assertNotIn('Content-Length', sock.data)
+            self.assertTrue(sock.data.endswith(
+                'Transfer-Encoding: chunked\r\n\r\n'
+                'A\r\nhello body\r\n0\r\n\r\n'))
+        finally:
+            os.close(r)
 
     def test_chunked(self):
         chunked_start = (
@@ -301,6 +417,124 @@ class BasicTest(TestCase):
         self.assertEqual(resp.reason, 'OK')
         self.assertTrue(resp.isclosed())
 
+    def test_readinto(self):
+        body = "HTTP/1.1 200 Ok\r\nContent-Length: 4\r\n\r\nTextExtra"
+        resp = httplib.HTTPResponse(FakeSocket(body))
+        resp.begin()
+        b = bytearray(3)
+        self.assertEqual(resp.readinto(b), 3)
+        self.assertEqual(b, 'Tex')
+        self.assertFalse(resp.isclosed())
+        self.assertEqual(resp.readinto(b), 1)
+        self.assertEqual(b[:1], 't')
+        self.assertTrue(resp.isclosed())
+        self.assertEqual(resp.readinto(b), 0)
+
+        # until the connection is closed
+        body = "HTTP/1.1 200 Ok\r\nConnection: close\r\n\r\nText"
+        resp = httplib.HTTPResponse(FakeSocket(body))
+        resp.begin()
+        b = bytearray(10)
+        self.assertEqual(resp.readinto(memoryview(b)), 4)
+        self.assertEqual(b[:4], 'Text')
+        self.assertEqual(resp.readinto(b), 0)
+
+    def test_readinto_chunked(self):
+        chunked_start = (
+            'HTTP/1.1 200 OK\r\n'
+            'Transfer-Encoding: chunked\r\n\r\n'
+            'a\r\n'
+            'hello worl\r\n'
+            '1;ext=1\r\n'
+            'd\r\n'
+        )
+        sock = FakeSocket(chunked_start + '0\r\nX-Trailer: 1\r\n\r\n')
+        resp = httplib.HTTPResponse(sock, method="GET")
+        resp.begin()
+        b = bytearray(4)
+        parts = []
+        while True:
+            n = resp.readinto(b)
+            if not n:
+                break
+            parts.append(str(b[:n]))
+        self.assertEqual(parts, ['hell', 'o wo', 'rld'])
+        self.assertTrue(resp.isclosed())
+
+        sock = FakeSocket(chunked_start + 'foo\r\n')
+        resp = httplib.HTTPResponse(sock, method="GET")
+        resp.begin()
+        b = bytearray(20)
+        try:
+            resp.readinto(b)
+        except httplib.IncompleteRead, i:
+            self.assertEqual(i.partial, 'hello world')
+        else:
+            self.fail('IncompleteRead expected')
+
+    def test_read_chunked_amt(self):
+        sock = FakeSocket('HTTP/1.1 200 OK\r\n'
+                          'Transfer-Encoding: chunked\r\n\r\n'
+                          '3\r\nabc\r\n4\r\ndefg\r\n0\r\n\r\n')
+        resp = httplib.HTTPResponse(sock, method="GET")
+        resp.begin()
+        self.assertEqual(resp.read(2), 'ab')
+        self.assertEqual(resp.read(3), 'cde')
+        self.assertEqual(resp.read(10), 'fg')
+        self.assertTrue(resp.isclosed())
+        self.assertEqual(resp.read(), '')
+
+    def test_decode_content(self):
+        zlib = test_support.import_module('zlib')
+        data = 'compressed body ' * 1000
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        gzipped = compressor.compress(data) + compressor.flush()
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw_deflated = compressor.compress(data) + compressor.flush()
+        chunked = ''.join('%x\r\n%s\r\n' % (len(gzipped[i:i+100]),
+                                              gzipped[i:i+100])
+                          for i in range(0, len(gzipped), 100))
+        for encoding, body, chunks in (
+                ('gzip', gzipped, None),
+                ('x-gzip', gzipped, None),
+                ('deflate', zlib.compress(data), None),
+                ('deflate', raw_deflated, None),
+                ('gzip', chunked + '0\r\n\r\n', True)):
+            if chunks:
+                headers = 'Transfer-Encoding: chunked\r\n'
+            else:
+                headers = 'Content-Length: %d\r\n' % len(body)
+            text = ('HTTP/1.1 200 OK\r\nContent-Encoding: %s\r\n%s\r\n%s'
+                    % (encoding, headers, body))
+            resp = httplib.HTTPResponse(FakeSocket(text), decode_content=True)
+            resp.begin()
+            self.assertEqual(resp.read(), data)
+            self.assertTrue(resp.isclosed())
+
+            resp = httplib.HTTPResponse(FakeSocket(text), decode_content=True)
+            resp.begin()
+            parts = []
+            while True:
+                s = resp.read(1000)
+                if not s:
+                    break
+                self.assertLessEqual(len(s), 1000)
+                parts.append(s)
+            self.assertEqual(''.join(parts), data)
+
+            resp = httplib.HTTPResponse(FakeSocket(text), decode_content=True)
+            resp.begin()
+            b = bytearray(len(data) + 10)
+            self.assertEqual(resp.readinto(b), len(data))
+            self.assertEqual(b[:len(data)], data)
+
+        # without decode_content the body is returned as sent
+        text = ('HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\n'
+                'Content-Length: %d\r\n\r\n%s' % (len(gzipped), gzipped))
+        resp = httplib.HTTPResponse(FakeSocket(text))
+        resp.begin()
+        self.assertEqual(resp.read(), gzipped)
+
     def test_negative_content_length(self):
         sock = FakeSocket('HTTP/1.1 200 OK\r\n'
                           'Content-Length: -1\r\n\r\nHello\r\n')
@@ -477,6 +711,42 @@ class HTTPSTimeoutTest(TestCase):
             h = httplib.HTTPSConnection(HOST, TimeoutTest.PORT, timeout=30)
             self.assertEqual(h.timeout, 30)
 
+    @unittest.skipIf(not hasattr(httplib, 'HTTPSConnection'),
+                     'httplib.HTTPSConnection not available')
+    def test_tunnel_session_cache_key(self):
+        # the TLS session is cached for the server at the end of the
+        # tunnel, not for the proxy
+        keys = []
+        class Cache:
+            def get(self, key):
+                keys.append(key)
+        class Session:
+            session = None
+        ssl = httplib.ssl
+        create_connection = socket.create_connection
+        wrap_socket = ssl.wrap_socket
+        socket.create_connection = lambda *args: FakeSocket('')
+        ssl.wrap_socket = lambda *args, **kwds: Session()
+        try:
+            for tunnel, port in (('www.example.com', 8443),
+                                 ('www.example.com:8443', None),
+                                 ('www.example.com', None)):
+                h = httplib.HTTPSConnection('proxy.example.com', 3128,
+                                            session_cache=Cache())
+                h.set_tunnel(tunnel, port)
+                h._tunnel = lambda: None
+                h.connect()
+            h = httplib.HTTPSConnection('proxy.example.com', 3128,
+                                        session_cache=Cache())
+            h.connect()
+        finally:
+            socket.create_connection = create_connection
+            ssl.wrap_socket = wrap_socket
+        self.assertEqual(keys, [('www.example.com', 8443, None, None),
+                                ('www.example.com', 8443, None, None),
+                                ('www.example.com', 443, None, None),
+                                ('proxy.example.com', 3128, None, None)])
+
     @unittest.skipIf(not hasattr(httplib, 'HTTPS'), 'httplib.HTTPS not available')
     def test_host_port(self):
         # Check invalid host_port
@@ -499,9 +769,146 @@ class HTTPSTimeoutTest(TestCase):
                 self.fail("Port incorrectly parsed: %s != %s" % (p, c.host))
 
 
+class PoolHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == '/chunked':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write('5\r\nhello\r\n0\r\n\r\n')
+            return
+        if self.path == '/wait':
+            self.server.event.wait()
+        body = 'body of ' + self.path
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        if self.path == '/close':
+            self.send_header('Connection', 'close')
+            self.close_connection = 1
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path == '/drop':
+            # announce keep-alive, then close the connection anyway
+            self.close_connection = 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '100')
+        self.end_headers()
+
+
+class PoolServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def handle_error(self, request, client_address):
+        # the pool resets connections whose responses were not read fully
+        pass
+
+
+@unittest.skipUnless(threading, 'Threading required for this test.')
+class ConnectionPoolTest(TestCase):
+
+    def setUp(self):
+        self.server = PoolServer((HOST, 0), PoolHandler)
+        self.server.event = threading.Event()
+        self.base = 'http://%s:%d' % (HOST, self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+        self.pool = httplib.HTTPConnectionPool(maxsize=2)
+
+    def tearDown(self):
+        self.server.event.set()
+        self.pool.close()
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def get(self, path, method='GET'):
+        response = self.pool.request(method, self.base + path)
+        return response.read()
+
+    def test_reuse(self):
+        for i in range(5):
+            self.assertEqual(self.get('/%d' % i), 'body of /%d' % i)
+        self.assertEqual(self.get('/chunked'), 'hello')
+        self.assertEqual(self.get('/', 'HEAD'), '')
+        self.assertEqual(self.get('/x'), 'body of /x')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_partial_read(self):
+        # a connection whose response was not read to the end is closed
+        response = self.pool.request('GET', self.base + '/partial')
+        self.assertEqual(response.read(4), 'body')
+        response.close()
+        self.assertEqual(self.get('/x'), 'body of /x')
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(self.pool._count.values(), [1])
+
+    def test_connection_close(self):
+        self.assertEqual(self.get('/close'), 'body of /close')
+        self.assertEqual(self.pool._idle, {})
+        self.assertEqual(self.pool._count, {})
+        self.assertEqual(self.get('/x'), 'body of /x')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_dropped_connection(self):
+        # the server closed the idle connection, which is not reused
+        self.assertEqual(self.get('/drop'), 'body of /drop')
+        time.sleep(0.1)
+        self.assertEqual(self.get('/x'), 'body of /x')
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(self.pool._count.values(), [1])
+
+    def test_maxsize(self):
+        # the third request waits for one of the first two connections
+        results = []
+        def get():
+            results.append(self.get('/wait'))
+        threads = [threading.Thread(target=get) for i in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.2)
+        self.assertEqual(self.server.connections, 2)
+        self.server.event.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ['body of /wait'] * 3)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_no_block(self):
+        self.pool.block = False
+        conns = [self.pool.get_connection('http', HOST,
+                                          self.server.server_address[1])
+                 for i in range(3)]
+        for conn in conns:
+            conn.request('GET', '/x')
+            self.assertEqual(conn.getresponse().read(), 'body of /x')
+        for conn in conns:
+            self.pool.put_connection(conn)
+        # only maxsize connections are kept
+        self.assertEqual(len(self.pool._idle.values()[0]), 2)
+        self.assertEqual(self.pool._count.values(), [2])
+
+    def test_bad_scheme(self):
+        self.assertRaises(httplib.InvalidURL, self.pool.request, 'GET',
+                          'ftp://%s/' % HOST)
+
+
 def test_main(verbose=None):
     test_support.run_unittest(HeaderTests, OfflineTest, BasicTest, TimeoutTest,
-                              HTTPSTimeoutTest, SourceAddressTest)
+                              HTTPSTimeoutTest, SourceAddressTest,
+                              ConnectionPoolTest)
 
 if __name__ == '__main__':
     test_main()
@@ -16,6 +16,7 @@ import socket
 import random
 import logging
 import errno
+import pickle
 import test.script_helper
 from test import test_support
 from StringIO import StringIO
@@ -626,6 +627,128 @@ class _TestQueue(BaseTestCase):
 #
 #
 
+class _TestQueueBatches(BaseTestCase):
+
+    ALLOWED_TYPES = ('processes',)
+
+    @classmethod
+    def _test_put_many(cls, queue, n):
+        queue.put_many(range(n))
+        queue.put_many([])
+        queue.put(n)
+
+    def test_put_many(self):
+        queue = self.Queue()
+        p = self.Process(target=self._test_put_many, args=(queue, 10))
+        p.daemon = True
+        p.start()
+        self.assertEqual([queue.get() for i in range(11)], range(11))
+        p.join()
+        self.assertTrue(queue.empty())
+
+    def test_get_many(self):
+        queue = self.Queue()
+        self.assertRaises(Queue.Empty, queue.get_many, block=False)
+        self.assertRaises(Queue.Empty, queue.get_many, timeout=DELTA)
+        queue.put_many(range(10))
+        self.assertEqual(queue.get_many(4), range(4))
+        self.assertEqual(queue.get(), 4)
+        self.assertEqual(queue.get_many(), range(5, 10))
+        # items put separately may not all have reached the pipe yet
+        queue.put(10)
+        queue.put(11)
+        res = queue.get_many()
+        while len(res) < 2:
+            res += queue.get_many()
+        self.assertEqual(res, [10, 11])
+        # a batch larger than the pipe's buffer
+        big = ['x' * 100000] * 3
+        queue.put_many(big)
+        self.assertEqual(queue.get_many(), big)
+        self.assertRaises(Queue.Empty, queue.get_many, block=False)
+
+    def test_put_many_full(self):
+        queue = self.Queue(maxsize=5)
+        queue.put_many(range(3))
+        self.assertRaises(Queue.Full, queue.put_many, range(3), False)
+        # a put_many which did not fit takes up no room
+        queue.put_many(range(3, 5))
+        self.assertEqual([queue.get() for i in range(5)], range(5))
+        self.assertRaises(ValueError, queue.put_many, range(6))
+
+    @classmethod
+    def _test_put_many_concurrent(cls, queue):
+        for i in range(200):
+            queue.put_many([1, 2, 3])
+
+    def test_put_many_concurrent(self):
+        # several put_many() callers on a small queue must not deadlock
+        # each holding part of the room they need
+        queue = self.Queue(maxsize=4)
+        workers = [self.Process(target=self._test_put_many_concurrent,
+                                args=(queue,)) for i in range(3)]
+        for p in workers:
+            p.daemon = True
+            p.start()
+        total = 0
+        for i in range(1800):
+            total += queue.get(timeout=10)
+        self.assertEqual(total, 3600)
+        for p in workers:
+            p.join()
+
+    @classmethod
+    def _test_put_many_consumer(cls, queue, results):
+        for item in iter(queue.get, None):
+            results.put(item)
+        results.put(None)
+
+    def test_put_many_consumers(self):
+        # the items of one put_many() must be shared out between consumers,
+        # not all kept by whichever one reads first
+        queue = self.Queue()
+        results = self.Queue()
+        workers = [self.Process(target=self._test_put_many_consumer,
+                                args=(queue, results)) for i in range(3)]
+        for p in workers:
+            p.daemon = True
+            p.start()
+        queue.put_many(range(30) + [None] * 3)
+        items = []
+        for p in workers:
+            items.extend(iter(lambda: results.get(timeout=10), None))
+        self.assertEqual(sorted(items), range(30))
+        for p in workers:
+            p.join()
+
+    def test_coalesce(self):
+        queue = self.Queue(coalesce=True)
+        for i in range(1000):
+            queue.put(i)
+        queue.put_many(range(1000, 2000))
+        result = []
+        while len(result) < 2000:
+            result.extend(queue.get_many())
+        self.assertEqual(result, range(2000))
+
+    @classmethod
+    def _test_joinable(cls, queue):
+        for item in queue.get_many(3):
+            queue.task_done()
+
+    def test_joinable_put_many(self):
+        queue = self.JoinableQueue()
+        queue.put_many(range(3))
+        p = self.Process(target=self._test_joinable, args=(queue,))
+        p.daemon = True
+        p.start()
+        queue.join()
+        p.join()
+
+#
+#
+#
+
 class _TestLock(BaseTestCase):
 
     def test_lock(self):
@@ -1086,6 +1209,61 @@ class _TestContainers(BaseTestCase):
         self.assertEqual(sorted(d.values()), [chr(i) for i in indices])
         self.assertEqual(sorted(d.items()), [(i, chr(i)) for i in indices])
 
+    def test_callmethods(self):
+        d = self.dict()
+        calls = [('__setitem__', (i, chr(i))) for i in range(65, 70)]
+        self.assertEqual(d._callmethods(calls), [None] * 5)
+        calls = [('__getitem__', (i,)) for i in range(65, 70)]
+        calls.append(('get', (0,), {}))
+        self.assertEqual(d._callmethods(calls), list('ABCDE') + [None])
+        self.assertEqual(d._callmethods([]), [])
+
+        # the calls after a failing one are not made
+        calls = [('pop', (65,)), ('__getitem__', (65,)), ('pop', (66,))]
+        self.assertRaises(KeyError, d._callmethods, calls)
+        self.assertEqual(sorted(d.keys()), [66, 67, 68, 69])
+
+        calls = [('__len__', ()), ('__delattr__', ('x',))]
+        self.assertRaises(AttributeError, d._callmethods, calls)
+
+    @classmethod
+    def _update_dict(cls, d):
+        d['a'] = 2
+        del d['b']
+
+    def test_dict_cache(self):
+        d = self.dict(a=1, b=2)
+        d._enable_cache()
+        self.assertEqual(d['a'], 1)
+        self.assertEqual(d.get('b'), 2)
+        self.assertEqual(d._cache[('__getitem__', ('a',))][:0], '')
+        self.assertEqual(len(d._cache), 2)
+        l = d.keys()
+        l.append('c')                   # results are copies
+        self.assertEqual(sorted(d.keys()), ['a', 'b'])
+
+        # a call which may change the referent invalidates the cache
+        d['c'] = 3
+        self.assertEqual(len(d._cache), 0)
+        self.assertEqual(d['c'], 3)
+        self.assertRaises(KeyError, d.__getitem__, 'd')
+
+        # changes made through another proxy are pushed to the cache
+        p = self.Process(target=self._update_dict, args=(d,))
+        p.daemon = True
+        p.start()
+        p.join()
+        for i in range(100):
+            if not d._cache:
+                break
+            time.sleep(0.05)
+        self.assertEqual(d['a'], 2)
+        self.assertFalse('b' in d)
+
+        d._disable_cache()
+        d['b'] = 3
+        self.assertEqual(d['b'], 3)
+
     def test_namespace(self):
         n = self.Namespace()
         n.name = 'Bob'
@@ -1156,6 +1334,110 @@ class _TestPool(BaseTestCase):
         it = self.pool.imap_unordered(sqr, range(1000), chunksize=53)
         self.assertEqual(sorted(it), map(sqr, range(1000)))
 
+    def test_max_inflight(self):
+        it = self.pool.imap(sqr, range(100), max_inflight=3)
+        self.assertEqual(list(it), map(sqr, range(100)))
+
+        it = self.pool.imap(sqr, range(100), chunksize=7, max_inflight=2)
+        self.assertEqual(list(it), map(sqr, range(100)))
+
+        it = self.pool.imap_unordered(sqr, range(100), max_inflight=1)
+        self.assertEqual(sorted(it), map(sqr, range(100)))
+
+        res = self.pool.map_async(sqr, range(100), chunksize=3,
+                                  max_inflight=2)
+        self.assertEqual(res.get(), map(sqr, range(100)))
+        self.assertEqual(self.pool.map(sqr, range(10), max_inflight=1),
+                         map(sqr, range(10)))
+
+    def test_max_inflight_bounds_submission(self):
+        if self.TYPE == 'manager':
+            # a generator cannot be sent to the manager process
+            return
+        seen = []
+        def gen():
+            for i in range(20):
+                seen.append(i)
+                yield i
+        it = self.pool.imap(sqr, gen(), max_inflight=3)
+        self.assertEqual(it.next(), 0)
+        time.sleep(DELTA * 5)
+        # one slot was freed by consuming the first result
+        self.assertTrue(len(seen) <= 4, seen)
+        self.assertEqual(list(it), map(sqr, range(1, 20)))
+
+    def test_max_inflight_unconsumed_join(self):
+        # close() and join() must not wait for an iterator nobody consumes
+        p = self.Pool(2)
+        it = p.imap(sqr, range(20), max_inflight=2)
+        self.assertEqual(it.next(), 0)
+        p.close()
+        t = threading.Thread(target=p.join)
+        t.daemon = True
+        t.start()
+        t.join(30)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(list(it), map(sqr, range(1, 20)))
+
+    def test_max_inflight_other_jobs(self):
+        # an iterator which nobody is consuming must not hold up other jobs
+        it = self.pool.imap(sqr, range(100), max_inflight=2)
+        it2 = self.pool.imap_unordered(sqr, range(1000), chunksize='auto')
+        self.assertEqual(self.pool.apply_async(sqr, (7,)).get(30), 49)
+        self.assertEqual(list(it), map(sqr, range(100)))
+        self.assertEqual(sorted(it2), map(sqr, range(1000)))
+
+    def test_max_inflight_invalid(self):
+        self.assertRaises(ValueError, self.pool.imap, sqr, range(3),
+                          max_inflight=0)
+
+    def test_auto_chunksize(self):
+        it = self.pool.imap(sqr, range(1000), chunksize='auto')
+        self.assertEqual(list(it), map(sqr, range(1000)))
+
+        it = self.pool.imap_unordered(sqr, range(1000), chunksize='auto',
+                                      max_inflight=4)
+        self.assertEqual(sorted(it), map(sqr, range(1000)))
+
+        self.assertEqual(self.pool.map(sqr, range(1000), chunksize='auto'),
+                         map(sqr, range(1000)))
+        self.assertEqual(self.pool.map(sqr, [], chunksize='auto'), [])
+
+    def test_auto_chunksize_grows(self):
+        if self.TYPE == 'manager':
+            return
+        from multiprocessing.pool import ChunkSizer
+        sizer = ChunkSizer(0.1, 10)
+        sizes = []
+        for i in range(8):
+            sizes.append(sizer.chunksize)
+            sizer.record((True, [None] * sizer.chunksize),
+                         (0.0, 0.001 * sizer.chunksize))
+        # the size at most doubles per result up to target / time per item
+        self.assertEqual(sizes, [1, 2, 4, 8, 16, 32, 64, 100])
+
+        sizer.record((True, [None] * 100), (0.0, 10.0))
+        self.assertTrue(sizer.chunksize < 100)
+
+    def test_stats(self):
+        if self.TYPE == 'manager':
+            return
+        p = self.Pool(2)
+        self.assertEqual(p.map(sqr, range(100), chunksize=10),
+                         map(sqr, range(100)))
+        self.assertEqual(p.apply(sqr, (3,)), 9)
+        stats = p.stats()
+        self.assertEqual(stats['tasks'], 101)
+        self.assertEqual(stats['chunks'], 11)
+        self.assertEqual(stats['results'], 11)
+        self.assertTrue(stats['task_time'] >= 0)
+        self.assertTrue(stats['queue_wait'] >= 0)
+        if self.TYPE == 'processes':
+            self.assertTrue(stats['bytes_sent'] > 0)
+            self.assertTrue(stats['bytes_received'] > 0)
+        p.close()
+        p.join()
+
     def test_make_pool(self):
         self.assertRaises(ValueError, multiprocessing.Pool, -1)
         self.assertRaises(ValueError, multiprocessing.Pool, 0)
@@ -1950,6 +2232,79 @@ class _TestSharedCTypes(BaseTestCase):
 #
 #
 
+def _shared_buffer_slice(args):
+    buf, start, stop = args
+    return buf.get_buffer()[start:stop]
+
+class _TestSharedBuffer(BaseTestCase):
+
+    ALLOWED_TYPES = ('processes',)
+
+    def setUp(self):
+        if not HAS_SHAREDCTYPES:
+            self.skipTest("requires multiprocessing.sharedctypes")
+
+    @classmethod
+    def _fill(cls, buf, c):
+        arr = buf.get_array()
+        arr[:] = c * len(arr)
+
+    def test_initializer(self):
+        buf = multiprocessing.SharedBuffer('hello world')
+        self.assertEqual(len(buf), 11)
+        self.assertEqual(str(buf.get_buffer()), 'hello world')
+        buf = multiprocessing.SharedBuffer(array.array('i', range(10)))
+        self.assertEqual(list(buf.get_array('i')), range(10))
+        buf = multiprocessing.SharedBuffer(5)
+        self.assertEqual(str(buf.get_buffer()), '\0' * 5)
+
+    def test_pickled_by_reference(self):
+        buf = multiprocessing.SharedBuffer('x' * 100000)
+        data = pickle.dumps(buf, pickle.HIGHEST_PROTOCOL)
+        self.assertTrue(len(data) < 1000)
+        # unpickling in the owning process gives back the same object
+        self.assertIs(pickle.loads(data), buf)
+
+    def test_existing_pool(self):
+        # the workers are started before the buffer exists
+        pool = self.Pool(2)
+        data = ''.join(chr(i % 256) for i in range(10000))
+        buf = multiprocessing.SharedBuffer(data)
+        args = [(buf, i, i + 100) for i in range(0, 10000, 1000)]
+        self.assertEqual(pool.map(_shared_buffer_slice, args),
+                         [data[i:i + 100] for i in range(0, 10000, 1000)])
+        pool.close()
+        pool.join()
+
+    def test_pool_keeps_buffer_alive(self):
+        pool = self.Pool(1)
+        pool.apply_async(time.sleep, (DELTA * 5,))
+        # no reference is kept to the buffer while its task waits
+        res = pool.apply_async(_shared_buffer_slice,
+                               ((multiprocessing.SharedBuffer('a' * 100),
+                                 0, 100),))
+        # the task handler drops its last task when it takes the next one
+        pool.apply_async(time.sleep, (0,))
+        time.sleep(DELTA)
+        gc.collect()
+        # would reuse the block if the pool had not kept the buffer
+        other = multiprocessing.SharedBuffer('b' * 100)
+        self.assertEqual(res.get(), 'a' * 100)
+        pool.close()
+        pool.join()
+
+    def test_write_in_child(self):
+        buf = multiprocessing.SharedBuffer(10)
+        p = self.Process(target=self._fill, args=(buf, 'a'))
+        p.daemon = True
+        p.start()
+        p.join()
+        self.assertEqual(str(buf.get_buffer()), 'a' * 10)
+
+#
+#
+#
+
 class _TestFinalize(BaseTestCase):
 
     ALLOWED_TYPES = ('processes',)
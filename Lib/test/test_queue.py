@@ -191,6 +191,72 @@ class BaseQueueTest(BlockingTestMixin):
         self.simple_queue_test(q)
 
 
+    def test_put_many_get_many(self):
+        q = self.type2test()
+        q.put_many([111, 333, 222])
+        q.put_many(iter([]))
+        target_order = dict(Queue = [111, 333, 222],
+                            LifoQueue = [222, 333, 111],
+                            PriorityQueue = [111, 222, 333])
+        self.assertEqual(q.get_many(), target_order[q.__class__.__name__])
+        self.assertRaises(Queue.Empty, q.get_many, block=False)
+        self.assertRaises(Queue.Empty, q.get_many, timeout=0.01)
+        self.assertRaises(ValueError, q.get_many, 0)
+        q.put_many(xrange(10))
+        self.assertEqual(len(q.get_many(4)), 4)
+        self.assertEqual(len(q.get_many(10)), 6)
+        self.assertEqual(q.unfinished_tasks, 13)
+
+    def test_put_many_bounded(self):
+        q = self.type2test(QUEUE_SIZE)
+        self.assertRaises(ValueError, q.put_many, range(QUEUE_SIZE + 1))
+        q.put(0)
+        self.assertRaises(Queue.Full, q.put_many, range(QUEUE_SIZE), False)
+        self.assertRaises(Queue.Full, q.put_many, range(QUEUE_SIZE),
+                          timeout=0.01)
+        # nothing was put by the failed calls
+        self.assertEqual(q.qsize(), 1)
+        q.put_many(range(QUEUE_SIZE - 1))
+        self.assertTrue(q.full())
+        # blocks until there is room for all the items
+        q.get()
+        self.do_blocking_test(q.put_many, ([1, 2],), q.get, ())
+        self.assertTrue(q.full())
+
+    def test_get_many_blocking(self):
+        q = self.type2test()
+        result = self.do_blocking_test(q.get_many, (), q.put_many, ([5, 5],))
+        self.assertEqual(result, [5, 5])
+        result = self.do_blocking_test(q.get_many, (None, True, 10),
+                                       q.put, (7,))
+        self.assertEqual(result, [7])
+
+    def test_get_many_wakes_bulk_putters(self):
+        # a get() which frees room for a waiting put_many() must also wake
+        # the single-item put() waiting behind it
+        q = self.type2test(2)
+        q.put_many([1, 2])
+        results = []
+        def bulk():
+            q.put_many([3, 4])
+            results.append('bulk')
+        def single():
+            q.put(5)
+            results.append('single')
+        threads = [threading.Thread(target=bulk),
+                   threading.Thread(target=single)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        q.get()
+        for t in threads[1:]:
+            t.join(10)
+        self.assertEqual(results, ['single'])
+        q.get_many()
+        threads[0].join(10)
+        self.assertEqual(results, ['single', 'bulk'])
+
+
 class QueueTest(BaseQueueTest, unittest.TestCase):
     type2test = Queue.Queue
 
@@ -202,6 +268,66 @@ class PriorityQueueTest(BaseQueueTest, unittest.TestCase):
 
 
 
+class SimpleQueueTest(BlockingTestMixin, unittest.TestCase):
+    def test_simple_queue(self):
+        q = Queue.SimpleQueue()
+        self.assertTrue(q.empty())
+        q.put(111)
+        q.put_nowait(333)
+        q.put_many([222, 444])
+        self.assertEqual(q.qsize(), 4)
+        self.assertEqual([q.get(), q.get_nowait()], [111, 333])
+        self.assertEqual(q.get_many(), [222, 444])
+        self.assertTrue(q.empty())
+        self.assertRaises(Queue.Empty, q.get, False)
+        self.assertRaises(Queue.Empty, q.get, timeout=0.01)
+        self.assertRaises(Queue.Empty, q.get_many, block=False)
+        self.assertRaises(ValueError, q.get, timeout=-1)
+        self.assertRaises(ValueError, q.get_many, 0)
+        q.put_many(range(10))
+        self.assertEqual(q.get_many(3), [0, 1, 2])
+        self.assertEqual(q.get_many(), range(3, 10))
+
+    def test_blocking_get(self):
+        q = Queue.SimpleQueue()
+        self.assertEqual(self.do_blocking_test(q.get, (), q.put, ('x',)), 'x')
+        self.assertEqual(self.do_blocking_test(q.get, (True, 10),
+                                               q.put, ('y',)), 'y')
+        self.assertEqual(self.do_blocking_test(q.get_many, (),
+                                               q.put_many, ([1, 2],)), [1, 2])
+        self.assertEqual(q.waiters, 0)
+
+    def test_producers_consumers(self):
+        q = Queue.SimpleQueue()
+        N = 5
+        M = 2000
+        results = []
+        def consumer():
+            while True:
+                x = q.get()
+                if x is None:
+                    return
+                results.append(x)
+        def producer(i):
+            for j in xrange(0, M, 10):
+                if j % 20:
+                    q.put_many(range(i * M + j, i * M + j + 10))
+                else:
+                    for k in xrange(i * M + j, i * M + j + 10):
+                        q.put(k)
+        consumers = [threading.Thread(target=consumer) for i in range(N)]
+        producers = [threading.Thread(target=producer, args=(i,))
+                     for i in range(N)]
+        for t in consumers + producers:
+            t.start()
+        for t in producers:
+            t.join()
+        q.put_many([None] * N)
+        for t in consumers:
+            t.join()
+        self.assertEqual(sorted(results), range(N * M))
+
+
 # A Queue subclass that can provoke failure at a moment's notice :)
 class FailingQueueException(Exception):
     pass
@@ -315,7 +441,7 @@ class FailingQueueTest(unittest.TestCase, BlockingTestMixin):
 
 def test_main():
     test_support.run_unittest(QueueTest, LifoQueueTest, PriorityQueueTest,
-                              FailingQueueTest)
+                              SimpleQueueTest, FailingQueueTest)
 
 
 if __name__ == "__main__":
@@ -1044,6 +1044,36 @@ class FileObjectClassTestCase(SocketConnectedTest):
     def _testReadlineAfterReadNoNewline(self):
         self.cli_file.write("End Of Line")
 
+    def testReadinto(self):
+        first_seg = self.serv_file.read(3)
+        buf = bytearray(len(MSG))
+        n = self.serv_file.readinto(buf)
+        self.assertEqual(n, len(MSG) - 3)
+        self.assertEqual(first_seg + str(buf[:n]), MSG)
+        self.assertEqual(self.serv_file.readinto(buf), 0)
+
+    def _testReadinto(self):
+        self.cli_file.write(MSG)
+        self.cli_file.close()
+
+    def testManyLines(self):
+        # Lines spanning several buffer refills, including some longer
+        # than the buffer itself.
+        for i in range(200):
+            self.assertEqual(self.serv_file.readline(), "line %d\n" % i)
+            if i % 50 == 0:
+                self.assertEqual(self.serv_file.readline(20000),
+                                 "x" * 20000)
+                self.assertEqual(self.serv_file.readline(), "\n")
+        self.assertEqual(self.serv_file.read(), "")
+
+    def _testManyLines(self):
+        for i in range(200):
+            self.cli_file.write("line %d\n" % i)
+            if i % 50 == 0:
+                self.cli_file.writelines(["x" * 20000, "\n"])
+        self.cli_file.close()
+
     def testClosedAttr(self):
         self.assertTrue(not self.serv_file.closed)
 
@@ -1089,17 +1119,32 @@ class FileObjectInterruptedTestCase(unittest.TestCase):
         self.assertEqual(fo.read(size), "This is the first line\n"
                           "And the second line is here\n")
 
+    def _test_readinto(self, **kwargs):
+        mock_sock = self.MockSocket(recv_funcs=[
+                lambda : "This is the first line\nAnd the sec",
+                self._raise_eintr,
+                lambda : "ond line is here\n",
+                lambda : "",
+            ])
+        fo = socket._fileobject(mock_sock, **kwargs)
+        buf = bytearray(100)
+        n = fo.readinto(buf)
+        self.assertEqual(str(buf[:n]), "This is the first line\n"
+                          "And the second line is here\n")
+
     def test_default(self):
         self._test_readline()
         self._test_readline(size=100)
         self._test_read()
         self._test_read(size=100)
+        self._test_readinto()
 
     def test_with_1k_buffer(self):
         self._test_readline(bufsize=1024)
         self._test_readline(size=100, bufsize=1024)
         self._test_read(bufsize=1024)
         self._test_read(size=100, bufsize=1024)
+        self._test_readinto(bufsize=1024)
 
     def _test_readline_no_buffer(self, size=-1):
         mock_sock = self.MockSocket(recv_funcs=[
@@ -1119,6 +1164,7 @@ class FileObjectInterruptedTestCase(unittest.TestCase):
         self._test_readline_no_buffer(size=4)
         self._test_read(bufsize=0)
         self._test_read(size=100, bufsize=0)
+        self._test_readinto(bufsize=0)
 
 
 class UnbufferedFileObjectClassTestCase(FileObjectClassTestCase):
@@ -1207,6 +1253,165 @@ class NetworkConnectionNoServer(unittest.TestCase):
                 socket.create_connection((HOST, 1234))
 
 
+class AddrInfoCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.cache = socket.AddrInfoCache(ttl=0.2, negative_ttl=0.2,
+                                          maxsize=2)
+        self.cache._resolve = self.resolve
+
+    def resolve(self, host, *args):
+        self.calls.append(host)
+        if host == 'unknown':
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        if host == 'busy':
+            raise socket.gaierror(socket.EAI_AGAIN, 'Temporary failure')
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (HOST, args[0]))]
+
+    def test_hits(self):
+        result = self.cache.getaddrinfo('a', 80)
+        self.assertEqual(result, [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+                                   (HOST, 80))])
+        # the result is a copy
+        result.append(None)
+        self.assertEqual(len(self.cache.getaddrinfo('a', 80)), 1)
+        self.cache.getaddrinfo('a', 81)
+        self.assertEqual(self.calls, ['a', 'a'])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_ttl(self):
+        self.cache.getaddrinfo('a', 80)
+        time.sleep(0.3)
+        self.cache.getaddrinfo('a', 80)
+        self.assertEqual(self.calls, ['a', 'a'])
+        self.cache.clear()
+        self.cache.getaddrinfo('a', 80)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_negative(self):
+        for i in range(2):
+            with self.assertRaises(socket.gaierror) as cm:
+                self.cache.getaddrinfo('unknown', 80)
+            self.assertEqual(cm.exception.args[0], socket.EAI_NONAME)
+        self.assertEqual(self.calls, ['unknown'])
+        # temporary failures aren't cached
+        for i in range(2):
+            self.assertRaises(socket.gaierror,
+                              self.cache.getaddrinfo, 'busy', 80)
+        self.assertEqual(self.calls, ['unknown', 'busy', 'busy'])
+
+    def test_maxsize(self):
+        for host in ('a', 'b', 'a', 'c', 'a', 'b'):
+            self.cache.getaddrinfo(host, 80)
+        # b was the least recently used when c was added
+        self.assertEqual(self.calls, ['a', 'b', 'c', 'b'])
+
+    def test_create_connection(self):
+        self.assertIsNone(socket.getaddrinfocache())
+        serv = socket.socket()
+        self.addCleanup(serv.close)
+        port = test_support.bind_port(serv)
+        serv.listen(1)
+        socket.setaddrinfocache(self.cache)
+        self.addCleanup(socket.setaddrinfocache, None)
+        self.assertIs(socket.getaddrinfocache(), self.cache)
+        for i in range(2):
+            socket.create_connection(('example', port)).close()
+        self.assertEqual(self.calls, ['example'])
+        self.assertRaises(socket.gaierror, socket.create_connection,
+                          ('unknown', port))
+
+
+class StaggeredConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = self.listener()
+        self.addr = self.server.getsockname()
+        refused = socket.socket()
+        test_support.bind_port(refused)
+        self.refused = refused.getsockname()
+        refused.close()
+        self.addrinfo = []
+        old_getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = lambda *args: self.addrinfo
+        self.addCleanup(setattr, socket, 'getaddrinfo', old_getaddrinfo)
+
+    def listener(self, backlog=5):
+        sock = socket.socket()
+        self.addCleanup(sock.close)
+        test_support.bind_port(sock)
+        sock.listen(backlog)
+        return sock
+
+    def unresponsive(self):
+        # Connections to a listening socket whose backlog is full stay
+        # pending on most systems: fill it up.
+        addr = self.listener(0).getsockname()
+        for i in range(5):
+            sock = socket.socket()
+            self.addCleanup(sock.close)
+            sock.setblocking(0)
+            sock.connect_ex(addr)
+            if not select.select([], [sock], [], 0.2)[1]:
+                return addr
+        self.skipTest("can't make an unresponsive address")
+
+    def info(self, *addrs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', addr)
+                for addr in addrs]
+
+    def test_unresponsive_first(self):
+        self.addrinfo = self.info(self.unresponsive(), self.addr)
+        start = time.time()
+        sock = socket.create_connection(('example', 0), timeout=10,
+                                        connect_delay=0.05)
+        self.addCleanup(sock.close)
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(sock.getpeername(), self.addr)
+        self.assertEqual(sock.gettimeout(), 10)
+
+    def test_failure_starts_next_attempt(self):
+        self.addrinfo = self.info(self.refused, self.refused, self.addr)
+        start = time.time()
+        sock = socket.create_connection(('example', 0), connect_delay=10)
+        self.addCleanup(sock.close)
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(sock.getpeername(), self.addr)
+        self.assertIsNone(sock.gettimeout())
+
+    def test_all_refused(self):
+        self.addrinfo = self.info(self.refused, self.refused)
+        with self.assertRaises(socket.error) as cm:
+            socket.create_connection(('example', 0), connect_delay=0.05)
+        self.assertEqual(cm.exception.errno, errno.ECONNREFUSED)
+
+    def test_timeout(self):
+        unresponsive = self.unresponsive()
+        self.addrinfo = self.info(unresponsive, unresponsive)
+        self.assertRaises(socket.timeout, socket.create_connection,
+                          ('example', 0), timeout=0.2, connect_delay=0.05)
+
+    def test_default_delay(self):
+        self.assertIsNone(socket.getdefaultconnectdelay())
+        self.addCleanup(socket.setdefaultconnectdelay, None)
+        socket.setdefaultconnectdelay(0.05)
+        self.assertEqual(socket.getdefaultconnectdelay(), 0.05)
+        self.addrinfo = self.info(self.unresponsive(), self.addr)
+        sock = socket.create_connection(('example', 0), timeout=10)
+        self.addCleanup(sock.close)
+        self.assertEqual(sock.getpeername(), self.addr)
+        self.assertRaises(ValueError, socket.setdefaultconnectdelay, -1)
+
+    def test_interleave_families(self):
+        addrinfo = [(family, socket.SOCK_STREAM, 6, '', addr)
+                    for family, addr in ((10, 'a'), (10, 'b'), (10, 'c'),
+                                         (2, 'd'), (2, 'e'))]
+        self.assertEqual([res[4] for res in
+                          socket._interleave_families(addrinfo)],
+                         ['a', 'd', 'b', 'e', 'c'])
+
+
 @unittest.skipUnless(thread, 'Threading required for this test.')
 class NetworkConnectionAttributesTest(SocketTCPTest, ThreadableTest):
 
@@ -1608,6 +1813,8 @@ def test_main():
         SmallBufferedFileObjectClassTestCase,
         Urllib2FileobjectTest,
         NetworkConnectionNoServer,
+        AddrInfoCacheTest,
+        StaggeredConnectionTest,
         NetworkConnectionAttributesTest,
         NetworkConnectionBehaviourTest,
     ])
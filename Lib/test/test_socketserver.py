@@ -11,6 +11,7 @@ import socket
 import select
 import errno
 import tempfile
+import time
 import unittest
 import SocketServer
 
@@ -155,6 +156,7 @@ class SocketServerTest(unittest.TestCase):
         if verbose: print "waiting for server"
         server.shutdown()
         t.join()
+        server.server_close()
         if verbose: print "done"
 
     def stream_examine(self, proto, addr):
@@ -223,6 +225,125 @@ class SocketServerTest(unittest.TestCase):
                         SocketServer.DatagramRequestHandler,
                         self.dgram_examine)
 
+    def test_ThreadPoolTCPServer(self):
+        self.run_server(SocketServer.ThreadPoolTCPServer,
+                        SocketServer.StreamRequestHandler,
+                        self.stream_examine)
+
+    def test_ThreadPoolUDPServer(self):
+        self.run_server(SocketServer.ThreadPoolUDPServer,
+                        SocketServer.DatagramRequestHandler,
+                        self.dgram_examine)
+
+    @reap_threads
+    def test_thread_pool_overload(self):
+        release = threading.Event()
+        rejected = []
+
+        class MyServer(SocketServer.ThreadPoolTCPServer):
+            pool_size = 2
+            queue_size = 1
+            overload = 'reject'
+            def handle_overload(self, request, client_address):
+                rejected.append(client_address)
+                SocketServer.ThreadPoolTCPServer.handle_overload(
+                    self, request, client_address)
+
+        class MyHandler(SocketServer.StreamRequestHandler):
+            def handle(self):
+                release.wait(10)
+                self.wfile.write(self.rfile.readline())
+
+        server = MyServer((HOST, 0), MyHandler)
+        self.assertEqual(server.pool_stats()['handled'], 0)
+        clients = []
+        try:
+            # two requests are handled, one is queued and two are rejected
+            for i in range(5):
+                s = socket.create_connection(server.server_address)
+                clients.append(s)
+                server.handle_request()
+                if i < 2:
+                    # let a worker take the request off the queue, or the
+                    # next one would find the queue full
+                    for j in range(500):
+                        if server.pool_stats()['active'] == i + 1:
+                            break
+                        time.sleep(0.01)
+            self.assertEqual(len(rejected), 2)
+            stats = server.pool_stats()
+            self.assertEqual(stats['workers'], 2)
+            self.assertEqual(stats['rejected'], 2)
+            self.assertEqual(stats['queued'], 1)
+            self.assertEqual(stats['max_queued'], 1)
+            # rejected connections are closed
+            self.assertEqual(receive(clients[4], 100), '')
+            release.set()
+            for s in clients[:3]:
+                s.sendall(TEST_STR)
+                self.assertEqual(receive(s, 100), TEST_STR)
+        finally:
+            release.set()
+            for s in clients:
+                s.close()
+            server.server_close()
+        stats = server.pool_stats()
+        self.assertEqual(stats['handled'], 3)
+        self.assertEqual(stats['active'], 0)
+        self.assertGreaterEqual(stats['service_time'], 0)
+        self.assertGreaterEqual(stats['queue_wait'], 0)
+
+    @reap_threads
+    def test_thread_pool_mixin_server_close(self):
+        class MyServer(SocketServer.ThreadPoolMixIn, SocketServer.TCPServer):
+            pool_size = 2
+
+        server = MyServer((HOST, 0), SocketServer.StreamRequestHandler)
+        server.start_workers()
+        workers = server._workers
+        server.server_close()
+        for t in workers:
+            self.assertFalse(t.is_alive())
+        self.assertRaises(socket.error, server.socket.getsockname)
+
+    @reap_threads
+    def test_thread_pool_stop_from_worker(self):
+        # stop_workers() must not block in a worker while the queue is full
+        stopped = threading.Event()
+
+        class MyServer(SocketServer.ThreadPoolTCPServer):
+            pool_size = 1
+            queue_size = 1
+
+        class MyHandler(SocketServer.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+                if line == 'stop\n':
+                    for j in range(500):
+                        if self.server.pool_stats()['queued'] == 1:
+                            break
+                        time.sleep(0.01)
+                    self.server.stop_workers()
+                    stopped.set()
+                self.wfile.write(line)
+
+        server = MyServer((HOST, 0), MyHandler)
+        clients = []
+        try:
+            for line in ('stop\n', TEST_STR):
+                s = socket.create_connection(server.server_address)
+                clients.append(s)
+                s.sendall(line)
+                server.handle_request()
+            self.assertTrue(stopped.wait(10))
+            # the queued request is still handled
+            self.assertEqual(receive(clients[0], 100), 'stop\n')
+            self.assertEqual(receive(clients[1], 100), TEST_STR)
+        finally:
+            for s in clients:
+                s.close()
+            server.server_close()
+
     if HAVE_FORKING:
         def test_ForkingUDPServer(self):
             with simple_subprocess(self):
@@ -230,6 +351,109 @@ class SocketServerTest(unittest.TestCase):
                                 SocketServer.DatagramRequestHandler,
                                 self.dgram_examine)
 
+    if HAVE_FORKING:
+        def test_PreforkTCPServer(self):
+            with simple_subprocess(self):
+                self.run_server(SocketServer.PreforkTCPServer,
+                                SocketServer.StreamRequestHandler,
+                                self.stream_examine)
+
+        def test_PreforkUDPServer(self):
+            with simple_subprocess(self):
+                self.run_server(SocketServer.PreforkUDPServer,
+                                SocketServer.DatagramRequestHandler,
+                                self.dgram_examine)
+
+        @reap_threads
+        def test_prefork_recycle_and_restart(self):
+            class MyServer(SocketServer.PreforkTCPServer):
+                num_workers = 1
+                max_requests_per_worker = 2
+                def handle_error(self, request, client_address):
+                    pass
+
+            class MyHandler(SocketServer.StreamRequestHandler):
+                def handle(self):
+                    if self.rfile.readline() == 'crash\n':
+                        os._exit(3)
+                    self.wfile.write('%d\n' % os.getpid())
+
+            server = MyServer((HOST, 0), MyHandler)
+            t = threading.Thread(target=server.serve_forever,
+                                 kwargs={'poll_interval': 0.01})
+            t.daemon = True
+            t.start()
+            def request(line):
+                s = socket.create_connection(server.server_address)
+                try:
+                    s.sendall(line)
+                    return receive(s, 100)
+                finally:
+                    s.close()
+            try:
+                pids = [request('pid\n') for i in range(4)]
+                # the worker is replaced after two requests
+                self.assertEqual(pids[0], pids[1])
+                self.assertEqual(pids[2], pids[3])
+                self.assertNotEqual(pids[0], pids[2])
+                self.assertEqual(request('crash\n'), '')
+                # a new worker takes over
+                self.assertNotEqual(request('pid\n'), pids[2])
+                for i in range(500):
+                    if server.worker_crashes:
+                        break
+                    time.sleep(0.01)
+                self.assertEqual(server.worker_crashes, 1)
+                self.assertEqual(server.worker_restarts, 3)
+            finally:
+                server.shutdown()
+                t.join()
+                server.server_close()
+            self.assertEqual(server.active_workers, [])
+
+        @reap_threads
+        def test_prefork_worker_error(self):
+            r, w = os.pipe()
+
+            class MyServer(SocketServer.PreforkTCPServer):
+                num_workers = 1
+                def serve_worker(self, ppid):
+                    raise ValueError
+                def handle_error(self, request, client_address):
+                    os.write(w, '%r %r\n' % (request, client_address))
+
+            server = MyServer((HOST, 0), SocketServer.StreamRequestHandler)
+            t = threading.Thread(target=server.serve_forever,
+                                 kwargs={'poll_interval': 0.1})
+            t.daemon = True
+            t.start()
+            try:
+                self.assertTrue(_real_select([r], [], [], 20)[0])
+                self.assertTrue(os.read(r, 100).startswith(
+                    'None None\n'))
+                for i in range(500):
+                    if server.worker_crashes:
+                        break
+                    time.sleep(0.01)
+                self.assertTrue(server.worker_crashes)
+            finally:
+                server.shutdown()
+                t.join()
+                server.server_close()
+                os.close(r)
+                os.close(w)
+
+        def test_prefork_shutdown_before_serve(self):
+            server = SocketServer.PreforkTCPServer(
+                (HOST, 0), SocketServer.StreamRequestHandler)
+            try:
+                server.shutdown()
+                # serve_forever() returns without starting any worker
+                server.serve_forever()
+                self.assertEqual(server.active_workers, [])
+            finally:
+                server.server_close()
+
     @contextlib.contextmanager
     def mocked_select_module(self):
         """Mocks the select.select() call to raise EINTR for first call"""
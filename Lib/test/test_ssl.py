@@ -16,6 +16,7 @@ import traceback
 import weakref
 import functools
 import platform
+import subprocess
 
 from BaseHTTPServer import HTTPServer
 from SimpleHTTPServer import SimpleHTTPRequestHandler
@@ -204,6 +205,39 @@ class BasicSocketTests(unittest.TestCase):
         self.assertRaises(socket.error, ss.send, b'x')
         self.assertRaises(socket.error, ss.sendto, b'x', ('0.0.0.0', 0))
 
+    def test_session_unconnected(self):
+        s = socket.socket(socket.AF_INET)
+        ss = ssl.wrap_socket(s)
+        self.assertIsNone(ss.session)
+        self.assertFalse(ss.session_reused)
+        self.assertRaises(ValueError, ssl.wrap_socket, s, CERTFILE,
+                          server_side=True, session=object())
+
+    def test_session_cache(self):
+        class FakeSession:
+            def __init__(self, age):
+                self._time = time.time() - age
+            def time(self):
+                return self._time
+            def timeout(self):
+                return 300
+        cache = ssl.SSLSessionCache(maxsize=2)
+        a, b, c = FakeSession(0), FakeSession(0), FakeSession(0)
+        cache.set("a", a)
+        cache.set("b", b)
+        self.assertIs(cache.get("a"), a)
+        # "b" is now the least recently used
+        cache.set("c", c)
+        self.assertIsNone(cache.get("b"))
+        self.assertIs(cache.get("a"), a)
+        self.assertIs(cache.get("c"), c)
+        cache.discard("c")
+        self.assertIsNone(cache.get("c"))
+        cache.set("old", FakeSession(301))
+        self.assertIsNone(cache.get("old"))
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+
 
 class NetworkedTests(unittest.TestCase):
 
@@ -767,6 +801,40 @@ else:
         def stop(self):
             self.server.shutdown()
 
+    class OpenSSLServer:
+        # An "openssl s_server" process answering "GET /".  Unlike the
+        # servers above it keeps a session cache, so sessions are resumed.
+
+        def __init__(self, certfile):
+            self.certfile = certfile
+            self.port = test_support.find_unused_port()
+
+        def __enter__(self):
+            try:
+                self.process = subprocess.Popen(
+                    ['openssl', 's_server', '-accept', str(self.port),
+                     '-cert', self.certfile, '-www'],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT)
+            except OSError:
+                raise unittest.SkipTest("the openssl command is not available")
+            output = []
+            while True:
+                line = self.process.stdout.readline()
+                if not line:
+                    self.process.wait()
+                    raise unittest.SkipTest("openssl s_server failed:\n" +
+                                            ''.join(output))
+                if line.startswith('ACCEPT'):
+                    return self
+                output.append(line)
+
+        def __exit__(self, *args):
+            self.process.terminate()
+            self.process.wait()
+            self.process.stdout.close()
+            self.process.stdin.close()
+
 
     def bad_cert_test(certfile):
         """
@@ -1331,6 +1399,97 @@ else:
                     sock.close()
             self.assertIn("no shared cipher", str(server.conn_errors[0]))
 
+        def test_session(self):
+            server = ThreadedEchoServer(CERTFILE,
+                                        ssl_version=ssl.PROTOCOL_SSLv23,
+                                        chatty=False)
+            with server:
+                s = ssl.wrap_socket(socket.socket())
+                s.connect((HOST, server.port))
+                session = s.session
+                self.assertIsInstance(session, ssl.SSLSession)
+                self.assertFalse(s.session_reused)
+                self.assertIsInstance(session.id(), str)
+                self.assertGreater(session.timeout(), 0)
+                s.write("over\n")
+                s.close()
+                # The server may not resume it (our servers keep no session
+                # cache), but offering it must not break the handshake.
+                s = ssl.wrap_socket(socket.socket(), session=session)
+                s.connect((HOST, server.port))
+                self.assertIsInstance(s.session, ssl.SSLSession)
+                s.write("over\n")
+                s.close()
+
+        def test_https_session_cache(self):
+            server = SocketServerHTTPSServer(CERTFILE)
+            flag = threading.Event()
+            server.start(flag)
+            flag.wait()
+            try:
+                import httplib
+                cache = ssl.SSLSessionCache()
+                for i in range(2):
+                    conn = httplib.HTTPSConnection(HOST, server.port,
+                                                   session_cache=cache)
+                    conn.request("GET", "/" + os.path.basename(CERTFILE))
+                    conn.getresponse().read()
+                    conn.close()
+                    self.assertIsInstance(
+                        cache.get((HOST, server.port, None, None)),
+                        ssl.SSLSession)
+            finally:
+                server.stop()
+                server.join()
+
+        def test_session_resumption(self):
+            with OpenSSLServer(CERTFILE) as server:
+                sessions = []
+                for i in range(2):
+                    s = ssl.wrap_socket(socket.socket(),
+                                        session=sessions and sessions[0] or None)
+                    s.connect((HOST, server.port))
+                    self.assertEqual(s.session_reused, i == 1)
+                    s.write("GET / HTTP/1.0\r\n\r\n")
+                    while s.read():
+                        pass
+                    # with TLS 1.3 the session is sent after the handshake
+                    sessions.append(s.session)
+                    s.close()
+            self.assertEqual(sessions[1].id(), sessions[0].id())
+
+        def test_https_session_resumption(self):
+            import httplib
+            offered = []
+            class Cache(ssl.SSLSessionCache):
+                def get(self, key):
+                    session = ssl.SSLSessionCache.get(self, key)
+                    offered.append((key, session))
+                    return session
+            cache = Cache()
+            def fetch(port):
+                conn = httplib.HTTPSConnection(HOST, port,
+                                               session_cache=cache)
+                conn.request("GET", "/")
+                reused = conn.sock.session_reused
+                conn.getresponse().read()
+                conn.close()
+                return reused
+            with OpenSSLServer(CERTFILE) as first:
+                with OpenSSLServer(CERTFILE) as second:
+                    self.assertFalse(fetch(first.port))
+                    self.assertTrue(fetch(first.port))
+                    # the session of one server is not offered to another
+                    self.assertFalse(fetch(second.port))
+                    self.assertTrue(fetch(second.port))
+            first_key = (HOST, first.port, None, None)
+            second_key = (HOST, second.port, None, None)
+            self.assertEqual([key for key, session in offered],
+                             [first_key, first_key, second_key, second_key])
+            self.assertIsNone(offered[0][1])
+            self.assertIsNone(offered[2][1])
+            self.assertNotEqual(offered[3][1].id(), offered[1][1].id())
+
 
 def test_main(verbose=False):
     global CERTFILE, SVN_PYTHON_ORG_ROOT_CERT, NOKIACERT
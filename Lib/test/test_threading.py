@@ -13,6 +13,7 @@ import time
 import unittest
 import weakref
 import os
+import signal
 import subprocess
 
 from test import lock_tests
@@ -443,6 +444,24 @@ class ThreadTests(BaseTestCase):
         self.assertEqual(out, '')
         self.assertEqual(err, '')
 
+    @unittest.skipUnless(hasattr(signal, 'setitimer'), 'requires setitimer()')
+    def test_timed_wait_interrupted_by_signal(self):
+        # A timed wait in the main thread must let signal handlers run
+        # before the timeout expires.
+        class Alarm(Exception):
+            pass
+        def handler(signum, frame):
+            raise Alarm
+        old_handler = signal.signal(signal.SIGALRM, handler)
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 0.2)
+            start = time.time()
+            self.assertRaises(Alarm, threading.Event().wait, 30)
+            self.assertTrue(time.time() - start < 10)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old_handler)
+
 
 class ThreadJoinOnShutdown(BaseTestCase):
 
@@ -711,6 +730,204 @@ class ThreadingExceptionTests(BaseTestCase):
         self.assertRaises(RuntimeError, setattr, thread, "daemon", True)
 
 
+class TimerServiceTests(BaseTestCase):
+
+    def setUp(self):
+        BaseTestCase.setUp(self)
+        self.service = threading.TimerService()
+
+    def tearDown(self):
+        self.service.stop()
+        BaseTestCase.tearDown(self)
+
+    def wait_for(self, calls, n):
+        for i in range(500):
+            if len(calls) >= n:
+                return
+            time.sleep(0.01)
+        self.fail("calls not made: %r" % (calls,))
+
+    def test_order(self):
+        calls = []
+        for i, delay in enumerate([0.3, 0.1, 0.2, 0.1, 0.0]):
+            self.service.call_later(delay, calls.append, (i,))
+        self.wait_for(calls, 5)
+        self.assertEqual(calls, [4, 1, 3, 2, 0])
+
+    def test_kwargs(self):
+        calls = []
+        def f(*args, **kwargs):
+            calls.append((args, kwargs))
+        self.service.call_at(time.time(), f, (1, 2), {'x': 3})
+        self.wait_for(calls, 1)
+        self.assertEqual(calls, [((1, 2), {'x': 3})])
+
+    def test_cancel(self):
+        calls = []
+        pending = [self.service.call_later(0.1, calls.append, (i,))
+                   for i in range(200)]
+        for call in pending[:150]:
+            self.assertTrue(call.cancel())
+        self.assertFalse(pending[0].cancel())
+        self.assertFalse(pending[0].pending())
+        self.assertTrue(pending[-1].pending())
+        self.wait_for(calls, 50)
+        time.sleep(0.1)
+        self.assertEqual(calls, range(150, 200))
+        self.assertFalse(pending[-1].cancel())
+
+    def test_reschedule(self):
+        calls = []
+        first = self.service.call_later(10, calls.append, ('first',))
+        self.service.call_later(0.2, calls.append, ('second',))
+        first.reschedule(0.1)
+        self.wait_for(calls, 2)
+        self.assertEqual(calls, ['first', 'second'])
+        # a call which has been made can be scheduled again
+        first.reschedule(0)
+        self.wait_for(calls, 3)
+        self.assertEqual(calls[2], 'first')
+
+    def test_single_thread(self):
+        before = threading.active_count()
+        pending = [self.service.call_later(10, int) for i in range(100)]
+        self.assertEqual(threading.active_count(), before + 1)
+        for call in pending:
+            call.cancel()
+
+    def test_exception(self):
+        calls = []
+        with test.test_support.captured_stderr() as stderr:
+            self.service.call_later(0, lambda: 1 // 0)
+            self.service.call_later(0.05, calls.append, (1,))
+            self.wait_for(calls, 1)
+        self.assertIn('ZeroDivisionError', stderr.getvalue())
+
+    def test_pool(self):
+        calls = []
+        class Pool(object):
+            def apply_async(self, func, args=(), kwds={}):
+                calls.append((func, args, kwds))
+        service = threading.TimerService(pool=Pool())
+        try:
+            service.call_later(0, int, ('3',))
+            self.wait_for(calls, 1)
+        finally:
+            service.stop()
+        self.assertEqual(calls, [(int, ('3',), {})])
+
+    def test_stop(self):
+        calls = []
+        self.service.call_later(0.1, calls.append, (1,))
+        self.service.stop()
+        time.sleep(0.2)
+        self.assertEqual(calls, [])
+        self.assertRaises(RuntimeError, self.service.call_later, 0, int)
+
+
+class TimerTests(BaseTestCase):
+
+    def test_own_thread(self):
+        # without a service, each timer is a thread of its own, so a
+        # callback can wait for another timer's action
+        ev = threading.Event()
+        results = []
+        names = []
+        def waiter():
+            names.append(threading.current_thread().name)
+            results.append(ev.wait(2))
+        first = threading.Timer(0.05, waiter)
+        second = threading.Timer(0.1, ev.set)
+        first.start()
+        second.start()
+        self.assertIn(first, threading.enumerate())
+        start = time.time()
+        first.join()
+        second.join()
+        self.assertEqual(results, [True])
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEqual(names, [first.name])
+
+    def test_service(self):
+        calls = []
+        service = threading.TimerService()
+        try:
+            before = threading.active_count()
+            timers = [threading.Timer(0.1, calls.append, args=[i],
+                                      service=service)
+                      for i in range(20)]
+            for t in timers:
+                t.start()
+            # the timers share the service thread
+            self.assertEqual(threading.active_count(), before + 1)
+            self.assertTrue(timers[0].is_alive())
+            for t in timers:
+                t.join()
+                self.assertFalse(t.is_alive())
+            self.assertEqual(sorted(calls), range(20))
+            self.assertRaises(RuntimeError, timers[0].start)
+        finally:
+            service.stop()
+
+    def test_cancel(self):
+        calls = []
+        service = threading.TimerService()
+        try:
+            t = threading.Timer(0.1, calls.append, args=[1], service=service)
+            t.start()
+            t.cancel()
+            t.join(1)
+            self.assertFalse(t.is_alive())
+            self.assertTrue(t.finished.is_set())
+            time.sleep(0.2)
+            self.assertEqual(calls, [])
+        finally:
+            service.stop()
+
+    def test_stopped_service(self):
+        service = threading.TimerService()
+        service.stop()
+        t = threading.Timer(0, int, service=service)
+        self.assertRaises(RuntimeError, t.start)
+        self.assertFalse(t.is_alive())
+        self.assertNotIn(t, threading._pending_timers)
+
+    def test_subclass_run(self):
+        # a subclass overriding run() still gets its own thread
+        class RepeatTimer(threading._Timer):
+            def run(self):
+                while not self.finished.wait(0.01):
+                    self.function(*self.args, **self.kwargs)
+                    if len(calls) == 3:
+                        break
+        calls = []
+        service = threading.TimerService()
+        try:
+            t = RepeatTimer(0.01, calls.append, args=[None], service=service)
+            t.start()
+            self.assertIsNotNone(t.ident)
+            t.join()
+        finally:
+            service.stop()
+        self.assertEqual(len(calls), 3)
+
+    def test_exit_waits_for_timer(self):
+        # a pending non-daemon timer on a service keeps the interpreter
+        # alive, like a timer thread does
+        rc, out, err = assert_python_ok("-c", """if 1:
+            import threading, sys
+            def f():
+                sys.stdout.write("fired\\n")
+            service = threading.TimerService()
+            threading.Timer(0.2, f, service=service).start()
+            t = threading.Timer(0.1, f, service=service)
+            t.daemon = True
+            t.start()
+            t.cancel()
+            """)
+        self.assertEqual(out.strip(), "fired")
+
+
 class LockTests(lock_tests.LockTests):
     locktype = staticmethod(threading.Lock)
 
@@ -730,6 +947,12 @@ class ConditionTests(lock_tests.ConditionTests):
 class SemaphoreTests(lock_tests.SemaphoreTests):
     semtype = staticmethod(threading.Semaphore)
 
+class RWLockTests(lock_tests.RWLockTests):
+    rwlocktype = staticmethod(threading.RWLock)
+
+class BarrierTests(lock_tests.BarrierTests):
+    barriertype = staticmethod(threading.Barrier)
+
 class BoundedSemaphoreTests(lock_tests.BoundedSemaphoreTests):
     semtype = staticmethod(threading.BoundedSemaphore)
 
@@ -769,6 +992,8 @@ def test_main():
     test.test_support.run_unittest(LockTests, RLockTests, EventTests,
                                    ConditionAsRLockTests, ConditionTests,
                                    SemaphoreTests, BoundedSemaphoreTests,
+                                   RWLockTests, BarrierTests,
+                                   TimerServiceTests, TimerTests,
                                    ThreadTests,
                                    ThreadJoinOnShutdown,
                                    ThreadingExceptionTests,
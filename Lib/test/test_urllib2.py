@@ -1347,6 +1347,53 @@ def test_HTTPError_interface():
     'something bad happened'
     """
 
+class CacheStoreTests(unittest.TestCase):
+
+    def check_store(self, store):
+        self.assertIsNone(store.get('http://a/'))
+        entry = {'url': 'http://a/', 'body': 'x'}
+        store.set('http://a/', entry)
+        self.assertEqual(store.get('http://a/'), entry)
+        store.set('http://a/', dict(entry, body='y'))
+        self.assertEqual(store.get('http://a/')['body'], 'y')
+        store.delete('http://a/')
+        self.assertIsNone(store.get('http://a/'))
+        store.delete('http://a/')
+
+    def test_memory_store(self):
+        store = urllib2.MemoryCacheStore(maxsize=2)
+        self.check_store(store)
+        for key in ('http://a/', 'http://b/', 'http://c/'):
+            store.set(key, {'url': key})
+            store.get('http://a/')
+        # the least recently used entry was discarded
+        self.assertIsNone(store.get('http://b/'))
+        self.assertIsNotNone(store.get('http://a/'))
+        self.assertIsNotNone(store.get('http://c/'))
+
+    def test_file_store(self):
+        directory = os.path.join(test_support.TESTFN, 'cache')
+        self.addCleanup(test_support.rmtree, test_support.TESTFN)
+        store = urllib2.FileCacheStore(directory)
+        self.check_store(store)
+        store.set('http://a/', {'url': 'http://a/', 'body': 'x'})
+        # entries survive the store
+        store = urllib2.FileCacheStore(directory)
+        self.assertEqual(store.get('http://a/')['body'], 'x')
+        self.assertEqual(len(os.listdir(directory)), 1)
+        # unreadable entries are ignored
+        with open(store._path('http://a/'), 'wb') as f:
+            f.write('garbage')
+        self.assertIsNone(store.get('http://a/'))
+
+    def test_parse_cache_control(self):
+        self.assertEqual(urllib2._parse_cache_control(
+                            'no-cache, Max-Age=60, private="a, b"'),
+                         {'no-cache': None, 'max-age': '60',
+                          'private': 'a, b'})
+        self.assertEqual(urllib2._parse_cache_control(None), {})
+
+
 def test_main(verbose=None):
     from test import test_urllib2
     test_support.run_doctest(test_urllib2, verbose)
@@ -1355,7 +1402,8 @@ def test_main(verbose=None):
              OpenerDirectorTests,
              HandlerTests,
              MiscTests,
-             RequestTests)
+             RequestTests,
+             CacheStoreTests)
     test_support.run_unittest(*tests)
 
 if __name__ == "__main__":
@@ -2,9 +2,12 @@
 
 import urlparse
 import urllib2
+import httplib
 import BaseHTTPServer
+import SocketServer
 import unittest
 import hashlib
+import time
 from test import test_support
 mimetools = test_support.import_module('mimetools', deprecated=True)
 threading = test_support.import_module('threading')
@@ -526,6 +529,251 @@ class TestUrlopen(BaseTestCase):
             self.server.stop()
         self.assertEqual(index + 1, len(lines))
 
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/target')
+            self.send_header('Content-Length', '8')
+            self.end_headers()
+            self.wfile.write('redirect')
+        else:
+            if self.path == '/slow':
+                time.sleep(0.5)
+            # send_error() would close the connection
+            self.send_response(404 if self.path == '/missing' else 200)
+            self.send_header('Content-Length', str(len(self.path)))
+            self.end_headers()
+            self.wfile.write(self.path)
+
+
+class KeepAliveServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+
+class PersistentConnectionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = KeepAliveServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+        self.pool = httplib.HTTPConnectionPool()
+        self.opener = urllib2.build_opener(urllib2.HTTPHandler(pool=self.pool))
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def test_reuse(self):
+        for i in range(5):
+            f = self.opener.open(self.url + '/%d' % i)
+            self.assertEqual(f.read(), '/%d' % i)
+            self.assertEqual(f.code, 200)
+            f.close()
+        self.assertEqual(self.server.connections, 1)
+
+    def test_redirect(self):
+        f = self.opener.open(self.url + '/redirect')
+        self.assertEqual(f.geturl(), self.url + '/target')
+        self.assertEqual(f.read(), '/target')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_http_error(self):
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            self.opener.open(self.url + '/missing')
+        self.assertEqual(cm.exception.code, 404)
+        cm.exception.read()
+        del cm
+        f = self.opener.open(self.url + '/after')
+        self.assertEqual(f.read(), '/after')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_unread_response(self):
+        # a response closed before its end doesn't give back its connection
+        f = self.opener.open(self.url + '/unread')
+        f.close()
+        self.assertEqual(self.opener.open(self.url + '/x').read(), '/x')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_timeout(self):
+        # the request's timeout applies to a kept connection too
+        self.assertEqual(self.opener.open(self.url + '/x').read(), '/x')
+        start = time.time()
+        self.assertRaises(urllib2.URLError, self.opener.open,
+                          self.url + '/slow', timeout=0.1)
+        self.assertLess(time.time() - start, 0.5)
+        f = self.opener.open(self.url + '/y', timeout=5)
+        self.assertEqual(f.read(), '/y')
+        # the pool's own timeout is back for its next user
+        conn = self.pool.get_connection('http', self.url[7:])
+        try:
+            self.assertIsNone(conn.sock.gettimeout())
+        finally:
+            self.pool.put_connection(conn)
+
+
+class CachingHandler(KeepAliveHandler):
+
+    def do_GET(self):
+        counts = self.server.counts
+        counts[self.path] = counts.get(self.path, 0) + 1
+        headers = []
+        if self.path == '/fresh':
+            headers.append(('Cache-Control', 'max-age=3600'))
+        elif self.path == '/etag':
+            headers.append(('Cache-Control', 'no-cache'))
+            headers.append(('ETag', '"v1"'))
+            if self.headers.get('If-None-Match') == '"v1"':
+                return self.send_body(304, [('X-Revalidated', 'yes')] +
+                                      headers, '')
+        elif self.path == '/last-modified':
+            headers.append(('Last-Modified', 'Sat, 01 Jan 2000 00:00:00 GMT'))
+            headers.append(('Cache-Control', 'max-age=0'))
+            if self.headers.get('If-Modified-Since'):
+                return self.send_body(304, headers, '')
+        elif self.path == '/expired':
+            headers.append(('Expires', 'Sat, 01 Jan 2000 00:00:00 GMT'))
+        elif self.path == '/no-store':
+            headers.append(('Cache-Control', 'no-store, max-age=3600'))
+        elif self.path == '/vary':
+            headers.append(('Cache-Control', 'max-age=3600'))
+            headers.append(('Vary', 'Accept-Language'))
+        body = '%s %d %s' % (self.path, counts[self.path],
+                             self.headers.get('Accept-Language'))
+        self.send_body(200, headers, body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_body(200, [], 'posted')
+
+    def send_body(self, code, headers, body):
+        self.send_response(code)
+        for header in headers:
+            self.send_header(*header)
+        if code != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class HTTPCacheHandlerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = KeepAliveServer(('127.0.0.1', 0), CachingHandler)
+        self.server.counts = {}
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+        self.cache = urllib2.HTTPCacheHandler()
+        self.opener = urllib2.build_opener(self.cache)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def get(self, path, headers={}):
+        f = self.opener.open(urllib2.Request(self.url + path,
+                                             headers=headers))
+        try:
+            self.assertEqual(f.code, 200)
+            return f.read(), f.info()
+        finally:
+            f.close()
+
+    def counters(self):
+        return self.cache.hits, self.cache.misses, self.cache.revalidations
+
+    def test_fresh(self):
+        self.assertEqual(self.get('/fresh')[0], '/fresh 1 None')
+        body, headers = self.get('/fresh')
+        self.assertEqual(body, '/fresh 1 None')
+        self.assertEqual(headers['Age'], '0')
+        self.assertEqual(self.server.counts['/fresh'], 1)
+        self.assertEqual(self.counters(), (1, 1, 0))
+        # the client may ask for a validated response
+        body, headers = self.get('/fresh', {'Cache-Control': 'no-cache'})
+        self.assertEqual(body, '/fresh 2 None')
+        self.assertEqual(self.get('/fresh', {'Pragma': 'no-cache'})[0],
+                         '/fresh 3 None')
+        self.assertEqual(self.counters(), (1, 3, 0))
+
+    def test_etag(self):
+        self.assertEqual(self.get('/etag')[0], '/etag 1 None')
+        body, headers = self.get('/etag')
+        self.assertEqual(body, '/etag 1 None')
+        self.assertEqual(headers['X-Revalidated'], 'yes')
+        self.assertEqual(self.server.counts['/etag'], 2)
+        self.assertEqual(self.counters(), (0, 1, 1))
+        # a request validating its own copy gets the 304
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            self.get('/etag', {'If-None-Match': '"v1"'})
+        self.assertEqual(cm.exception.code, 304)
+
+    def test_reused_request(self):
+        # the validators added by the cache are not taken for the
+        # caller's on the next open of the same Request
+        req = urllib2.Request(self.url + '/etag')
+        self.assertEqual(self.opener.open(req).read(), '/etag 1 None')
+        for i in range(2):
+            f = self.opener.open(req)
+            self.assertEqual(f.code, 200)
+            self.assertEqual(f.read(), '/etag 1 None')
+            self.assertFalse(req.has_header('If-none-match'))
+        self.assertEqual(self.counters(), (0, 1, 2))
+
+    def test_last_modified(self):
+        self.get('/last-modified')
+        self.assertEqual(self.get('/last-modified')[0],
+                         '/last-modified 1 None')
+        self.assertEqual(self.counters(), (0, 1, 1))
+
+    def test_not_stored(self):
+        for path in ('/expired', '/no-store'):
+            self.get(path)
+            self.assertEqual(self.get(path)[0], '%s 2 None' % path)
+        self.get('/fresh', {'Cache-Control': 'no-store'})
+        self.get('/fresh')
+        self.assertEqual(self.server.counts['/fresh'], 2)
+        self.assertEqual(self.counters(), (0, 6, 0))
+
+    def test_vary(self):
+        self.get('/vary', {'Accept-Language': 'en'})
+        self.assertEqual(self.get('/vary', {'Accept-Language': 'en'})[0],
+                         '/vary 1 en')
+        self.assertEqual(self.get('/vary', {'Accept-Language': 'fr'})[0],
+                         '/vary 2 fr')
+
+    def test_invalidation(self):
+        self.get('/fresh')
+        self.opener.open(self.url + '/fresh', 'data').read()
+        self.assertEqual(self.get('/fresh')[0], '/fresh 2 None')
+
+    def test_file_store(self):
+        self.addCleanup(test_support.rmtree, test_support.TESTFN)
+        store = urllib2.FileCacheStore(test_support.TESTFN)
+        self.opener = urllib2.build_opener(urllib2.HTTPCacheHandler(store))
+        self.get('/fresh')
+        self.opener = urllib2.build_opener(urllib2.HTTPCacheHandler(
+            urllib2.FileCacheStore(test_support.TESTFN)))
+        self.assertEqual(self.get('/fresh')[0], '/fresh 1 None')
+
+
 def test_main():
     # We will NOT depend on the network resource flag
     # (Lib/test/regrtest.py -u network) since all tests here are only
@@ -533,7 +781,9 @@ def test_main():
     # the next line.
     #test_support.requires("network")
 
-    test_support.run_unittest(ProxyAuthTests, TestUrlopen)
+    test_support.run_unittest(ProxyAuthTests, TestUrlopen,
+                              PersistentConnectionTests,
+                              HTTPCacheHandlerTests)
 
 if __name__ == "__main__":
     test_main()
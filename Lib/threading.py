@@ -11,6 +11,8 @@ except ImportError:
 import warnings
 
 from collections import deque as _deque
+from heapq import heappush as _heappush, heappop as _heappop, \
+     heapify as _heapify
 from time import time as _time, sleep as _sleep
 from traceback import format_exc as _format_exc
 
@@ -29,12 +31,15 @@ from traceback import format_exc as _format_exc
 __all__ = ['activeCount', 'active_count', 'Condition', 'currentThread',
            'current_thread', 'enumerate', 'Event',
            'Lock', 'RLock', 'Semaphore', 'BoundedSemaphore', 'Thread',
-           'Timer', 'setprofile', 'settrace', 'local', 'stack_size']
+           'Timer', 'setprofile', 'settrace', 'local', 'stack_size',
+           'TIMEOUT_MAX', 'RWLock', 'Barrier', 'BrokenBarrierError',
+           'TimerService']
 
 _start_new_thread = thread.start_new_thread
 _allocate_lock = thread.allocate_lock
 _get_ident = thread.get_ident
 ThreadError = thread.error
+TIMEOUT_MAX = thread.TIMEOUT_MAX
 del thread
 
 
@@ -118,14 +123,14 @@ class _RLock(_Verbose):
         return "<%s owner=%r count=%d>" % (
                 self.__class__.__name__, owner, self.__count)
 
-    def acquire(self, blocking=1):
+    def acquire(self, blocking=1, timeout=-1):
         me = _get_ident()
         if self.__owner == me:
             self.__count = self.__count + 1
             if __debug__:
                 self._note("%s.acquire(%s): recursive success", self, blocking)
             return 1
-        rc = self.__block.acquire(blocking)
+        rc = self.__block.acquire(blocking, timeout)
         if rc:
             self.__owner = me
             self.__count = 1
@@ -245,22 +250,16 @@ class _Condition(_Verbose):
                 if __debug__:
                     self._note("%s.wait(): got it", self)
             else:
-                # Balancing act:  We can't afford a pure busy loop, so we
-                # have to sleep; but if we sleep the whole timeout time,
-                # we'll be unresponsive.  The scheme here sleeps very
-                # little at first, longer as time goes on, but never longer
-                # than 20 times per second (or the timeout time remaining).
-                endtime = _time() + timeout
-                delay = 0.0005 # 500 us -> initial delay of 1 ms
-                while True:
-                    gotit = waiter.acquire(0)
-                    if gotit:
-                        break
-                    remaining = endtime - _time()
-                    if remaining <= 0:
-                        break
-                    delay = min(delay * 2, remaining, .05)
-                    _sleep(delay)
+                # the lock waits in the kernel and wakes as soon as
+                # notify() releases it
+                if timeout <= 0:
+                    gotit = waiter.acquire(False)
+                elif _get_ident() == _main_ident:
+                    gotit = _acquire_interruptible(waiter, timeout)
+                elif timeout >= TIMEOUT_MAX:
+                    gotit = waiter.acquire()
+                else:
+                    gotit = waiter.acquire(True, timeout)
                 if not gotit:
                     if __debug__:
                         self._note("%s.wait(%s): timed out", self, timeout)
@@ -298,6 +297,22 @@ class _Condition(_Verbose):
     notify_all = notifyAll
 
 
+# A timed acquire cannot be interrupted, but signal handlers only run in
+# the main thread, between bytecodes.  There waits are done in slices of at
+# most this many seconds, so that a KeyboardInterrupt is not held up until
+# the timeout expires.
+_SIGNAL_CHECK_INTERVAL = 0.05
+
+def _acquire_interruptible(lock, timeout):
+    endtime = _time() + timeout
+    while True:
+        remaining = endtime - _time()
+        if remaining <= 0:
+            return lock.acquire(False)
+        if lock.acquire(True, min(remaining, _SIGNAL_CHECK_INTERVAL)):
+            return True
+
+
 def Semaphore(*args, **kwargs):
     return _Semaphore(*args, **kwargs)
 
@@ -312,16 +327,26 @@ class _Semaphore(_Verbose):
         self.__cond = Condition(Lock())
         self.__value = value
 
-    def acquire(self, blocking=1):
+    def acquire(self, blocking=1, timeout=None):
+        if not blocking and timeout is not None:
+            raise ValueError("can't specify timeout for non-blocking acquire")
         rc = False
+        endtime = None
         self.__cond.acquire()
         while self.__value == 0:
             if not blocking:
                 break
+            if timeout is not None:
+                if endtime is None:
+                    endtime = _time() + timeout
+                else:
+                    timeout = endtime - _time()
+                    if timeout <= 0:
+                        break
             if __debug__:
                 self._note("%s.acquire(%s): blocked waiting, value=%s",
                            self, blocking, self.__value)
-            self.__cond.wait()
+            self.__cond.wait(timeout)
         else:
             self.__value = self.__value - 1
             if __debug__:
@@ -361,6 +386,140 @@ class _BoundedSemaphore(_Semaphore):
         return _Semaphore.release(self)
 
 
+def RWLock(*args, **kwargs):
+    return _RWLock(*args, **kwargs)
+
+class _RWLock(_Verbose):
+    """Reader/writer lock.
+
+    Any number of threads may hold the lock for reading at the same time,
+    while a thread holding it for writing excludes all others.  Waiting
+    writers are preferred: once a writer waits, new readers block until it
+    has had its turn.  The lock is not reentrant on either side.
+    """
+
+    def __init__(self, verbose=None):
+        _Verbose.__init__(self, verbose)
+        lock = Lock()
+        self.__read_ok = Condition(lock)
+        self.__write_ok = Condition(lock)
+        self.__readers = 0
+        self.__writer = None
+        self.__writers_waiting = 0
+        self.reader = _RWLockSide(self.acquire_read, self.release_read)
+        self.writer = _RWLockSide(self.acquire_write, self.release_write)
+
+    def __repr__(self):
+        return "<%s readers=%d writer=%s writers_waiting=%d>" % (
+            self.__class__.__name__, self.__readers, self.__writer,
+            self.__writers_waiting)
+
+    def acquire_read(self, blocking=1, timeout=None):
+        if not blocking and timeout is not None:
+            raise ValueError("can't specify timeout for non-blocking acquire")
+        rc = False
+        endtime = None
+        self.__read_ok.acquire()
+        while self.__writer is not None or self.__writers_waiting:
+            if not blocking:
+                break
+            if timeout is not None:
+                if endtime is None:
+                    endtime = _time() + timeout
+                else:
+                    timeout = endtime - _time()
+                    if timeout <= 0:
+                        break
+            if __debug__:
+                self._note("%s.acquire_read(%s): blocked waiting", self,
+                           blocking)
+            self.__read_ok.wait(timeout)
+        else:
+            self.__readers += 1
+            if __debug__:
+                self._note("%s.acquire_read: success", self)
+            rc = True
+        self.__read_ok.release()
+        return rc
+
+    def release_read(self):
+        self.__read_ok.acquire()
+        try:
+            if self.__readers == 0:
+                raise RuntimeError("cannot release un-acquired lock")
+            self.__readers -= 1
+            if __debug__:
+                self._note("%s.release_read: success", self)
+            if self.__readers == 0 and self.__writers_waiting:
+                self.__write_ok.notify()
+        finally:
+            self.__read_ok.release()
+
+    def acquire_write(self, blocking=1, timeout=None):
+        if not blocking and timeout is not None:
+            raise ValueError("can't specify timeout for non-blocking acquire")
+        me = _get_ident()
+        rc = False
+        endtime = None
+        self.__write_ok.acquire()
+        self.__writers_waiting += 1
+        try:
+            while self.__writer is not None or self.__readers:
+                if not blocking:
+                    break
+                if timeout is not None:
+                    if endtime is None:
+                        endtime = _time() + timeout
+                    else:
+                        timeout = endtime - _time()
+                        if timeout <= 0:
+                            break
+                if __debug__:
+                    self._note("%s.acquire_write(%s): blocked waiting", self,
+                               blocking)
+                self.__write_ok.wait(timeout)
+            else:
+                self.__writer = me
+                if __debug__:
+                    self._note("%s.acquire_write: success", self)
+                rc = True
+        finally:
+            self.__writers_waiting -= 1
+            # readers held back by a writer which gave up may proceed
+            if not rc and not self.__writers_waiting and self.__writer is None:
+                self.__read_ok.notify_all()
+            self.__write_ok.release()
+        return rc
+
+    def release_write(self):
+        self.__write_ok.acquire()
+        try:
+            if self.__writer != _get_ident():
+                raise RuntimeError("cannot release un-acquired lock")
+            self.__writer = None
+            if __debug__:
+                self._note("%s.release_write: success", self)
+            if self.__writers_waiting:
+                self.__write_ok.notify()
+            else:
+                self.__read_ok.notify_all()
+        finally:
+            self.__write_ok.release()
+
+class _RWLockSide(object):
+    # The reader or writer attribute of an RWLock, usable like a lock.
+
+    def __init__(self, acquire, release):
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, t, v, tb):
+        self.release()
+
+
 def Event(*args, **kwargs):
     return _Event(*args, **kwargs)
 
@@ -406,6 +565,151 @@ class _Event(_Verbose):
         finally:
             self.__cond.release()
 
+
+class BrokenBarrierError(RuntimeError):
+    """Raised when waiting on a Barrier which is broken or gets broken
+    while the thread waits."""
+
+def Barrier(*args, **kwargs):
+    return _Barrier(*args, **kwargs)
+
+# States of a barrier
+_FILLING = 0
+_DRAINING = 1
+_RESETTING = 2
+_BROKEN = 3
+
+class _Barrier(_Verbose):
+    """Barrier for a fixed number of threads.
+
+    Threads calling wait() block until parties threads have done so, then
+    all of them are released together.  The barrier can be reused for any
+    number of phases.
+    """
+
+    def __init__(self, parties, action=None, timeout=None, verbose=None):
+        if parties < 1:
+            raise ValueError("parties must be >= 1")
+        _Verbose.__init__(self, verbose)
+        self.__cond = Condition(Lock())
+        self.__action = action
+        self.__timeout = timeout
+        self.__parties = parties
+        self.__state = _FILLING
+        self.__count = 0
+
+    def wait(self, timeout=None):
+        """Wait until parties threads have called wait().
+
+        Returns an index in range(parties) which differs for each thread of
+        a phase.  Raises BrokenBarrierError if the barrier is broken, which
+        also happens if the timeout (by default the one given to the
+        constructor) expires.
+        """
+        if timeout is None:
+            timeout = self.__timeout
+        self.__cond.acquire()
+        try:
+            # threads of the previous phase must leave first
+            while self.__state in (_DRAINING, _RESETTING):
+                self.__cond.wait()
+            if self.__state == _BROKEN:
+                raise BrokenBarrierError
+            index = self.__count
+            self.__count += 1
+            try:
+                if index + 1 == self.__parties:
+                    self.__release()
+                else:
+                    self.__wait(timeout)
+                if __debug__:
+                    self._note("%s.wait: released as %d", self, index)
+                return index
+            finally:
+                self.__count -= 1
+                if self.__count == 0 and self.__state in (_DRAINING,
+                                                          _RESETTING):
+                    self.__state = _FILLING
+                    self.__cond.notify_all()
+        finally:
+            self.__cond.release()
+
+    def __release(self):
+        # called by the last thread to arrive
+        try:
+            if self.__action:
+                self.__action()
+        except:
+            self.__break()
+            raise
+        self.__state = _DRAINING
+        self.__cond.notify_all()
+
+    def __wait(self, timeout):
+        endtime = None
+        while self.__state == _FILLING:
+            if timeout is not None:
+                if endtime is None:
+                    endtime = _time() + timeout
+                else:
+                    timeout = endtime - _time()
+                    if timeout <= 0:
+                        self.__break()
+                        break
+            self.__cond.wait(timeout)
+        if self.__state != _DRAINING:
+            raise BrokenBarrierError
+
+    def __break(self):
+        self.__state = _BROKEN
+        self.__cond.notify_all()
+
+    def reset(self):
+        """Return the barrier to its initial state.
+
+        Threads waiting on it get BrokenBarrierError.
+        """
+        self.__cond.acquire()
+        try:
+            if self.__count > 0:
+                if self.__state in (_FILLING, _BROKEN):
+                    # cleared by the last thread to leave
+                    self.__state = _RESETTING
+            else:
+                self.__state = _FILLING
+            self.__cond.notify_all()
+        finally:
+            self.__cond.release()
+
+    def abort(self):
+        """Break the barrier.
+
+        Threads waiting on it and later calls to wait() get
+        BrokenBarrierError until reset() is called.
+        """
+        self.__cond.acquire()
+        try:
+            self.__break()
+        finally:
+            self.__cond.release()
+
+    @property
+    def parties(self):
+        """The number of threads required to pass the barrier."""
+        return self.__parties
+
+    @property
+    def n_waiting(self):
+        """The number of threads waiting on the barrier."""
+        if self.__state == _FILLING:
+            return self.__count
+        return 0
+
+    @property
+    def broken(self):
+        """True if the barrier is broken."""
+        return self.__state == _BROKEN
+
 # Helper to generate new thread names
 _counter = 0
 def _newname(template="Thread-%d"):
@@ -729,6 +1033,218 @@ class Thread(_Verbose):
     def setName(self, name):
         self.name = name
 
+# A timer service runs any number of timers from a single thread.  The
+# pending calls are kept in a heap of [deadline, sequence, call] entries,
+# the sequence number keeping calls with the same deadline in FIFO order.
+# A cancelled entry stays in the heap with its call set to None, until it
+# reaches the top or cancelled entries make up more than half of the heap.
+
+def TimerService(*args, **kwargs):
+    return _TimerService(*args, **kwargs)
+
+class _TimerService(_Verbose):
+    """Call functions at given times from a single thread.
+
+    s = TimerService()
+    c = s.call_later(30.0, f, args=(), kwargs={})
+    c.reschedule(60.0) # move the call
+    c.cancel() # withdraw the call if it's still waiting
+    s.stop()
+
+    If pool is given, the functions are run by its apply_async() method
+    (see multiprocessing.pool.ThreadPool) instead of by the service thread.
+    """
+
+    def __init__(self, pool=None, verbose=None):
+        _Verbose.__init__(self, verbose)
+        self.__pool = pool
+        self.__cond = Condition(Lock())
+        self.__heap = []
+        self.__sequence = 0
+        self.__cancelled = 0
+        self.__thread = None
+        self.__stopped = False
+
+    def __repr__(self):
+        return "<%s(%d pending)>" % (self.__class__.__name__,
+                                     len(self.__heap) - self.__cancelled)
+
+    def call_later(self, delay, function, args=(), kwargs=None):
+        """Call function(*args, **kwargs) after delay seconds.
+
+        Returns an object with cancel() and reschedule() methods.
+        """
+        return self.call_at(_time() + delay, function, args, kwargs)
+
+    def call_at(self, deadline, function, args=(), kwargs=None):
+        """Call function(*args, **kwargs) when time.time() reaches deadline.
+
+        Returns an object with cancel() and reschedule() methods.
+        """
+        call = _ScheduledCall(self, function, args, kwargs or {})
+        self.__cond.acquire()
+        try:
+            self._push(call, deadline)
+        finally:
+            self.__cond.release()
+        return call
+
+    def stop(self):
+        """Stop the service thread, dropping the calls still pending.
+
+        A call being made when stop() is called is finished first, unless
+        stop() is called by that call.
+        """
+        thread = self._shutdown()
+        if thread is not None and thread is not current_thread():
+            thread.join()
+
+    def _shutdown(self):
+        # Tell the thread to stop and return it, without waiting for it.
+        self.__cond.acquire()
+        try:
+            self.__stopped = True
+            for entry in self.__heap:
+                if entry[2] is not None:
+                    entry[2]._entry = None
+            self.__heap = []
+            self.__cancelled = 0
+            self.__cond.notify()
+            return self.__thread
+        finally:
+            self.__cond.release()
+
+    # The following methods are called with the lock held
+
+    def _push(self, call, deadline):
+        if self.__stopped:
+            raise RuntimeError("timer service is stopped")
+        self.__sequence += 1
+        entry = [deadline, self.__sequence, call]
+        call._entry = entry
+        call.deadline = deadline
+        _heappush(self.__heap, entry)
+        if self.__heap[0] is entry:
+            # the thread waits for the old first deadline
+            self.__cond.notify()
+        thread = self.__thread
+        # the thread does not survive a fork()
+        if thread is None or not thread.is_alive():
+            thread = Thread(target=self.__run,
+                            name=_newname("TimerService-%d"))
+            thread.daemon = True
+            thread.start()
+            self.__thread = thread
+
+    def _cancel(self, call):
+        call._entry[2] = None
+        call._entry = None
+        self.__cancelled += 1
+        if self.__cancelled > 64 and self.__cancelled > len(self.__heap) // 2:
+            self.__heap = [entry for entry in self.__heap
+                           if entry[2] is not None]
+            _heapify(self.__heap)
+            self.__cancelled = 0
+
+    def _lock(self):
+        return self.__cond
+
+    def __next(self):
+        # Return the next due call, or None when stopped.
+        heap = self.__heap
+        while not self.__stopped:
+            if heap and heap[0][2] is None:
+                _heappop(heap)
+                self.__cancelled -= 1
+                continue
+            if not heap:
+                self.__cond.wait()
+            else:
+                delay = heap[0][0] - _time()
+                if delay <= 0:
+                    call = _heappop(heap)[2]
+                    call._entry = None
+                    return call
+                self.__cond.wait(delay)
+            heap = self.__heap
+        return None
+
+    def __run(self):
+        while True:
+            self.__cond.acquire()
+            try:
+                call = self.__next()
+            finally:
+                self.__cond.release()
+            if call is None:
+                break
+            if __debug__:
+                self._note("%s: calling %r", self, call.function)
+            if self.__pool is not None:
+                self.__pool.apply_async(call.function, call.args, call.kwargs)
+                continue
+            try:
+                call.function(*call.args, **call.kwargs)
+            except:
+                if _sys:
+                    _sys.stderr.write("Exception in timer service %s:\n%s\n" %
+                                      (self, _format_exc()))
+            finally:
+                # avoid keeping the function and its arguments alive
+                del call
+
+class _ScheduledCall(object):
+    """A call pending in a TimerService."""
+
+    _entry = None
+
+    def __init__(self, service, function, args, kwargs):
+        self.service = service
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = None
+
+    def pending(self):
+        """Return True if the call has been neither made nor cancelled."""
+        return self._entry is not None
+
+    def cancel(self):
+        """Withdraw the call if it's still waiting.
+
+        Returns True if it was, False if it has already been made or
+        cancelled.
+        """
+        lock = self.service._lock()
+        lock.acquire()
+        try:
+            if self._entry is None:
+                return False
+            self.service._cancel(self)
+            return True
+        finally:
+            lock.release()
+
+    def reschedule(self, delay):
+        """Make the call delay seconds from now instead.
+
+        This also schedules it again if it has already been made or
+        cancelled.
+        """
+        deadline = _time() + delay
+        lock = self.service._lock()
+        lock.acquire()
+        try:
+            if self._entry is not None:
+                self.service._cancel(self)
+            self.service._push(self, deadline)
+        finally:
+            lock.release()
+
+# Timers which are pending in a service and which, as non-daemon
+# threads would, keep the interpreter from exiting
+_pending_timers = set()
+
 # The timer class was contributed by Itamar Shtull-Trauring
 
 def Timer(*args, **kwargs):
@@ -740,19 +1256,61 @@ class _Timer(Thread):
     t = Timer(30.0, f, args=[], kwargs={})
     t.start()
     t.cancel() # stop the timer's action if it's still waiting
+
+    If service is given, the timer does not use a thread of its own but is
+    run by that TimerService, unless a subclass overrides run().
     """
 
-    def __init__(self, interval, function, args=[], kwargs={}):
+    def __init__(self, interval, function, args=[], kwargs={}, service=None):
         Thread.__init__(self)
         self.interval = interval
         self.function = function
         self.args = args
         self.kwargs = kwargs
         self.finished = Event()
+        self.__service = service
+        self.__call = None
+
+    def start(self):
+        if (self.__service is None or
+            getattr(type(self).run, 'im_func', None) is not _Timer.__dict__['run']):
+            # no service, or run() is overridden: use a thread of our own
+            Thread.start(self)
+            return
+        if self._Thread__started.is_set():
+            raise RuntimeError("threads can only be started once")
+        self._Thread__started.set()
+        if not self.daemon:
+            _pending_timers.add(self)
+        try:
+            self.__call = self.__service.call_later(self.interval, self.__fire)
+        except:
+            # e.g. the service is stopped
+            self.__finish()
+            raise
+
+    def __fire(self):
+        try:
+            if not self.finished.is_set():
+                try:
+                    self.function(*self.args, **self.kwargs)
+                except:
+                    if _sys:
+                        _sys.stderr.write("Exception in thread %s:\n%s\n" %
+                                          (self.name, _format_exc()))
+        finally:
+            self.__finish()
+
+    def __finish(self):
+        self.finished.set()
+        _pending_timers.discard(self)
+        self._Thread__stop()
 
     def cancel(self):
         """Stop the timer if it hasn't finished yet"""
         self.finished.set()
+        if self.__call is not None and self.__call.cancel():
+            self.__finish()
 
     def run(self):
         self.finished.wait(self.interval)
@@ -792,6 +1350,9 @@ def _pickSomeNonDaemonThread():
     for t in enumerate():
         if not t.daemon and t.is_alive():
             return t
+    for t in list(_pending_timers):
+        if t.is_alive():
+            return t
     return None
 
 
@@ -857,6 +1418,7 @@ from thread import stack_size
 # (Py_Main) as threading._shutdown.
 
 _shutdown = _MainThread()._exitfunc
+_main_ident = _get_ident()
 
 # get thread-local implementation, either from the thread
 # module, or from the python fallback
@@ -874,9 +1436,12 @@ def _after_fork():
 
     # Reset _active_limbo_lock, in case we forked while the lock was held
     # by another (non-forked) thread.  http://bugs.python.org/issue874900
-    global _active_limbo_lock
+    global _active_limbo_lock, _main_ident
     _active_limbo_lock = _allocate_lock()
 
+    # Signals are now delivered to the thread which forked.
+    _main_ident = _get_ident()
+
     # fork() only copied the current thread; clear references to others.
     new_active = {}
     current = current_thread()
@@ -901,6 +1466,9 @@ def _after_fork():
         _active.update(new_active)
         assert len(_active) == 1
 
+    # The timers pending in the parent do not keep the child alive.
+    _pending_timers.clear()
+
 
 # Self-test code
 
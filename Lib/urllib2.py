@@ -103,12 +103,18 @@ import time
 import urlparse
 import bisect
 import warnings
+from collections import OrderedDict
 
 try:
     from cStringIO import StringIO
 except ImportError:
     from StringIO import StringIO
 
+try:
+    import threading as _threading
+except ImportError:
+    import dummy_threading as _threading
+
 from urllib import (unwrap, unquote, splittype, splithost, quote,
      addinfourl, splitport, splittag, toBytes,
      splitattr, ftpwrapper, splituser, splitpasswd, splitvalue)
@@ -1098,8 +1104,11 @@ class ProxyDigestAuthHandler(BaseHandler, AbstractDigestAuthHandler):
 
 class AbstractHTTPHandler(BaseHandler):
 
-    def __init__(self, debuglevel=0):
+    _pool = None
+
+    def __init__(self, debuglevel=0, pool=None):
         self._debuglevel = debuglevel
+        self._pool = pool
 
     def set_http_debuglevel(self, level):
         self._debuglevel = level
@@ -1147,13 +1156,16 @@ class AbstractHTTPHandler(BaseHandler):
         if not host:
             raise URLError('no host given')
 
-        h = http_class(host, timeout=req.timeout) # will parse host:port
-        h.set_debuglevel(self._debuglevel)
-
         headers = dict(req.unredirected_hdrs)
         headers.update(dict((k, v) for k, v in req.headers.items()
                             if k not in headers))
 
+        if self._pool is not None and not req._tunnel_host:
+            return self._open_pooled(req, host, headers)
+
+        h = http_class(host, timeout=req.timeout) # will parse host:port
+        h.set_debuglevel(self._debuglevel)
+
         # We want to make an HTTP/1.1 request, but the addinfourl
         # class isn't prepared to deal with a persistent connection.
         # It will try to read all remaining data from the socket,
@@ -1184,7 +1196,24 @@ class AbstractHTTPHandler(BaseHandler):
                 r = h.getresponse(buffering=True)
             except TypeError: # buffering kw not supported
                 r = h.getresponse()
+        return self._wrap_response(r, req)
+
+    def _open_pooled(self, req, host, headers):
+        # The connection is kept open after the response and goes back to
+        # the pool once the response has been read to the end.  The pool's
+        # timeout only applies when the request doesn't set one.
+        headers = dict(
+            (name.title(), val) for name, val in headers.items())
+        try:
+            r = self._pool._request(req.get_type(), host, req.get_method(),
+                                    req.get_selector(), req.data, headers,
+                                    self._debuglevel, buffering=True,
+                                    timeout=req.timeout)
+        except socket.error, err:
+            raise URLError(err)
+        return self._wrap_response(r, req)
 
+    def _wrap_response(self, r, req):
         # Pick apart the HTTPResponse object to get the addinfourl
         # object initialized properly.
 
@@ -1206,6 +1235,11 @@ class AbstractHTTPHandler(BaseHandler):
 
 
 class HTTPHandler(AbstractHTTPHandler):
+    """Open http URLs.
+
+    When pool, an httplib.HTTPConnectionPool, is given, connections are
+    kept alive and reused by later requests to the same server.
+    """
 
     def http_open(self, req):
         return self.do_open(httplib.HTTPConnection, req)
@@ -1238,6 +1272,329 @@ class HTTPCookieProcessor(BaseHandler):
     https_request = http_request
     https_response = http_response
 
+class HTTPCacheHandler(BaseHandler):
+    """Cache GET responses as a private HTTP/1.1 cache (RFC 7234).
+
+    Fresh responses are served from store without contacting the server;
+    stale ones are revalidated with If-None-Match and If-Modified-Since.
+    The hits, misses and revalidations attributes count the responses
+    served from the cache, from the server, and from the cache after a
+    304 Not Modified.
+    """
+
+    handler_order = 400  # before HTTPHandler opens, before errors
+
+    def __init__(self, store=None):
+        if store is None:
+            store = MemoryCacheStore()
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def http_open(self, req):
+        req._http_cache = None
+        # the validators added for an earlier open of req are not the
+        # caller's
+        _remove_validators(req)
+        if req.get_method() != 'GET' or req.has_data():
+            return None
+        directives = _parse_cache_control(req.get_header('Cache-control'))
+        if req.get_header('Pragma', '').lower() == 'no-cache':
+            directives.setdefault('no-cache', None)
+        key = req.get_full_url()
+        if 'no-store' in directives:
+            req._http_cache = (key, None, time.time())
+            return None
+        entry = self.store.get(key)
+        if entry is not None and not _vary_matches(entry, req):
+            entry = None
+        if entry is not None and 'no-cache' not in directives:
+            age = _current_age(entry)
+            max_age = _delta_seconds(directives.get('max-age'))
+            if (age < _freshness_lifetime(entry) and
+                (max_age is None or age <= max_age)):
+                self.hits += 1
+                return _cached_response(entry, age)
+        if entry is not None and (req.has_header('If-none-match') or
+                                  req.has_header('If-modified-since')):
+            # the caller is validating its own copy
+            entry = None
+        if entry is not None:
+            headers = _message(entry)
+            etag = headers.getheader('etag')
+            last_modified = headers.getheader('last-modified')
+            added = []
+            if etag:
+                req.add_unredirected_header('If-none-match', etag)
+                added.append('If-none-match')
+            if last_modified:
+                req.add_unredirected_header('If-modified-since',
+                                            last_modified)
+                added.append('If-modified-since')
+            req._http_cache_validators = added
+            if not etag and not last_modified:
+                entry = None
+        req._http_cache = (key, entry, time.time())
+        return None
+
+    def http_response(self, req, response):
+        state = getattr(req, '_http_cache', None)
+        req._http_cache = None
+        _remove_validators(req)
+        if state is None:
+            if (req.get_method() not in ('GET', 'HEAD') and
+                200 <= response.code < 400):
+                # unsafe methods invalidate the stored response
+                self.store.delete(req.get_full_url())
+            return response
+        key, entry, request_time = state
+        if response.code == 304 and entry is not None:
+            response.read()
+            response.close()
+            entry = _updated_entry(entry, response.info(), request_time)
+            self.store.set(key, entry)
+            self.revalidations += 1
+            return _cached_response(entry, _current_age(entry))
+        self.misses += 1
+        if response.code != 200 or not _storable(req, response.info()):
+            return response
+        body = response.read()
+        response.close()
+        entry = _new_entry(req, response, body, request_time)
+        self.store.set(key, entry)
+        new = addinfourl(StringIO(body), response.info(), response.geturl(),
+                         response.code)
+        new.msg = response.msg
+        return new
+
+    https_open = http_open
+    https_response = http_response
+
+
+# A cache entry is a dictionary with the url, code and reason of the
+# response, its headers as a string, its body, the times the request was
+# sent and the response received, and the values of the request headers
+# named by Vary.
+
+def _remove_validators(req):
+    for name in getattr(req, '_http_cache_validators', ()):
+        req.unredirected_hdrs.pop(name, None)
+    req._http_cache_validators = ()
+
+def _parse_cache_control(value):
+    """Return the directives of a Cache-Control header as a dictionary."""
+    directives = {}
+    for part in parse_http_list(value or ''):
+        name, sep, arg = part.partition('=')
+        name = name.strip().lower()
+        if name:
+            arg = arg.strip()
+            if arg[:1] == arg[-1:] == '"':
+                arg = arg[1:-1]
+            directives[name] = arg if sep else None
+    return directives
+
+def _delta_seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+def _http_date(value):
+    import email.utils
+    if not value:
+        return None
+    t = email.utils.parsedate_tz(value)
+    if t is None:
+        return None
+    return email.utils.mktime_tz(t)
+
+def _message(entry):
+    return httplib.HTTPMessage(StringIO(entry['headers']), 0)
+
+def _storable(req, headers):
+    directives = _parse_cache_control(headers.getheader('cache-control'))
+    if ('no-store' in directives or
+        'no-store' in _parse_cache_control(req.get_header('Cache-control'))):
+        return False
+    if headers.getheader('vary', '').strip() == '*':
+        return False
+    # without validators or an explicit lifetime, storing it is useless
+    return bool(directives or headers.getheader('expires') or
+                headers.getheader('etag') or
+                headers.getheader('last-modified'))
+
+def _new_entry(req, response, body, request_time):
+    headers = response.info()
+    vary = {}
+    for name in parse_http_list(headers.getheader('vary', '')):
+        name = name.strip().capitalize()
+        vary[name] = req.get_header(name)
+    return {'url': req.get_full_url(), 'code': response.code,
+            'reason': response.msg, 'headers': ''.join(headers.headers),
+            'body': body, 'request_time': request_time,
+            'response_time': time.time(), 'vary': vary}
+
+def _updated_entry(entry, headers, request_time):
+    # RFC 7234 4.3.4: the headers of the 304 response replace the stored ones
+    skip = ('content-length', 'transfer-encoding', 'connection', 'keep-alive')
+    stored = _message(entry)
+    lines = []
+    for name in headers.keys():
+        if name not in skip:
+            del stored[name]
+            lines.extend(headers.getallmatchingheaders(name))
+    entry = dict(entry)
+    entry['headers'] = ''.join(stored.headers + lines)
+    entry['request_time'] = request_time
+    entry['response_time'] = time.time()
+    return entry
+
+def _vary_matches(entry, req):
+    for name, value in entry['vary'].items():
+        if req.get_header(name) != value:
+            return False
+    return True
+
+def _current_age(entry):
+    # RFC 7234 4.2.3
+    headers = _message(entry)
+    date = _http_date(headers.getheader('date'))
+    response_time = entry['response_time']
+    apparent_age = 0
+    if date is not None:
+        apparent_age = max(0, response_time - date)
+    age_value = _delta_seconds(headers.getheader('age')) or 0
+    response_delay = response_time - entry['request_time']
+    corrected_initial_age = max(apparent_age, age_value + response_delay)
+    return corrected_initial_age + time.time() - response_time
+
+def _freshness_lifetime(entry):
+    # RFC 7234 4.2.1, and the heuristic of 4.2.2 for responses which only
+    # have a Last-Modified date
+    headers = _message(entry)
+    directives = _parse_cache_control(headers.getheader('cache-control'))
+    if 'no-cache' in directives:
+        return 0
+    max_age = _delta_seconds(directives.get('max-age'))
+    if max_age is not None:
+        return max_age
+    date = _http_date(headers.getheader('date'))
+    if date is None:
+        date = entry['response_time']
+    if headers.getheader('expires') is not None:
+        expires = _http_date(headers.getheader('expires'))
+        if expires is None:
+            return 0
+        return max(0, expires - date)
+    last_modified = _http_date(headers.getheader('last-modified'))
+    if last_modified is not None:
+        return max(0, date - last_modified) / 10
+    return 0
+
+def _cached_response(entry, age):
+    headers = _message(entry)
+    del headers['age']
+    headers['Age'] = str(int(age))
+    resp = addinfourl(StringIO(entry['body']), headers, entry['url'],
+                      entry['code'])
+    resp.msg = entry['reason']
+    return resp
+
+
+class MemoryCacheStore:
+    """Keep up to maxsize cache entries in memory, least recently used first
+    to be discarded."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = _threading.Lock()
+
+    def get(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+        finally:
+            self._lock.release()
+
+    def set(self, key, entry):
+        self._lock.acquire()
+        try:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        self._lock.acquire()
+        try:
+            self._entries.pop(key, None)
+        finally:
+            self._lock.release()
+
+
+class FileCacheStore:
+    """Keep cache entries as files in directory, which is created if
+    needed."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest())
+
+    def get(self, key):
+        import cPickle
+        try:
+            f = open(self._path(key), 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                entry = cPickle.load(f)
+            except Exception:
+                return None
+        finally:
+            f.close()
+        if not isinstance(entry, dict) or entry.get('url') != key:
+            return None
+        return entry
+
+    def set(self, key, entry):
+        import cPickle
+        import tempfile
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                cPickle.dump(entry, f, cPickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+            path = self._path(key)
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp, path)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
 class UnknownHandler(BaseHandler):
     def unknown_open(self, req):
         type = req.get_type()
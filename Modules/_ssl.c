@@ -124,7 +124,13 @@ typedef struct {
 
 } PySSLObject;
 
+typedef struct {
+    PyObject_HEAD
+    SSL_SESSION*        session;
+} PySSLSession;
+
 static PyTypeObject PySSL_Type;
+static PyTypeObject PySSLSession_Type;
 static PyObject *PySSL_SSLwrite(PySSLObject *self, PyObject *args);
 static PyObject *PySSL_SSLread(PySSLObject *self, PyObject *args);
 static int check_socket_and_wait_for_timeout(PySocketSockObject *s,
@@ -133,6 +139,7 @@ static PyObject *PySSL_peercert(PySSLObject *self, PyObject *args);
 static PyObject *PySSL_cipher(PySSLObject *self);
 
 #define PySSLObject_Check(v)    (Py_TYPE(v) == &PySSL_Type)
+#define PySSLSession_Check(v)   (Py_TYPE(v) == &PySSLSession_Type)
 
 typedef enum {
     SOCKET_IS_NONBLOCKING,
@@ -1101,6 +1108,131 @@ static PyObject *PySSL_cipher (PySSLObject *self) {
     return NULL;
 }
 
+/* Client-side session resumption */
+
+static PyObject *
+newPySSLSession(SSL_SESSION *session)
+{
+    PySSLSession *self;
+
+    /* Steals the caller's reference to session */
+    self = PyObject_New(PySSLSession, &PySSLSession_Type);
+    if (self == NULL) {
+        SSL_SESSION_free(session);
+        return NULL;
+    }
+    self->session = session;
+    return (PyObject *) self;
+}
+
+static PyObject *PySSL_get_session(PySSLObject *self)
+{
+    SSL_SESSION *session;
+
+    session = SSL_get1_session(self->ssl);
+    if (session == NULL)
+        Py_RETURN_NONE;
+    return newPySSLSession(session);
+}
+
+PyDoc_STRVAR(PySSL_get_session_doc,
+"get_session() -> SSLSession or None\n\
+\n\
+Return the session negotiated for this connection, which can be given\n\
+to set_session() of a later connection to the same server.");
+
+static PyObject *PySSL_set_session(PySSLObject *self, PyObject *args)
+{
+    PySSLSession *session;
+
+    if (!PyArg_ParseTuple(args, "O!:set_session",
+                          &PySSLSession_Type, &session))
+        return NULL;
+    if (!SSL_set_session(self->ssl, session->session))
+        return _setSSLError(NULL, 0, __FILE__, __LINE__);
+    Py_RETURN_NONE;
+}
+
+PyDoc_STRVAR(PySSL_set_session_doc,
+"set_session(session)\n\
+\n\
+Ask to resume session in the handshake.  Must be called before the\n\
+handshake; the server may still decide to do a full handshake.");
+
+static PyObject *PySSL_session_reused(PySSLObject *self)
+{
+    return PyBool_FromLong(SSL_session_reused(self->ssl));
+}
+
+PyDoc_STRVAR(PySSL_session_reused_doc,
+"session_reused() -> bool\n\
+\n\
+Return True if the handshake resumed a previous session.");
+
+static PyObject *PySSLSession_id(PySSLSession *self)
+{
+    const unsigned char *id;
+    unsigned int len;
+
+#if OPENSSL_VERSION_NUMBER >= 0x0090800fL
+    id = SSL_SESSION_get_id(self->session, &len);
+#else
+    id = self->session->session_id;
+    len = self->session->session_id_length;
+#endif
+    return PyString_FromStringAndSize((const char *) id, len);
+}
+
+static PyObject *PySSLSession_time(PySSLSession *self)
+{
+    return PyInt_FromLong(SSL_SESSION_get_time(self->session));
+}
+
+static PyObject *PySSLSession_timeout(PySSLSession *self)
+{
+    return PyInt_FromLong(SSL_SESSION_get_timeout(self->session));
+}
+
+static void PySSLSession_dealloc(PySSLSession *self)
+{
+    if (self->session)
+        SSL_SESSION_free(self->session);
+    PyObject_Del(self);
+}
+
+static PyMethodDef PySSLSessionMethods[] = {
+    {"id", (PyCFunction)PySSLSession_id, METH_NOARGS,
+     "id() -> the session id as a string"},
+    {"time", (PyCFunction)PySSLSession_time, METH_NOARGS,
+     "time() -> when the session was established, in seconds since the Epoch"},
+    {"timeout", (PyCFunction)PySSLSession_timeout, METH_NOARGS,
+     "timeout() -> how many seconds after time() the session expires"},
+    {NULL, NULL}
+};
+
+static PyObject *PySSLSession_getattr(PySSLSession *self, char *name)
+{
+    return Py_FindMethod(PySSLSessionMethods, (PyObject *)self, name);
+}
+
+static PyTypeObject PySSLSession_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "ssl.SSLSession",                   /*tp_name*/
+    sizeof(PySSLSession),               /*tp_basicsize*/
+    0,                                  /*tp_itemsize*/
+    /* methods */
+    (destructor)PySSLSession_dealloc,   /*tp_dealloc*/
+    0,                                  /*tp_print*/
+    (getattrfunc)PySSLSession_getattr,  /*tp_getattr*/
+    0,                                  /*tp_setattr*/
+    0,                                  /*tp_compare*/
+    0,                                  /*tp_repr*/
+    0,                                  /*tp_as_number*/
+    0,                                  /*tp_as_sequence*/
+    0,                                  /*tp_as_mapping*/
+    0,                                  /*tp_hash*/
+};
+
 static void PySSL_dealloc(PySSLObject *self)
 {
     if (self->peer_cert)        /* Possible not to have one? */
@@ -1473,6 +1605,12 @@ static PyMethodDef PySSLMethods[] = {
     {"cipher", (PyCFunction)PySSL_cipher, METH_NOARGS},
     {"shutdown", (PyCFunction)PySSL_SSLshutdown, METH_NOARGS,
      PySSL_SSLshutdown_doc},
+    {"get_session", (PyCFunction)PySSL_get_session, METH_NOARGS,
+     PySSL_get_session_doc},
+    {"set_session", (PyCFunction)PySSL_set_session, METH_VARARGS,
+     PySSL_set_session_doc},
+    {"session_reused", (PyCFunction)PySSL_session_reused, METH_NOARGS,
+     PySSL_session_reused_doc},
     {NULL, NULL}
 };
 
@@ -1661,6 +1799,7 @@ init_ssl(void)
     unsigned int major, minor, fix, patch, status;
 
     Py_TYPE(&PySSL_Type) = &PyType_Type;
+    Py_TYPE(&PySSLSession_Type) = &PyType_Type;
 
     m = Py_InitModule3("_ssl", PySSL_methods, module_doc);
     if (m == NULL)
@@ -1693,6 +1832,9 @@ init_ssl(void)
     if (PyDict_SetItemString(d, "SSLType",
                              (PyObject *)&PySSL_Type) != 0)
         return;
+    if (PyDict_SetItemString(d, "SSLSession",
+                             (PyObject *)&PySSLSession_Type) != 0)
+        return;
     PyModule_AddIntConstant(m, "SSL_ERROR_ZERO_RETURN",
                             PY_SSL_ERROR_ZERO_RETURN);
     PyModule_AddIntConstant(m, "SSL_ERROR_WANT_READ",
@@ -40,30 +40,76 @@ lock_dealloc(lockobject *self)
     PyObject_Del(self);
 }
 
+/* Helper to acquire a lock with a timeout (in microseconds, or -1 for
+   no timeout).  The GIL is only released if the lock is not free. */
+static int
+acquire_timed(PyThread_type_lock lock, PY_TIMEOUT_T microseconds)
+{
+    int r;
+
+    r = PyThread_acquire_lock_timed(lock, 0);
+    if (!r && microseconds != 0) {
+        Py_BEGIN_ALLOW_THREADS
+        r = PyThread_acquire_lock_timed(lock, microseconds);
+        Py_END_ALLOW_THREADS
+    }
+    return r;
+}
+
 static PyObject *
-lock_PyThread_acquire_lock(lockobject *self, PyObject *args)
+lock_PyThread_acquire_lock(lockobject *self, PyObject *args, PyObject *kwds)
 {
-    int i = 1;
+    static char *kwlist[] = {"blocking", "timeout", NULL};
+    int blocking = 1;
+    double timeout = -1;
+    PY_TIMEOUT_T microseconds;
+    int r;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|id:acquire", kwlist,
+                                     &blocking, &timeout))
+        return NULL;
 
-    if (!PyArg_ParseTuple(args, "|i:acquire", &i))
+    if (!blocking && timeout != -1) {
+        PyErr_SetString(PyExc_ValueError, "can't specify a timeout "
+                        "for a non-blocking call");
         return NULL;
+    }
+    if (timeout < 0 && timeout != -1) {
+        PyErr_SetString(PyExc_ValueError, "timeout value must be "
+                        "strictly positive");
+        return NULL;
+    }
+    if (!blocking)
+        microseconds = 0;
+    else if (timeout == -1)
+        microseconds = -1;
+    else {
+        timeout *= 1e6;
+        if (timeout >= (double) PY_TIMEOUT_MAX) {
+            PyErr_SetString(PyExc_OverflowError,
+                            "timeout value is too large");
+            return NULL;
+        }
+        microseconds = (PY_TIMEOUT_T) timeout;
+    }
 
-    Py_BEGIN_ALLOW_THREADS
-    i = PyThread_acquire_lock(self->lock_lock, i);
-    Py_END_ALLOW_THREADS
+    r = acquire_timed(self->lock_lock, microseconds);
 
-    return PyBool_FromLong((long)i);
+    return PyBool_FromLong((long)r);
 }
 
 PyDoc_STRVAR(acquire_doc,
-"acquire([wait]) -> None or bool\n\
+"acquire([blocking[, timeout]]) -> bool\n\
 (acquire_lock() is an obsolete synonym)\n\
 \n\
 Lock the lock.  Without argument, this blocks if the lock is already\n\
 locked (even by the same thread), waiting for another thread to release\n\
-the lock, and return None once the lock is acquired.\n\
-With an argument, this will only block if the argument is true,\n\
-and the return value reflects whether the lock is acquired.\n\
+the lock, and return True once the lock is acquired.\n\
+With a false blocking argument, this will not block, and the return\n\
+value reflects whether the lock is acquired.\n\
+With a positive, floating-point timeout argument, this will block for\n\
+at most timeout seconds, and return False if the lock could not be\n\
+acquired in that time.\n\
 The blocking operation is not interruptible.");
 
 static PyObject *
@@ -107,9 +153,9 @@ Return whether the lock is in the locked state.");
 
 static PyMethodDef lock_methods[] = {
     {"acquire_lock", (PyCFunction)lock_PyThread_acquire_lock,
-     METH_VARARGS, acquire_doc},
+     METH_VARARGS | METH_KEYWORDS, acquire_doc},
     {"acquire",      (PyCFunction)lock_PyThread_acquire_lock,
-     METH_VARARGS, acquire_doc},
+     METH_VARARGS | METH_KEYWORDS, acquire_doc},
     {"release_lock", (PyCFunction)lock_PyThread_release_lock,
      METH_NOARGS, release_doc},
     {"release",      (PyCFunction)lock_PyThread_release_lock,
@@ -119,7 +165,7 @@ static PyMethodDef lock_methods[] = {
     {"locked",       (PyCFunction)lock_locked_lock,
      METH_NOARGS, locked_doc},
     {"__enter__",    (PyCFunction)lock_PyThread_acquire_lock,
-     METH_VARARGS, acquire_doc},
+     METH_VARARGS | METH_KEYWORDS, acquire_doc},
     {"__exit__",    (PyCFunction)lock_PyThread_release_lock,
      METH_VARARGS, release_doc},
     {NULL}              /* sentinel */
@@ -896,7 +942,7 @@ will block until another thread unlocks it.  Deadlocks may ensue.");
 PyMODINIT_FUNC
 initthread(void)
 {
-    PyObject *m, *d;
+    PyObject *m, *d, *timeout_max;
 
     /* Initialize types: */
     if (PyType_Ready(&localdummytype) < 0)
@@ -909,6 +955,12 @@ initthread(void)
     if (m == NULL)
         return;
 
+    timeout_max = PyFloat_FromDouble((double)(PY_TIMEOUT_MAX / 1000000));
+    if (!timeout_max)
+        return;
+    if (PyModule_AddObject(m, "TIMEOUT_MAX", timeout_max) < 0)
+        return;
+
     /* Add a symbolic constant */
     d = PyModule_GetDict(m);
     ThreadError = PyErr_NewException("thread.error", NULL, NULL);
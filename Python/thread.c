@@ -151,6 +151,47 @@ static size_t _pythread_stacksize = 0;
 #endif
 */
 
+#ifndef Py_HAVE_NATIVE_TIMED_LOCK
+/* If the platform has not supplied a way to wait for a lock with a
+   timeout, emulate it by polling, sleeping at most 50ms in between. */
+
+#ifdef MS_WINDOWS
+#define _pythread_sleep(microseconds) Sleep((DWORD)((microseconds) / 1000))
+#else
+#ifdef HAVE_SYS_SELECT_H
+#include <sys/select.h>
+#endif
+static void
+_pythread_sleep(PY_TIMEOUT_T microseconds)
+{
+    struct timeval tv;
+    tv.tv_sec = (long)(microseconds / 1000000);
+    tv.tv_usec = (long)(microseconds % 1000000);
+    select(0, (fd_set *)0, (fd_set *)0, (fd_set *)0, &tv);
+}
+#endif
+
+int
+PyThread_acquire_lock_timed(PyThread_type_lock lock, PY_TIMEOUT_T microseconds)
+{
+    PY_TIMEOUT_T delay = 500;
+
+    if (microseconds < 0)
+        return PyThread_acquire_lock(lock, WAIT_LOCK);
+    while (!PyThread_acquire_lock(lock, NOWAIT_LOCK)) {
+        if (microseconds <= 0)
+            return 0;
+        if (delay > microseconds)
+            delay = microseconds;
+        _pythread_sleep(delay);
+        microseconds -= delay;
+        if (delay < 50000)
+            delay *= 2;
+    }
+    return 1;
+}
+#endif /* Py_HAVE_NATIVE_TIMED_LOCK */
+
 /* return the current thread stack size */
 size_t
 PyThread_get_stacksize(void)
@@ -0,0 +1,110 @@
+"""
+lockbench, a benchmark of lock contention between reader threads.
+
+Each thread repeatedly looks up a key in a shared dict while holding a
+lock, then holds the lock for a further --hold seconds (simulating work
+which releases the GIL, e.g. I/O).  A fraction --writes of the operations
+update the dict instead.  The number of operations per second is reported
+for a threading.RLock, which serializes all threads, and for the read and
+write sides of a threading.RWLock, which let readers proceed together.
+"""
+
+import time
+import random
+import threading
+from optparse import OptionParser
+
+
+DURATION = 2.0
+HOLD = 0.0005
+WRITES = 0.0
+THREAD_COUNTS = [1, 2, 4, 8, 16]
+
+
+def rlock_ops():
+    lock = threading.RLock()
+    return lock, lock
+
+def rwlock_ops():
+    lock = threading.RWLock()
+    return lock.reader, lock.writer
+
+def run(make_locks, nthreads, duration, hold, writes):
+    reader, writer = make_locks()
+    data = dict.fromkeys(range(1000), 0)
+    keys = data.keys()
+    counts = [0] * nthreads
+    start = threading.Event()
+    stop = []
+
+    def worker(n):
+        rnd = random.Random(n)
+        count = 0
+        start.wait()
+        while not stop:
+            key = rnd.choice(keys)
+            if writes and rnd.random() < writes:
+                with writer:
+                    data[key] += 1
+                    if hold:
+                        time.sleep(hold)
+            else:
+                with reader:
+                    data[key]
+                    if hold:
+                        time.sleep(hold)
+            count += 1
+        counts[n] = count
+
+    threads = [threading.Thread(target=worker, args=(n,))
+               for n in range(nthreads)]
+    for t in threads:
+        t.start()
+    t0 = time.time()
+    start.set()
+    time.sleep(duration)
+    stop.append(True)
+    for t in threads:
+        t.join()
+    return sum(counts) / (time.time() - t0)
+
+def main():
+    usage = "usage: %prog [-h|--help] [options]"
+    parser = OptionParser(usage=usage)
+    parser.add_option("-d", "--duration",
+                      action="store", type="float", dest="duration",
+                      default=DURATION,
+                      help="seconds per measurement (default: %s)" % DURATION)
+    parser.add_option("-s", "--hold",
+                      action="store", type="float", dest="hold", default=HOLD,
+                      help="seconds the lock is held for each operation, "
+                           "0 for no extra work (default: %s)" % HOLD)
+    parser.add_option("-w", "--writes",
+                      action="store", type="float", dest="writes",
+                      default=WRITES,
+                      help="fraction of operations which write "
+                           "(default: %s)" % WRITES)
+    parser.add_option("-t", "--threads",
+                      action="store", dest="threads",
+                      default=",".join(map(str, THREAD_COUNTS)),
+                      help="comma-separated thread counts (default: %s)" %
+                           ",".join(map(str, THREAD_COUNTS)))
+    options, args = parser.parse_args()
+    if args:
+        parser.error("unexpected arguments")
+    try:
+        thread_counts = [int(n) for n in options.threads.split(",")]
+    except ValueError:
+        parser.error("invalid thread counts: %r" % options.threads)
+
+    print("hold=%gs writes=%g%%" % (options.hold, options.writes * 100))
+    print("%8s %14s %14s %8s" % ("threads", "RLock ops/s", "RWLock ops/s",
+                                 "ratio"))
+    for n in thread_counts:
+        r = run(rlock_ops, n, options.duration, options.hold, options.writes)
+        rw = run(rwlock_ops, n, options.duration, options.hold,
+                 options.writes)
+        print("%8d %14.0f %14.0f %8.2f" % (n, r, rw, rw / r))
+
+if __name__ == "__main__":
+    main()